@@ -1,8 +1,38 @@
 import os
 import re
 import json
-import google.generativeai as genai # Will be google.genai after pip install
+import copy
+import asyncio
+import random
+import threading
+import contextvars
 from app.config import settings
+from app import metrics
+from app.ai import prompts, schemas
+from app.ai.rate_limiter import PRIORITY_INTERACTIVE, gemini_limiter, estimate_tokens, is_throttling_error
+from app.ai.response_cache import response_cache, make_cache_key_async
+
+MODEL_NAME = 'gemini-1.5-flash-latest'
+GENERATION_CONFIG = {"temperature": 0.3}
+
+# Cache key -> task for identical prompts currently being generated (singleflight).
+_inflight_calls: dict[str, asyncio.Task] = {}
+
+# How each JSON response was obtained: parsed as returned ("direct"), after stripping a fence or
+# trailing commas ("tolerant"), by the single repair retry ("repaired"), or not at all ("failed").
+parse_stats = {"direct": 0, "tolerant": 0, "repaired": 0, "failed": 0}
+_parse_stats_lock = threading.Lock()
+
+_JSON_FENCE = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+def load_sdk():
+    """
+    Returns the google.generativeai module, importing it on first use. The SDK takes about a
+    quarter of a second to import, so it is kept out of app startup (see the warm-up in app.main).
+    """
+    import google.generativeai as genai # Will be google.genai after pip install
+    return genai
 
 def init_gemini():
     """
@@ -11,49 +41,287 @@ def init_gemini():
     """
     if not settings.GEMINI_API_KEY:
         raise ValueError("GEMINI_API_KEY not found in .env file.")
-    genai.configure(api_key=settings.GEMINI_API_KEY)
+    load_sdk().configure(api_key=settings.GEMINI_API_KEY)
 
-def call_gemini_json(prompt_parts: list) -> dict:
+async def call_gemini_json_async(
+    prompt_parts: list,
+    prompt_type: str = "default",
+    use_cache: bool = True,
+    temperature: float = None,
+    priority: int = PRIORITY_INTERACTIVE
+) -> dict:
     """
     Calls the Gemini API with a given list of prompt parts (text and/or image data)
-    and expects a JSON response.
+    and expects a JSON response. Known prompt types use JSON response mode with their
+    response schema; a response that still cannot be parsed or does not match the schema
+    gets one repair retry. Successful responses are served from and stored in the
+    response cache, with a time-to-live chosen by prompt type.
 
     Args:
         prompt_parts: A list containing text strings and/or dictionaries
                       for image data (e.g., {"mime_type": "image/jpeg", "data": image_bytes}).
+        prompt_type: The kind of prompt ("profile", "trends", "image", "post"), which selects
+                     the response schema and the cache TTL.
+        use_cache: Set to False to always call the model.
+        temperature: Overrides the default sampling temperature.
+        priority: PRIORITY_INTERACTIVE or PRIORITY_BACKGROUND.
 
     Returns:
         A dictionary parsed from the model's JSON response.
         Returns an error dictionary if the call fails or parsing is unsuccessful.
+
+    Model calls are admitted by the process-wide rate limiter (see rate_limiter.py), which
+    serves waiting callers by priority; pass PRIORITY_BACKGROUND for work nobody is waiting on.
+    Calls throttled by Gemini (429) are retried with backoff. Identical prompts that are
+    already in flight are coalesced into a single call whose result every caller shares.
+    Calls made with use_cache=False always get their own model call.
     """
-    try:
-        model = genai.GenerativeModel('gemini-1.5-flash-latest')
-        response = model.generate_content(
-            prompt_parts,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.3
-            )
-        )
-        
-        text_response = response.text
+    # Each caller times its own wait, so every request's Server-Timing shows the time it spent here
+    # even when the model call itself is shared with other callers.
+    with metrics.timed(metrics.gemini_call_seconds, "gemini", prompt_type=prompt_type):
+        generation_config = _generation_config(temperature, prompt_type)
+        cache_key = await make_cache_key_async(prompt_parts, MODEL_NAME, generation_config)
+        if not use_cache:
+            return await _generate_json_async(prompt_parts, prompt_type, generation_config, cache_key, priority)
 
-        try:
-            # Try direct JSON parsing first
-            return json.loads(text_response)
-        except json.JSONDecodeError:
-            # Fallback: try to extract JSON from markdown code blocks
-            json_match = re.search(r"""```json\n({.*?})\n```""", text_response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(1)
-                return json.loads(json_str)
-            else:
-                # If no JSON found, return raw text in an error format
-                return {"error": "AI response not valid JSON", "raw_response": text_response}
+        cached = await response_cache.aget(cache_key)
+        if cached is not None:
+            return cached
+
+        task = _inflight_calls.get(cache_key)
+        metrics.cache_requests_total.inc(cache="gemini_inflight", result="miss" if task is None else "hit")
+        if task is None:
+            # The shared call runs in an empty context rather than the first caller's, so nothing it
+            # does is credited to (or lost with) that one request.
+            call = _generate_json_async(prompt_parts, prompt_type, generation_config, cache_key, priority)
+            task = contextvars.Context().run(asyncio.ensure_future, call)
+            _inflight_calls[cache_key] = task
+            task.add_done_callback(lambda _: _inflight_calls.pop(cache_key, None))
+
+        # Shield the shared call so one caller disconnecting does not cancel it for the others.
+        result = await asyncio.shield(task)
+        return copy.deepcopy(result)
+
+async def _generate_json_async(prompt_parts: list, prompt_type: str, generation_config: dict, cache_key: str, priority: int) -> dict:
+    """Makes one model call (plus at most one repair retry) through the rate limiter and caches a successful result."""
+    try:
+        text = await _generate_text_async(prompt_parts, generation_config, priority)
+        result, path, problem = _parse_and_validate(text, prompt_type)
+        if problem is None:
+            _count_parse(path)
+        else:
+            repair_prompt = prompts.build_json_repair_prompt(text, problem, schemas.get_schema(prompt_type))
+            result = _repaired_result(await _generate_text_async([repair_prompt], generation_config, priority), prompt_type)
 
     except Exception as e:
+        metrics.errors_total.inc(component="gemini")
         print(f"Error calling Gemini or parsing JSON: {e}")
+        if is_throttling_error(e):
+            return {"error": "The AI service is over its rate limit right now. Please try again in a minute."}
         return {"error": str(e)}
 
+    await _store_result(cache_key, prompt_type, result)
+    return result
+
+async def _generate_text_async(prompt_parts: list, generation_config: dict, priority: int) -> str:
+    """
+    Makes one model call through the rate limiter and returns its text.
+    Throttled calls (429) are retried up to GEMINI_MAX_RETRIES times with jittered exponential backoff.
+    """
+    estimated_tokens = estimate_tokens(prompt_parts)
+    for attempt in range(settings.GEMINI_MAX_RETRIES + 1):
+        await gemini_limiter.acquire(priority, estimated_tokens)
+        outcome, used_tokens = "cancelled", None
+        try:
+            genai = load_sdk()
+            model = genai.GenerativeModel(MODEL_NAME)
+            response = await model.generate_content_async(
+                prompt_parts,
+                generation_config=genai.types.GenerationConfig(**generation_config)
+            )
+            outcome, used_tokens = "success", _used_tokens(response)
+            return response.text
+        except Exception as e:
+            outcome = "throttled" if is_throttling_error(e) else "error"
+            if outcome == "error" or attempt == settings.GEMINI_MAX_RETRIES:
+                raise
+        finally:
+            gemini_limiter.release(outcome, estimated_tokens, used_tokens)
+        await _backoff(attempt)
+
+async def stream_gemini_text_async(prompt_parts: list, prompt_type: str = None, priority: int = PRIORITY_INTERACTIVE):
+    """
+    Streams the model's raw text output chunk by chunk, through the same rate limiter
+    as call_gemini_json_async. Pass prompt_type to stream in JSON mode with its response schema.
+    A throttled call is retried while nothing has been streamed yet.
+    Errors are raised to the caller, which decides how to report them.
+    """
+    estimated_tokens = estimate_tokens(prompt_parts)
+    for attempt in range(settings.GEMINI_MAX_RETRIES + 1):
+        await gemini_limiter.acquire(priority, estimated_tokens)
+        outcome, used_tokens, streamed = "cancelled", None, False
+        try:
+            genai = load_sdk()
+            model = genai.GenerativeModel(MODEL_NAME)
+            response = await model.generate_content_async(
+                prompt_parts,
+                generation_config=genai.types.GenerationConfig(**_generation_config(None, prompt_type)),
+                stream=True
+            )
+            async for chunk in response:
+                if chunk.text:
+                    streamed = True
+                    yield chunk.text
+            outcome, used_tokens = "success", _used_tokens(response)
+            return
+        except Exception as e:
+            outcome = "throttled" if is_throttling_error(e) else "error"
+            if outcome == "error" or streamed or attempt == settings.GEMINI_MAX_RETRIES:
+                raise
+        finally:
+            gemini_limiter.release(outcome, estimated_tokens, used_tokens)
+        await _backoff(attempt)
+
+async def _backoff(attempt: int):
+    delay = min(settings.GEMINI_RETRY_BASE_SECONDS * 2 ** attempt, settings.GEMINI_RETRY_MAX_SECONDS)
+    delay *= random.uniform(0.5, 1.0)  # Jitter, so throttled callers do not retry in lockstep
+    metrics.retries_total.inc(component="gemini")
+    print(f"Gemini rate limited, retrying in {delay:.1f}s (attempt {attempt + 1} of {settings.GEMINI_MAX_RETRIES}).")
+    await asyncio.sleep(delay)
+
+def _used_tokens(response) -> int | None:
+    """Returns the total tokens a response reports using, if the SDK provides it."""
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None) or None
+
+def extract_partial_json_string(text: str, key: str) -> str | None:
+    """
+    Returns the decoded (possibly incomplete) value of a top-level string field from
+    JSON that is still being streamed, e.g. the "post" text of a half-generated response.
+    Returns None until the field has started.
+    """
+    match = re.search(r'"' + re.escape(key) + r'"\s*:\s*"', text)
+    if not match:
+        return None
+
+    escapes = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+    chars = []
+    i = match.end()
+    while i < len(text):
+        char = text[i]
+        if char == '"':
+            break
+        if char != '\\':
+            chars.append(char)
+            i += 1
+            continue
+        # Stop before an escape sequence that has not fully arrived yet.
+        if i + 1 >= len(text):
+            break
+        code = text[i + 1]
+        if code == 'u':
+            if i + 6 > len(text):
+                break
+            try:
+                chars.append(chr(int(text[i + 2:i + 6], 16)))
+            except ValueError:
+                pass
+            i += 6
+        else:
+            chars.append(escapes.get(code, code))
+            i += 2
+    return "".join(chars)
+
+def _generation_config(temperature: float = None, prompt_type: str = None) -> dict:
+    """
+    Returns the default generation config with any per-call overrides applied. JSON prompts
+    use JSON response mode, with the prompt type's response schema when it has one.
+    """
+    config = dict(GENERATION_CONFIG)
+    if temperature is not None:
+        config["temperature"] = temperature
+    if prompt_type is not None:
+        config["response_mime_type"] = "application/json"
+        schema = schemas.get_schema(prompt_type)
+        if schema is not None:
+            config["response_schema"] = schema
+    return config
+
+def _count_parse(path: str):
+    with _parse_stats_lock:
+        parse_stats[path] += 1
+
+def _collect_parse_stats():
+    with _parse_stats_lock:
+        samples = {(("path", path),): count for path, count in parse_stats.items()}
+    return [("influra_gemini_json_parse_total", "counter", "How each Gemini JSON response was obtained.", samples)]
+
+metrics.register_collector(_collect_parse_stats)
+
+def _parse_and_validate(text: str, prompt_type: str):
+    """
+    Parses a response and checks it against the prompt type's schema. Returns (result, path, None)
+    on success, where path is how it was parsed, or (None, None, problem) describing what is wrong.
+    """
+    result, path = _parse_json(text)
+    if path is None:
+        return None, None, "it was not valid JSON"
+    schema = schemas.get_schema(prompt_type)
+    problem = schemas.validate(result, schema) if schema is not None else None
+    if problem is not None:
+        return None, None, f"it did not match the schema ({problem})"
+    return result, path, None
+
+def _repaired_result(text: str, prompt_type: str):
+    """Returns the parsed repair response, or an error dictionary if it is still unusable."""
+    result, _, problem = _parse_and_validate(text, prompt_type)
+    if problem is None:
+        _count_parse("repaired")
+        return result
+    _count_parse("failed")
+    return {"error": f"AI response not usable: {problem}", "raw_response": text}
+
+async def _store_result(cache_key: str, prompt_type: str, result):
+    """Caches a parsed response. Failures are never cached, so a retry always gets a fresh attempt."""
+    if not (isinstance(result, dict) and "error" in result):
+        await response_cache.aput(cache_key, prompt_type, result)
+
+def parse_json_response(text_response: str) -> dict:
+    """Parses the model's text output into a dictionary, or returns an error dictionary."""
+    result, path = _parse_json(text_response)
+    if path is None:
+        # If no JSON found, return raw text in an error format
+        return {"error": "AI response not valid JSON", "raw_response": text_response}
+    return result
+
+def _parse_json(text: str):
+    """
+    Parses JSON as returned, falling back to the contents of a ``` fence (or the outermost
+    braces) with trailing commas removed. Returns (value, "direct" | "tolerant"), or (None, None).
+    """
+    try:
+        # Try direct JSON parsing first
+        return json.loads(text), "direct"
+    except json.JSONDecodeError:
+        pass
+
+    fence_match = _JSON_FENCE.search(text)
+    if fence_match:
+        candidate = fence_match.group(1)
+    else:
+        starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+        end = max(text.rfind("}"), text.rfind("]"))
+        if not starts or end < min(starts):
+            return None, None
+        candidate = text[min(starts):end + 1]
+
+    for attempt in (candidate, _TRAILING_COMMA.sub(r"\1", candidate)):
+        try:
+            return json.loads(attempt), "tolerant"
+        except json.JSONDecodeError:
+            continue
+    return None, None
+
 # --- Smoke Test ---
 # To run this test:
 # 1. Make sure you have a .env file with your GEMINI_API_KEY.
@@ -66,7 +334,7 @@ if __name__ == '__main__':
         # Test Case 1: A simple prompt that should return JSON
         test_prompt_parts = ['Return a JSON object with a key "greeting" and value "hello".']
         print(f"\nTesting with prompt: '{test_prompt_parts}'")
-        result = call_gemini_json(test_prompt_parts)
+        result = asyncio.run(call_gemini_json_async(test_prompt_parts))
         
         print(f"Result: {result}")
         assert "greeting" in result and result["greeting"] == "hello"
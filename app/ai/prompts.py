@@ -14,6 +14,15 @@ TRENDS_PROMPT_TEMPLATE = """
 From the text below, extract 3-5 concise, non-generic insights as a JSON array 'insights'. Keep each <= 18 words. Text: <<<{}>>>
 """
 
+# Prompt templates for long trend texts: insights are extracted from each chunk, then merged
+TRENDS_CHUNK_PROMPT_TEMPLATE = """
+The text below is part {} of {} of a longer article. Extract up to 5 concise, non-generic insights from this part as a JSON array 'insights'. Keep each <= 18 words. Text: <<<{}>>>
+"""
+
+TRENDS_REDUCE_PROMPT_TEMPLATE = """
+The insights below were extracted from consecutive parts of one article. Merge duplicates and overlapping points, and return the 3-5 most important, concise, non-generic insights as a JSON array 'insights'. Keep each <= 18 words. Insights: <<<{}>>>
+"""
+
 # Prompt template for image analysis
 IMAGE_PROMPT_TEMPLATE = """
 Analyze the image and provide a concise description and a list of relevant tags in JSON format with keys 'description' and 'tags[]'.
@@ -29,6 +38,16 @@ Image Analysis: <<<{}>>>
 {}
 """
 
+# Appended to the post prompt when several variants are generated at once, so each call takes its own angle
+POST_VARIANT_TEMPLATE = """
+This is variant {} of {}. Take a distinct angle, opening line and structure from the other variants.
+"""
+
+# Sent once when a response cannot be parsed or does not match its schema, instead of regenerating from scratch
+JSON_REPAIR_PROMPT_TEMPLATE = """
+Your previous response could not be used: {}. Return only the corrected JSON, matching this JSON schema: {}. Previous response: <<<{}>>>
+"""
+
 def build_profile_prompt(text: str) -> str:
     """Builds the prompt for profile analysis."""
     return PROFILE_PROMPT_TEMPLATE.format(text)
@@ -37,6 +56,14 @@ def build_trends_prompt(text: str) -> str:
     """Builds the prompt for trend analysis."""
     return TRENDS_PROMPT_TEMPLATE.format(text)
 
+def build_trends_chunk_prompt(chunk: str, index: int, total: int) -> str:
+    """Builds the prompt for extracting insights from one chunk of a long trend text."""
+    return TRENDS_CHUNK_PROMPT_TEMPLATE.format(index + 1, total, chunk)
+
+def build_trends_reduce_prompt(insights: list[str]) -> str:
+    """Builds the prompt that merges the insights of every chunk into the final 3-5."""
+    return TRENDS_REDUCE_PROMPT_TEMPLATE.format(json.dumps(insights))
+
 def build_image_prompt() -> str:
     """
     Builds the prompt for image analysis. No text input needed as the image is the primary input.
@@ -54,3 +81,15 @@ def build_post_prompt(profile_summary: dict, trend_insights: dict, image_analysi
     manual_context_section = f"Manual Context from User: <<<{{}}>>>".format(manual_context) if manual_context else ""
 
     return POST_PROMPT_TEMPLATE.format(profile_summary_json, trend_insights_json, image_analysis_json, manual_context_section)
+
+def build_post_variant_prompt(post_prompt: str, index: int, total: int) -> str:
+    """
+    Builds the prompt for one of several post variants from an already built post prompt.
+    """
+    return post_prompt + POST_VARIANT_TEMPLATE.format(index + 1, total)
+
+def build_json_repair_prompt(raw_response: str, problem: str, schema: dict | None) -> str:
+    """
+    Builds the prompt asking the model to fix a response that was not valid JSON or did not match its schema.
+    """
+    return JSON_REPAIR_PROMPT_TEMPLATE.format(problem, json.dumps(schema) if schema else "any JSON value", raw_response)
@@ -0,0 +1,177 @@
+"""
+Client-side admission control for Gemini calls.
+
+Every async model call goes through one process-wide GeminiLimiter, which admits a call only when:
+
+- the request and token buckets have budget left (GEMINI_RPM / GEMINI_TPM, refilled continuously);
+- fewer calls are in flight than the adaptive concurrency limit, which grows by about one per
+  round of successful calls and halves on a 429 / ResourceExhausted (AIMD), between
+  GEMINI_MIN_CONCURRENCY and GEMINI_MAX_CONCURRENCY.
+
+Waiting callers are admitted strictly by priority class, then in arrival order, so interactive
+requests overtake queued background work.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from app.config import settings
+from app import metrics
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+# Approximate token costs used to charge the token bucket before a call; corrected from usage metadata afterwards.
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 258
+# The limit is halved at most once per this many seconds, so one burst of 429s counts as one signal.
+DECREASE_COOLDOWN_SECONDS = 2.0
+
+
+def is_throttling_error(error: Exception) -> bool:
+    """True for quota errors (HTTP 429 / RESOURCE_EXHAUSTED) that call for backing off and retrying."""
+    # Imported here, not at startup: any Gemini error means the SDK (and with it api_core) is loaded already.
+    from google.api_core import exceptions as google_exceptions
+    return isinstance(error, google_exceptions.TooManyRequests)
+
+
+def estimate_tokens(prompt_parts) -> int:
+    """Estimates the tokens a call will use: its prompt plus a typical response."""
+    parts = prompt_parts if isinstance(prompt_parts, list) else [prompt_parts]
+    tokens = settings.GEMINI_OUTPUT_TOKENS_ESTIMATE
+    for part in parts:
+        if isinstance(part, str):
+            tokens += math.ceil(len(part) / CHARS_PER_TOKEN)
+        elif isinstance(part, dict) and "data" in part:
+            tokens += IMAGE_TOKENS
+        elif isinstance(part, dict) and "text" in part:
+            tokens += math.ceil(len(part["text"]) / CHARS_PER_TOKEN)
+    return tokens
+
+
+class TokenBucket:
+    """
+    A continuously refilled budget of per_minute units that holds up to burst_seconds' worth.
+    A per_minute of 0 or less disables the bucket.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = 10):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.available = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount can be taken. Amounts above the capacity only need a full bucket."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        needed = min(amount, self.capacity)
+        return 0.0 if self.available >= needed else (needed - self.available) / self.rate
+
+    def take(self, amount: float):
+        """
+        Takes amount, going into debt if needed; later callers wait for the debt to refill.
+        A negative amount refunds an overestimate, never past the capacity.
+        """
+        if self.rate > 0:
+            self._refill()
+            self.available = min(self.capacity, self.available - amount)
+
+
+class GeminiLimiter:
+    """Admits model calls within the rate budgets and the adaptive concurrency limit, by priority."""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, min_concurrency: int, max_concurrency: int):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self._waiters = []  # heap of (priority, arrival, future, estimated tokens)
+        self._arrivals = itertools.count()
+        self._timer = None
+        self._last_decrease = 0.0
+        self.stats = {"admitted": 0, "throttled": 0, "waited_seconds": 0.0}
+
+    async def acquire(self, priority: int, estimated_tokens: int):
+        """Waits until the call may start. Every successful acquire must be paired with release()."""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._arrivals), future, estimated_tokens))
+        started = time.monotonic()
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Cancelled waiters are skipped by _dispatch; one admitted just before the cancel gives its slot back.
+            if future.done() and not future.cancelled():
+                self.release("cancelled")
+            raise
+        self.stats["waited_seconds"] += time.monotonic() - started
+
+    def release(self, outcome: str, estimated_tokens: int = 0, used_tokens: int = None):
+        """
+        Ends a call. outcome is "success", "throttled" (429), "error" or "cancelled".
+        Successes grow the concurrency limit additively, throttling halves it.
+        """
+        self.in_flight -= 1
+        if outcome == "success":
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+        elif outcome == "throttled":
+            self.stats["throttled"] += 1
+            now = time.monotonic()
+            if now - self._last_decrease >= DECREASE_COOLDOWN_SECONDS:
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                self._last_decrease = now
+        if used_tokens is not None:
+            # Charge (or refund) the difference between the estimate and what the call really used.
+            self.tokens.take(used_tokens - estimated_tokens)
+        self._dispatch()
+
+    def _dispatch(self):
+        """Admits waiters from the head of the queue while the budgets and concurrency limit allow."""
+        while self._waiters:
+            _, _, future, estimated_tokens = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_flight >= int(self.limit):
+                return  # release() dispatches again
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+            if wait > 0:
+                if self._timer is not None:
+                    self._timer.cancel()
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self.in_flight += 1
+            self.requests.take(1)
+            self.tokens.take(estimated_tokens)
+            self.stats["admitted"] += 1
+            future.set_result(None)
+
+    def collect_metrics(self):
+        return [
+            ("influra_gemini_concurrency_limit", "gauge", "Current adaptive limit on concurrent Gemini calls.", {(): int(self.limit)}),
+            ("influra_gemini_in_flight", "gauge", "Gemini calls currently running.", {(): self.in_flight}),
+            ("influra_gemini_waiting", "gauge", "Gemini calls waiting for admission.", {(): len(self._waiters)}),
+            ("influra_gemini_admitted_total", "counter", "Gemini calls admitted by the rate limiter.", {(): self.stats["admitted"]}),
+            ("influra_gemini_throttled_total", "counter", "Gemini calls rejected with 429.", {(): self.stats["throttled"]}),
+            ("influra_gemini_wait_seconds_total", "counter", "Time calls spent waiting for admission.", {(): self.stats["waited_seconds"]}),
+        ]
+
+
+gemini_limiter = GeminiLimiter(
+    settings.GEMINI_RPM,
+    settings.GEMINI_TPM,
+    settings.GEMINI_MIN_CONCURRENCY,
+    settings.GEMINI_MAX_CONCURRENCY,
+)
+metrics.register_collector(gemini_limiter.collect_metrics)
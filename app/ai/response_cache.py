@@ -0,0 +1,313 @@
+"""
+A two-tier cache for Gemini JSON responses.
+
+The first tier is a bounded in-process LRU, the second a SQLite file stored next to
+the main database so cached answers survive restarts. Entries are keyed by a hash
+of the prompt parts (including image bytes), the model name and the generation config.
+Async callers use aget()/aput() and make_cache_key_async(), which keep the SQLite tier
+and the hashing of large images on a worker thread.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from fastapi.concurrency import run_in_threadpool
+from app.config import settings
+from app import metrics
+
+# Default time-to-live (seconds) per prompt type. Can be overridden with the
+# GEMINI_CACHE_TTLS setting, e.g. "profile=86400,post=300".
+DEFAULT_TTLS = {
+    "profile": 7 * 24 * 3600,
+    "trends": 24 * 3600,
+    "image": 7 * 24 * 3600,
+    "post": 15 * 60,
+    "default": 3600,
+}
+
+# Prompts carrying more image bytes than this are hashed on a worker thread by make_cache_key_async().
+INLINE_HASH_BYTES = 64 * 1024
+
+
+def _parse_ttls(raw: str) -> dict:
+    """Parses a 'type=seconds,type=seconds' string on top of the default TTLs."""
+    ttls = dict(DEFAULT_TTLS)
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        prompt_type, seconds = item.split("=", 1)
+        try:
+            ttls[prompt_type.strip()] = int(seconds)
+        except ValueError:
+            print(f"Ignoring invalid cache TTL entry: {item!r}")
+    return ttls
+
+
+def make_cache_key(prompt_parts, model_name: str, generation_config: dict) -> str:
+    """
+    Builds a stable cache key from the prompt parts, the model name and the generation config.
+    Each part is length-prefixed so different splits of the same bytes never collide.
+    """
+    digest = hashlib.sha256()
+
+    def feed(tag: bytes, payload: bytes):
+        digest.update(tag)
+        digest.update(len(payload).to_bytes(8, "big"))
+        digest.update(payload)
+
+    feed(b"model", model_name.encode("utf-8"))
+    feed(b"config", json.dumps(generation_config, sort_keys=True, default=str).encode("utf-8"))
+
+    parts = prompt_parts if isinstance(prompt_parts, list) else [prompt_parts]
+    for part in parts:
+        if isinstance(part, str):
+            feed(b"text", part.encode("utf-8"))
+        elif isinstance(part, dict) and "data" in part:
+            feed(b"mime", str(part.get("mime_type", "")).encode("utf-8"))
+            feed(b"blob", bytes(part["data"]))
+        elif isinstance(part, dict) and "text" in part:
+            feed(b"text", part["text"].encode("utf-8"))
+        else:
+            feed(b"repr", repr(part).encode("utf-8"))
+
+    return digest.hexdigest()
+
+
+async def make_cache_key_async(prompt_parts, model_name: str, generation_config: dict) -> str:
+    """make_cache_key() for the event loop: prompts with large images are hashed on a worker thread."""
+    parts = prompt_parts if isinstance(prompt_parts, list) else [prompt_parts]
+    image_bytes = sum(len(part["data"]) for part in parts if isinstance(part, dict) and "data" in part)
+    if image_bytes > INLINE_HASH_BYTES:
+        return await run_in_threadpool(make_cache_key, prompt_parts, model_name, generation_config)
+    return make_cache_key(prompt_parts, model_name, generation_config)
+
+
+class MemoryTier:
+    """A thread-safe LRU bounded by both entry count and total payload size."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, payload)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def put(self, key: str, payload: str, expires_at: float) -> int:
+        """Stores a payload and returns the number of entries evicted to make room."""
+        if len(payload) > self.max_bytes:
+            return 0
+        evicted = 0
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, payload)
+            self._size += len(payload)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                evicted += 1
+        return evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key: str):
+        _, payload = self._entries.pop(key)
+        self._size -= len(payload)
+
+
+class SqliteTier:
+    """A persistent cache tier stored in its own SQLite file, evicted by least recent access."""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS gemini_cache (
+                       key TEXT PRIMARY KEY,
+                       prompt_type TEXT NOT NULL,
+                       payload TEXT NOT NULL,
+                       size INTEGER NOT NULL,
+                       expires_at REAL NOT NULL,
+                       last_access REAL NOT NULL
+                   )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_gemini_cache_last_access ON gemini_cache (last_access)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> tuple[str, float] | None:
+        """Returns (payload, expires_at) for a live entry, or None."""
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            row = conn.execute(
+                "SELECT payload, expires_at FROM gemini_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                conn.execute("DELETE FROM gemini_cache WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute("UPDATE gemini_cache SET last_access = ? WHERE key = ?", (now, key))
+            conn.commit()
+            return row[0], row[1]
+
+    def put(self, key: str, prompt_type: str, payload: str, expires_at: float) -> int:
+        """Stores a payload, then evicts expired and least recently used rows over the size budget."""
+        now = time.time()
+        evicted = 0
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute(
+                """INSERT OR REPLACE INTO gemini_cache (key, prompt_type, payload, size, expires_at, last_access)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (key, prompt_type, payload, len(payload), expires_at, now)
+            )
+            evicted += conn.execute("DELETE FROM gemini_cache WHERE expires_at <= ?", (now,)).rowcount
+            total_size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM gemini_cache").fetchone()[0]
+            if total_size > self.max_bytes:
+                rows = conn.execute("SELECT key, size FROM gemini_cache ORDER BY last_access ASC").fetchall()
+                for old_key, size in rows:
+                    if total_size <= self.max_bytes:
+                        break
+                    conn.execute("DELETE FROM gemini_cache WHERE key = ?", (old_key,))
+                    total_size -= size
+                    evicted += 1
+            conn.commit()
+        return evicted
+
+    def clear(self):
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute("DELETE FROM gemini_cache")
+            conn.commit()
+
+
+class ResponseCache:
+    """Combines the memory and SQLite tiers and keeps hit/miss counters."""
+
+    def __init__(self, memory: MemoryTier, disk: SqliteTier | None, ttls: dict):
+        self.memory = memory
+        self.disk = disk
+        self.ttls = ttls
+        self._stats_lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _count(self, name: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def ttl_for(self, prompt_type: str) -> int:
+        return self.ttls.get(prompt_type, self.ttls["default"])
+
+    def get(self, key: str) -> dict | None:
+        """Returns a fresh copy of the cached response, or None on a miss."""
+        payload = self._get_memory(key)
+        if payload is None and self.disk is not None:
+            payload = self._get_disk(key)
+        return self._loaded(payload)
+
+    async def aget(self, key: str) -> dict | None:
+        """Like get(), but reads the SQLite tier on a worker thread."""
+        payload = self._get_memory(key)
+        if payload is None and self.disk is not None:
+            payload = await run_in_threadpool(self._get_disk, key)
+        return self._loaded(payload)
+
+    def put(self, key: str, prompt_type: str, value: dict):
+        """Stores a response in both tiers. A TTL of zero disables caching for that prompt type."""
+        entry = self._put_memory(key, prompt_type, value)
+        if entry is not None and self.disk is not None:
+            self._put_disk(key, prompt_type, *entry)
+
+    async def aput(self, key: str, prompt_type: str, value: dict):
+        """Like put(), but writes the SQLite tier on a worker thread."""
+        entry = self._put_memory(key, prompt_type, value)
+        if entry is not None and self.disk is not None:
+            await run_in_threadpool(self._put_disk, key, prompt_type, *entry)
+
+    def _get_memory(self, key: str) -> str | None:
+        payload = self.memory.get(key)
+        if payload is not None:
+            self._count("memory_hits")
+        return payload
+
+    def _get_disk(self, key: str) -> str | None:
+        """Reads the SQLite tier and promotes a hit into memory."""
+        try:
+            found = self.disk.get(key)
+        except sqlite3.Error as e:
+            print(f"Error reading Gemini response cache: {e}")
+            return None
+        if found is None:
+            return None
+        payload, expires_at = found
+        self._count("disk_hits")
+        self._count("evictions", self.memory.put(key, payload, expires_at))
+        return payload
+
+    def _loaded(self, payload: str | None) -> dict | None:
+        if payload is None:
+            self._count("misses")
+            return None
+        return json.loads(payload)
+
+    def _put_memory(self, key: str, prompt_type: str, value: dict) -> tuple[str, float] | None:
+        """Stores a response in memory and returns (payload, expires_at) for the disk tier, or None if not cached."""
+        ttl = self.ttl_for(prompt_type)
+        if ttl <= 0:
+            return None
+        payload = json.dumps(value)
+        expires_at = time.time() + ttl
+        self._count("stores")
+        self._count("evictions", self.memory.put(key, payload, expires_at))
+        return payload, expires_at
+
+    def _put_disk(self, key: str, prompt_type: str, payload: str, expires_at: float):
+        try:
+            self._count("evictions", self.disk.put(key, prompt_type, payload, expires_at))
+        except sqlite3.Error as e:
+            print(f"Error writing Gemini response cache: {e}")
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def collect_metrics(self):
+        with self._stats_lock:
+            samples = {(("event", name),): count for name, count in self.stats.items()}
+        return [("influra_gemini_cache_events_total", "counter", "Gemini response cache hits per tier, misses, stores and evictions.", samples)]
+
+
+response_cache = ResponseCache(
+    MemoryTier(settings.GEMINI_CACHE_MAX_ENTRIES, settings.GEMINI_CACHE_MAX_MEMORY_BYTES),
+    SqliteTier(settings.GEMINI_CACHE_DB, settings.GEMINI_CACHE_MAX_DISK_BYTES) if settings.GEMINI_CACHE_DB else None,
+    _parse_ttls(settings.GEMINI_CACHE_TTLS),
+)
+metrics.register_collector(response_cache.collect_metrics)
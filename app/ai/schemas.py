@@ -0,0 +1,79 @@
+"""
+Response schemas for each prompt type.
+
+The schemas are passed to Gemini as `response_schema` in JSON response mode, so the model is
+constrained to the shape the app expects, and are checked again with validate() after parsing.
+They use the OpenAPI subset Gemini accepts (upper-case type names).
+"""
+
+_STRING = {"type": "STRING"}
+_STRING_LIST = {"type": "ARRAY", "items": _STRING}
+
+RESPONSE_SCHEMAS = {
+    "profile": {
+        "type": "OBJECT",
+        "properties": {
+            "strengths": _STRING_LIST,
+            "tone": _STRING,
+            "niche": _STRING,
+            "voice": _STRING,
+        },
+        "required": ["strengths", "tone", "niche", "voice"],
+    },
+    "trends": {
+        "type": "OBJECT",
+        "properties": {"insights": _STRING_LIST},
+        "required": ["insights"],
+    },
+    "image": {
+        "type": "OBJECT",
+        "properties": {
+            "description": _STRING,
+            "tags": _STRING_LIST,
+        },
+        "required": ["description", "tags"],
+    },
+    "post": {
+        "type": "OBJECT",
+        "properties": {
+            "post": _STRING,
+            "hashtags": _STRING_LIST,
+        },
+        "required": ["post", "hashtags"],
+    },
+}
+
+_PYTHON_TYPES = {
+    "OBJECT": dict,
+    "ARRAY": list,
+    "STRING": str,
+    "NUMBER": (int, float),
+    "INTEGER": int,
+    "BOOLEAN": bool,
+}
+
+
+def get_schema(prompt_type: str) -> dict | None:
+    return RESPONSE_SCHEMAS.get(prompt_type)
+
+
+def validate(value, schema: dict, path: str = "$") -> str | None:
+    """Checks a parsed response against a schema. Returns a description of the first problem, or None."""
+    expected = _PYTHON_TYPES[schema["type"]]
+    if not isinstance(value, expected) or (schema["type"] != "BOOLEAN" and isinstance(value, bool)):
+        return f"{path} should be {schema['type'].lower()}, got {type(value).__name__}"
+    if schema["type"] == "OBJECT":
+        for key in schema.get("required", []):
+            if key not in value:
+                return f"{path}.{key} is missing"
+        for key, property_schema in schema.get("properties", {}).items():
+            if key in value:
+                problem = validate(value[key], property_schema, f"{path}.{key}")
+                if problem:
+                    return problem
+    elif schema["type"] == "ARRAY" and "items" in schema:
+        for i, item in enumerate(value):
+            problem = validate(item, schema["items"], f"{path}[{i}]")
+            if problem:
+                return problem
+    return None
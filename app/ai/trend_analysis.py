@@ -0,0 +1,91 @@
+"""
+Trend analysis that scales to long articles.
+
+Short texts keep the single TRENDS_PROMPT_TEMPLATE call. Longer texts are split on paragraph
+boundaries into chunks under a token budget; insights are extracted from every chunk
+concurrently (map) and then merged and deduplicated by one final call (reduce), so latency
+is bounded by the slowest chunk rather than growing with the length of the text.
+"""
+import asyncio
+import math
+import re
+from app.ai import gemini_client, prompts
+from app.config import settings
+
+# Rough size of a token for English prose; good enough for budgeting without a tokenizer call.
+CHARS_PER_TOKEN = 4
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def split_into_chunks(text: str, max_tokens: int) -> list[str]:
+    """
+    Splits text into chunks of at most max_tokens (estimated), packing whole paragraphs together.
+    A paragraph that is too long on its own is split on sentence boundaries, and a sentence that
+    is still too long is cut by length.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    pieces = []
+    for paragraph in _PARAGRAPH_BREAK.split(text.strip()):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for sentence in _SENTENCE_BREAK.split(paragraph):
+            pieces.extend(sentence[i:i + max_chars] for i in range(0, len(sentence), max_chars))
+
+    chunks = []
+    current = []
+    current_chars = 0
+    for piece in pieces:
+        # +2 for the paragraph break that joins pieces back together
+        if current and current_chars + 2 + len(piece) > max_chars:
+            chunks.append("\n\n".join(current))
+            current, current_chars = [], 0
+        current.append(piece)
+        current_chars += len(piece) + (2 if current_chars else 0)
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+async def analyze_trends(text: str) -> dict:
+    """Extracts 3-5 insights from a trend or news text, map-reducing over chunks when it is long."""
+    total_tokens = estimate_tokens(text)
+    if total_tokens <= settings.TRENDS_SINGLE_CALL_TOKENS:
+        return await gemini_client.call_gemini_json_async(prompts.build_trends_prompt(text), prompt_type="trends")
+
+    # Grow the chunks rather than the fan-out for very long texts, to bound the number of calls.
+    chunk_tokens = max(settings.TRENDS_CHUNK_TOKENS, math.ceil(total_tokens / settings.TRENDS_MAX_CHUNKS))
+    chunks = split_into_chunks(text, chunk_tokens)
+    chunk_results = await asyncio.gather(*[
+        gemini_client.call_gemini_json_async(
+            prompts.build_trends_chunk_prompt(chunk, i, len(chunks)),
+            prompt_type="trends"
+        )
+        for i, chunk in enumerate(chunks)
+    ])
+
+    insights = []
+    for result in chunk_results:
+        # Results are schema-checked, so anything without an error has an "insights" list.
+        if "error" not in result:
+            insights.extend(result["insights"])
+    if not insights:
+        # Every chunk failed; surface the first error the way the single-call path would.
+        return next((r for r in chunk_results if isinstance(r, dict) and "error" in r), {"error": "No insights found in the text."})
+    print(f"Trend analysis: {len(chunks)} chunks produced {len(insights)} insights to merge.")
+
+    merged = await gemini_client.call_gemini_json_async(prompts.build_trends_reduce_prompt(insights), prompt_type="trends")
+    if isinstance(merged, dict) and isinstance(merged.get("insights"), list):
+        return merged
+    # If the merge call fails, fall back to the first distinct chunk insights.
+    print(f"Trend analysis: merge call failed, using chunk insights: {merged}")
+    return {"insights": list(dict.fromkeys(insights))[:5]}
@@ -13,5 +13,110 @@ class Settings:
         raise ValueError("SECRET_KEY environment variable not set. Please set a strong random string.")
 
     DATABASE_URL: str = os.getenv("DATABASE_URL", "influra_posts.db")
+    SQLITE_BUSY_TIMEOUT: float = float(os.getenv("SQLITE_BUSY_TIMEOUT", "5"))  # seconds to wait on a locked database
+    SQLITE_CACHED_STATEMENTS: int = int(os.getenv("SQLITE_CACHED_STATEMENTS", "256"))
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    SQLITE_CACHE_KIB: int = int(os.getenv("SQLITE_CACHE_KIB", str(16 * 1024)))
+
+    # Number of saved posts rendered per dashboard page / infinite-scroll fetch.
+    POSTS_PAGE_SIZE: int = int(os.getenv("POSTS_PAGE_SIZE", "25"))
+
+    # Per-session analysis state: 'memory' (in-process LRU, single worker only) or 'sqlite'
+    # (shared through the main database, for running several worker processes).
+    ANALYSIS_STORE: str = os.getenv("ANALYSIS_STORE", "memory")
+    ANALYSIS_MEMORY_MAX_BYTES: int = int(os.getenv("ANALYSIS_MEMORY_MAX_BYTES", str(16 * 1024 * 1024)))
+    ANALYSIS_SESSION_TTL_SECONDS: int = int(os.getenv("ANALYSIS_SESSION_TTL_SECONDS", str(24 * 3600)))
+    # Uploaded images are kept as content-addressed files here rather than in memory.
+    ANALYSIS_BLOB_DIR: str = os.getenv("ANALYSIS_BLOB_DIR", os.path.join(os.path.dirname(DATABASE_URL), "influra_blobs"))
+
+    # Limits for uploaded images, enforced while the upload is streamed to disk.
+    IMAGE_MAX_BYTES: int = int(os.getenv("IMAGE_MAX_BYTES", str(10 * 1024 * 1024)))
+    IMAGE_MAX_TOTAL_BYTES: int = int(os.getenv("IMAGE_MAX_TOTAL_BYTES", str(20 * 1024 * 1024)))
+    IMAGE_MAX_COUNT: int = int(os.getenv("IMAGE_MAX_COUNT", "9"))
+
+    # Image normalization (app/image_pipeline.py): worker processes, and the longest side / JPEG
+    # quality of the variant sent to Gemini and of the variant uploaded to LinkedIn.
+    IMAGE_WORKERS: int = int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+    IMAGE_ANALYSIS_MAX_SIDE: int = int(os.getenv("IMAGE_ANALYSIS_MAX_SIDE", "1536"))
+    IMAGE_ANALYSIS_QUALITY: int = int(os.getenv("IMAGE_ANALYSIS_QUALITY", "85"))
+    LINKEDIN_IMAGE_MAX_SIDE: int = int(os.getenv("LINKEDIN_IMAGE_MAX_SIDE", "4096"))
+    LINKEDIN_IMAGE_MAX_BYTES: int = int(os.getenv("LINKEDIN_IMAGE_MAX_BYTES", str(5 * 1024 * 1024)))
+    LINKEDIN_IMAGE_QUALITY: int = int(os.getenv("LINKEDIN_IMAGE_QUALITY", "90"))
+
+    # Near-duplicate detection on save and share: estimated Jaccard similarity of word shingles
+    # at or above which a post counts as a duplicate, and whether to 'warn', 'reject' or do nothing ('off').
+    DEDUPE_THRESHOLD: float = float(os.getenv("DEDUPE_THRESHOLD", "0.7"))
+    DEDUPE_MODE: str = os.getenv("DEDUPE_MODE", "warn")
+
+    # Gemini response cache. The persistent tier lives next to the main database;
+    # set GEMINI_CACHE_DB to an empty string to keep the cache in memory only.
+    GEMINI_CACHE_DB: str = os.getenv("GEMINI_CACHE_DB", os.path.join(os.path.dirname(DATABASE_URL), "influra_cache.db"))
+    GEMINI_CACHE_MAX_ENTRIES: int = int(os.getenv("GEMINI_CACHE_MAX_ENTRIES", "512"))
+    GEMINI_CACHE_MAX_MEMORY_BYTES: int = int(os.getenv("GEMINI_CACHE_MAX_MEMORY_BYTES", str(8 * 1024 * 1024)))
+    GEMINI_CACHE_MAX_DISK_BYTES: int = int(os.getenv("GEMINI_CACHE_MAX_DISK_BYTES", str(128 * 1024 * 1024)))
+    GEMINI_CACHE_TTLS: str = os.getenv("GEMINI_CACHE_TTLS", "")  # e.g. "profile=86400,post=300"
+
+    # Gemini quota for every model call: requests and tokens per minute (0 disables a budget), and the
+    # range the adaptive concurrency limit moves in. It halves on 429s and grows back on successes.
+    GEMINI_RPM: int = int(os.getenv("GEMINI_RPM", "60"))
+    GEMINI_TPM: int = int(os.getenv("GEMINI_TPM", "1000000"))
+    GEMINI_MIN_CONCURRENCY: int = int(os.getenv("GEMINI_MIN_CONCURRENCY", "1"))
+    GEMINI_MAX_CONCURRENCY: int = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+    # Response size assumed when charging a call against GEMINI_TPM before its real usage is known.
+    GEMINI_OUTPUT_TOKENS_ESTIMATE: int = int(os.getenv("GEMINI_OUTPUT_TOKENS_ESTIMATE", "400"))
+    # Retries for calls Gemini throttles (429), with exponential backoff in seconds.
+    GEMINI_MAX_RETRIES: int = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+    GEMINI_RETRY_BASE_SECONDS: float = float(os.getenv("GEMINI_RETRY_BASE_SECONDS", "1"))
+    GEMINI_RETRY_MAX_SECONDS: float = float(os.getenv("GEMINI_RETRY_MAX_SECONDS", "20"))
+
+    # Trend analysis: texts estimated above TRENDS_SINGLE_CALL_TOKENS are split on paragraph
+    # boundaries into chunks of about TRENDS_CHUNK_TOKENS, analyzed concurrently and then merged.
+    TRENDS_SINGLE_CALL_TOKENS: int = int(os.getenv("TRENDS_SINGLE_CALL_TOKENS", "6000"))
+    TRENDS_CHUNK_TOKENS: int = int(os.getenv("TRENDS_CHUNK_TOKENS", "3000"))
+    TRENDS_MAX_CHUNKS: int = int(os.getenv("TRENDS_MAX_CHUNKS", "12"))
+
+    # On-demand request profiling (app/profiling.py), off unless an admin token is set. Requests carrying
+    # the token are profiled, as are PROFILING_SAMPLE_RATE (0-1) of all others; captures shorter than
+    # PROFILING_MIN_DURATION_MS are dropped and only the newest PROFILING_MAX_PROFILES are kept.
+    PROFILING_ADMIN_TOKEN: str = os.getenv("PROFILING_ADMIN_TOKEN", "")
+    PROFILING_SAMPLE_RATE: float = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+    PROFILING_INTERVAL_MS: float = float(os.getenv("PROFILING_INTERVAL_MS", "5"))
+    PROFILING_MIN_DURATION_MS: float = float(os.getenv("PROFILING_MIN_DURATION_MS", "0"))
+    PROFILING_MAX_PROFILES: int = int(os.getenv("PROFILING_MAX_PROFILES", "100"))
+    PROFILING_DIR: str = os.getenv("PROFILING_DIR", os.path.join(os.path.dirname(DATABASE_URL), "influra_profiles"))
+
+    # Outbound HTTP (LinkedIn) transport: timeouts in seconds, pool sizes per host, retry budget.
+    HTTP_CONNECT_TIMEOUT: float = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+    HTTP_READ_TIMEOUT: float = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+    HTTP_POOL_CONNECTIONS: int = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))
+    HTTP_POOL_MAXSIZE: int = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))
+    HTTP_MAX_RETRIES: int = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+    HTTP_BACKOFF_FACTOR: float = float(os.getenv("HTTP_BACKOFF_FACTOR", "0.5"))
+    HTTP_BACKOFF_MAX: float = float(os.getenv("HTTP_BACKOFF_MAX", "10"))
+
+    # LinkedIn identity cache; the TTL applies when a token's expires_in is unknown.
+    IDENTITY_CACHE_DEFAULT_TTL: int = int(os.getenv("IDENTITY_CACHE_DEFAULT_TTL", "3600"))
+    IDENTITY_CACHE_MAX_ENTRIES: int = int(os.getenv("IDENTITY_CACHE_MAX_ENTRIES", "1024"))
+
+    # How the SDKs kept out of app startup (Gemini, OAuth) are loaded once a worker starts:
+    # "background" (a thread, while requests are already served), "eager" (before serving) or "off" (on first use).
+    STARTUP_WARMUP: str = os.getenv("STARTUP_WARMUP", "background")
+
+    # Entries per in-process dashboard cache (rendered post rows, profile summaries, ETags).
+    DASHBOARD_CACHE_MAX_ENTRIES: int = int(os.getenv("DASHBOARD_CACHE_MAX_ENTRIES", "256"))
+
+    # Process-wide number of concurrent LinkedIn image uploads.
+    LINKEDIN_UPLOAD_WORKERS: int = int(os.getenv("LINKEDIN_UPLOAD_WORKERS", "4"))
+    # How long an uploaded image asset is reused for identical bytes before uploading again.
+    LINKEDIN_ASSET_TTL_SECONDS: int = int(os.getenv("LINKEDIN_ASSET_TTL_SECONDS", str(7 * 24 * 3600)))
+
+    # Background publish queue: worker threads per process, retry budget and backoff (seconds).
+    PUBLISH_WORKERS: int = int(os.getenv("PUBLISH_WORKERS", "2"))
+    PUBLISH_MAX_ATTEMPTS: int = int(os.getenv("PUBLISH_MAX_ATTEMPTS", "4"))
+    PUBLISH_RETRY_BASE_SECONDS: float = float(os.getenv("PUBLISH_RETRY_BASE_SECONDS", "5"))
+    PUBLISH_RETRY_MAX_SECONDS: float = float(os.getenv("PUBLISH_RETRY_MAX_SECONDS", "300"))
+    PUBLISH_POLL_SECONDS: float = float(os.getenv("PUBLISH_POLL_SECONDS", "2"))
+    # A job still 'publishing' after this long is assumed abandoned by a dead worker.
+    PUBLISH_STALE_SECONDS: int = int(os.getenv("PUBLISH_STALE_SECONDS", "900"))
 
 settings = Settings()
\ No newline at end of file
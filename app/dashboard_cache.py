@@ -0,0 +1,159 @@
+"""
+Caching for the dashboard at /.
+
+The dashboard is loaded after every form post (it is the redirect target), so most hits show
+exactly what the previous one did:
+
+- The rendered saved-posts rows are cached per status filter and keyed by the posts table's
+  change counter (see table_versions in schema.sql), so they are re-rendered only after a post
+  is inserted, deleted or changes status.
+- Profile summaries are cached per user, keyed by the user_profiles change counter.
+- The page gets an ETag over everything it shows, and a request whose If-None-Match (or
+  If-Modified-Since) still matches is answered 304 before any of the above runs.
+
+The counters come from one query on a two-row table; they are bumped by triggers, so writes
+from other worker processes invalidate this process's entries too.
+"""
+import functools
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from markupsafe import Markup
+from app.config import settings
+from app.db import database
+from app import metrics
+from app.templating import templates
+
+# Templates the dashboard is rendered from; their sources are part of the ETag, so a deploy
+# that changes them never gets a stale 304.
+DASHBOARD_TEMPLATES = ("base.html", "index.html", "_post_rows.html")
+
+
+class _LRU:
+    """A bounded, thread-safe map with least-recently-used eviction."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def setdefault(self, key, value):
+        """Stores value unless the key is already cached, and returns the cached value."""
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = value
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+
+@functools.cache
+def _templates_digest() -> str:
+    digest = hashlib.sha256()
+    for name in DASHBOARD_TEMPLATES:
+        source, _, _ = templates.env.loader.get_source(templates.env, name)
+        digest.update(source.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class DashboardCache:
+    """Rendered post rows, profile summaries and ETag timestamps for the dashboard."""
+
+    def __init__(self, max_entries: int):
+        self._fragments = _LRU(max_entries)  # (posts version, status) -> Markup
+        self._profiles = _LRU(max_entries)  # user ID -> (user_profiles version, summary)
+        self._first_seen = _LRU(max_entries)  # ETag -> when this process first served it
+
+    def posts_fragment(self, status: str | None, posts_version: int) -> Markup:
+        """The first page of saved-post rows for the status filter, rendered once per posts version."""
+        key = (posts_version, status)
+        fragment = self._fragments.get(key)
+        metrics.cache_requests_total.inc(cache="dashboard_posts", result="hit" if fragment is not None else "miss")
+        if fragment is not None:
+            return fragment
+
+        statuses = [status] if status else None
+        saved_posts = database.list_posts(statuses=statuses, limit=settings.POSTS_PAGE_SIZE + 1)
+        has_more = len(saved_posts) > settings.POSTS_PAGE_SIZE
+        with metrics.timed(metrics.template_render_seconds, "template", template="_post_rows.html"):
+            html = templates.get_template("_post_rows.html").render(
+                saved_posts=saved_posts[:settings.POSTS_PAGE_SIZE],
+                has_more=has_more,
+                status_filter=status,
+                is_first_page=True,
+            )
+        fragment = Markup(html)
+        self._fragments.set(key, fragment)
+        return fragment
+
+    def profile_summary(self, user_id: str | None, profiles_version: int) -> dict | None:
+        """The user's stored profile summary, parsed once per user_profiles version."""
+        if not user_id:
+            return None
+        entry = self._profiles.get(user_id)
+        metrics.cache_requests_total.inc(
+            cache="user_profile", result="hit" if entry is not None and entry[0] == profiles_version else "miss"
+        )
+        if entry is not None and entry[0] == profiles_version:
+            return entry[1]
+        summary = database.get_user_profile(user_id)
+        self._profiles.set(user_id, (profiles_version, summary))
+        return summary
+
+    def validators(self, *state) -> dict:
+        """
+        ETag, Last-Modified and Cache-Control headers for a dashboard built from state.
+        Last-Modified is when this process first served the ETag, which is never before the
+        data it covers last changed.
+        """
+        payload = json.dumps([_templates_digest(), *state], sort_keys=True, default=str)
+        etag = '"' + hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32] + '"'
+        first_seen = self._first_seen.setdefault(etag, int(time.time()))
+        return {
+            "ETag": etag,
+            "Last-Modified": formatdate(first_seen, usegmt=True),
+            # The page is per session: browsers may keep it but must revalidate every time.
+            "Cache-Control": "private, no-cache",
+        }
+
+    def is_not_modified(self, request_headers, validators: dict) -> bool:
+        """Whether the client's cached copy is still current, so a 304 can be sent."""
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            # If-None-Match takes precedence; If-Modified-Since is only for clients without ETags.
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            not_modified = "*" in tags or validators["ETag"] in tags
+        else:
+            not_modified = _not_modified_since(request_headers.get("if-modified-since"), validators["Last-Modified"])
+        metrics.cache_requests_total.inc(cache="dashboard_etag", result="hit" if not_modified else "miss")
+        return not_modified
+
+
+def _not_modified_since(if_modified_since: str | None, last_modified: str) -> bool:
+    if not if_modified_since:
+        return False
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False  # Unparseable dates are ignored, as the spec requires
+
+
+dashboard_cache = DashboardCache(settings.DASHBOARD_CACHE_MAX_ENTRIES)
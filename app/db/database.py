@@ -1,84 +1,416 @@
 import sqlite3
 import json
+import os
+import re
+import html
+import threading
+import zlib
+from contextlib import contextmanager
 from app.config import settings
+from app import dedupe, metrics
 
+# Each thread keeps one open connection for its lifetime, so requests do not pay for
+# connection setup and keep their compiled statement caches warm.
+_local = threading.local()
+_all_connections: list[sqlite3.Connection] = []
+_all_connections_lock = threading.Lock()
+_generation = 0  # Bumped by close_all_connections so threads reopen instead of reusing closed connections
 
-def get_conn():
-    """Returns a sqlite3 connection object to the database."""
-    conn = sqlite3.connect(settings.DATABASE_URL)
+# Resolved from this file rather than the working directory, so the app can start from anywhere.
+_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema.sql")
+
+# Times a helper into the db histogram and the request's Server-Timing breakdown.
+_timed = metrics.timed_function(metrics.db_call_seconds, "db")
+
+
+def _connect() -> sqlite3.Connection:
+    """Opens a new connection in autocommit mode and applies the performance pragmas."""
+    conn = sqlite3.connect(
+        settings.DATABASE_URL,
+        timeout=settings.SQLITE_BUSY_TIMEOUT,
+        isolation_level=None,  # Autocommit; multi-statement units use transaction()
+        cached_statements=settings.SQLITE_CACHED_STATEMENTS,
+        check_same_thread=False,  # Only ever used by its owning thread, but closed from the shutdown thread
+    )
     conn.row_factory = sqlite3.Row  # Allows accessing columns by name
+    # WAL lets dashboard reads proceed while a draft or job write is in progress.
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA mmap_size = {int(settings.SQLITE_MMAP_SIZE)}")
+    conn.execute(f"PRAGMA cache_size = -{int(settings.SQLITE_CACHE_KIB)}")
+    conn.execute("PRAGMA temp_store = MEMORY")
     return conn
 
 
+def get_conn() -> sqlite3.Connection:
+    """Returns this thread's sqlite3 connection, opening it on first use. Do not close it."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.generation != _generation:
+        conn = _connect()
+        with _all_connections_lock:
+            _all_connections.append(conn)
+            _local.conn, _local.generation = conn, _generation
+    return conn
+
+
+def close_all_connections():
+    """Closes every per-thread connection, e.g. on application shutdown."""
+    global _generation
+    with _all_connections_lock:
+        _generation += 1
+        for conn in _all_connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                print(f"Error closing database connection: {e}")
+        _all_connections.clear()
+
+
+@contextmanager
+def transaction(immediate: bool = False):
+    """
+    Runs a multi-statement unit of work atomically on this thread's connection.
+    Commits on success and rolls back on error. Nested use joins the outer transaction.
+    Pass immediate=True to take the write lock up front (BEGIN IMMEDIATE).
+    """
+    conn = get_conn()
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+
+
 def init_db():
     """
-    Initializes the database by creating tables from the schema.sql file.
-    This function is idempotent and can be called safely on startup.
+    Creates or migrates the tables from schema.sql. This function is idempotent and can be
+    called safely on startup. A checksum of the applied schema is kept in PRAGMA user_version,
+    so workers starting against an up-to-date database skip the script; it runs again
+    whenever schema.sql changes.
     """
+    with open(_SCHEMA_PATH, 'r') as f:
+        schema = f.read()
+    # user_version is a signed 32-bit integer, and 0 is what a new database starts with
+    schema_version = (zlib.crc32(schema.encode("utf-8")) & 0x7FFFFFFF) or 1
     conn = get_conn()
-    with open('app/db/schema.sql', 'r') as f:
-        conn.executescript(f.read())
-    conn.commit()
-    conn.close()
+    if conn.execute("PRAGMA user_version").fetchone()[0] == schema_version:
+        print("Database schema is up to date.")
+        return
+
+    fts_existed = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'posts_fts'"
+    ).fetchone() is not None
+    conn.executescript(schema)
+    # CREATE TABLE IF NOT EXISTS does not add columns to tables from older versions.
+    _add_missing_column(conn, "posts", "minhash", "BLOB")
+    if not fts_existed:
+        # One-time backfill of the full-text index for posts saved before it existed.
+        conn.execute("INSERT INTO posts_fts (posts_fts) VALUES ('rebuild')")
+    conn.execute(f"PRAGMA user_version = {schema_version}")
     print("Database initialized.")
 
+
+def _add_missing_column(conn: sqlite3.Connection, table: str, column: str, declaration: str):
+    columns = {row['name'] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
 # --- Post Functions ---
 
-def insert_post(content: str, hashtags: str, status: str = 'draft') -> int:
-    """Inserts a new post into the database."""
-    conn = get_conn()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO posts (content, hashtags, status) VALUES (?, ?, ?)",
-        (content, hashtags, status)
+# Public post columns, in output order. Excludes internal columns such as the MinHash signature.
+POST_COLUMNS = ("id", "content", "hashtags", "status", "created_at", "posted_at")
+_POST_SELECT = f"SELECT {', '.join(POST_COLUMNS)} FROM posts"
+
+
+@_timed
+def insert_post(content: str, hashtags: str, status: str = 'draft', signature=None) -> int:
+    """
+    Inserts a new post into the database, storing its MinHash signature and adding it to the
+    near-duplicate index. Pass signature if it was already computed for a duplicate check.
+    """
+    if signature is None:
+        signature = dedupe.minhash_signature(content)
+    cursor = get_conn().execute(
+        "INSERT INTO posts (content, hashtags, status, minhash) VALUES (?, ?, ?, ?)",
+        (content, hashtags, status, dedupe.signature_to_bytes(signature))
     )
-    conn.commit()
-    last_id = cursor.lastrowid
-    conn.close()
-    return last_id
+    dedupe.index.add(cursor.lastrowid, signature)
+    return cursor.lastrowid
+
+
+@_timed
+def get_post(post_id: int) -> dict | None:
+    """Retrieves a single post by its ID."""
+    row = get_conn().execute(f"{_POST_SELECT} WHERE id = ?", (post_id,)).fetchone()
+    return dict(row) if row else None
+
+
+@_timed
+def get_posts(post_ids: list[int]) -> list[dict]:
+    """Retrieves several posts by ID, in no particular order."""
+    if not post_ids:
+        return []
+    placeholders = ','.join('?' for _ in post_ids)
+    cursor = get_conn().execute(f"{_POST_SELECT} WHERE id IN ({placeholders})", list(post_ids))
+    return [dict(row) for row in cursor.fetchall()]
+
 
+# How many post_signature_log entries are kept; a process that falls further behind reloads its index.
+DEDUPE_LOG_KEEP = 10000
 
-def list_posts() -> list[dict]:
-    """Lists all posts from the database."""
+_dedupe_seq = 0  # Last post_signature_log entry reflected in this process's dedupe.index
+_dedupe_lock = threading.Lock()
+
+
+def load_dedupe_index():
+    """
+    Rebuilds the in-memory near-duplicate index from the stored signatures on startup,
+    computing and storing signatures for posts saved before they existed.
+    """
     conn = get_conn()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM posts ORDER BY created_at DESC")
-    posts = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return posts
+    missing = conn.execute("SELECT id, content FROM posts WHERE minhash IS NULL").fetchall()
+    if missing:
+        with transaction():
+            for row in missing:
+                signature = dedupe.minhash_signature(row['content'])
+                conn.execute(
+                    "UPDATE posts SET minhash = ? WHERE id = ?",
+                    (dedupe.signature_to_bytes(signature), row['id'])
+                )
+        print(f"Computed near-duplicate signatures for {len(missing)} post(s).")
+
+    with _dedupe_lock:
+        _reload_dedupe_index(conn)
+    # Old entries are only needed by workers that are far behind, and those reload anyway.
+    conn.execute("DELETE FROM post_signature_log WHERE seq <= ?", (_dedupe_seq - DEDUPE_LOG_KEEP,))
+
+
+def _reload_dedupe_index(conn: sqlite3.Connection):
+    # Callers hold _dedupe_lock. The log position is read first, so changes made during the
+    # reload are replayed by the next sync rather than missed.
+    global _dedupe_seq
+    _dedupe_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM post_signature_log").fetchone()[0]
+    dedupe.index.clear()
+    cursor = conn.execute("SELECT id, minhash FROM posts WHERE minhash IS NOT NULL")
+    while True:
+        rows = cursor.fetchmany(500)
+        if not rows:
+            break
+        for row in rows:
+            dedupe.index.add(row['id'], dedupe.signature_from_bytes(row['minhash']))
+
+
+@_timed
+def sync_dedupe_index():
+    """
+    Brings this process's near-duplicate index up to date with posts saved or deleted by any
+    worker process since the last sync. Usually a single indexed query that returns nothing.
+    """
+    global _dedupe_seq
+    conn = get_conn()
+    with _dedupe_lock:
+        rows = conn.execute(
+            """SELECT log.seq, log.post_id, posts.minhash FROM post_signature_log AS log
+               LEFT JOIN posts ON posts.id = log.post_id
+               WHERE log.seq > ? ORDER BY log.seq""",
+            (_dedupe_seq,)
+        ).fetchall()
+        if not rows:
+            return
+        if rows[0]['seq'] > _dedupe_seq + 1:
+            # Entries this process has not seen were pruned (or a write rolled back); start over.
+            _reload_dedupe_index(conn)
+            return
+        for row in rows:
+            # The post's current signature, not the logged event, decides: replaying is idempotent.
+            if row['minhash'] is None:
+                dedupe.index.remove(row['post_id'])
+            else:
+                dedupe.index.add(row['post_id'], dedupe.signature_from_bytes(row['minhash']))
+        _dedupe_seq = rows[-1]['seq']
+
+
+@_timed
+def list_posts(
+    statuses: list[str] = None,
+    after_created_at: str = None,
+    after_id: int = None,
+    limit: int = None
+) -> list[dict]:
+    """
+    Lists posts newest first, one keyset page at a time.
+
+    Args:
+        statuses: Only return posts with one of these statuses.
+        after_created_at, after_id: The (created_at, id) of the last post on the previous page.
+        limit: The page size. None returns every remaining post.
+    """
+    clauses = []
+    params = []
+    if statuses:
+        clauses.append(f"status IN ({','.join('?' for _ in statuses)})")
+        params.extend(statuses)
+    if after_created_at is not None and after_id is not None:
+        # Row-value comparison lets SQLite seek straight into the (created_at, id) index.
+        clauses.append("(created_at, id) < (?, ?)")
+        params.extend([after_created_at, after_id])
+
+    query = _POST_SELECT
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " ORDER BY created_at DESC, id DESC"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    cursor = get_conn().execute(query, params)
+    return [dict(row) for row in cursor.fetchall()]
+
+
+def iter_posts(
+    statuses: list[str] = None,
+    created_from: str = None,
+    created_before: str = None,
+    batch_size: int = 500
+):
+    """
+    Yields posts newest first as dicts, fetching batch_size rows at a time from a server-side cursor,
+    so memory stays constant regardless of table size.
+
+    Uses its own connection, closed when the generator finishes or is closed, because streaming
+    responses may advance the generator from different threadpool threads.
+
+    Args:
+        statuses: Only yield posts with one of these statuses.
+        created_from: Inclusive lower bound on created_at, e.g. "2025-01-31".
+        created_before: Exclusive upper bound on created_at.
+    """
+    clauses = []
+    params = []
+    if statuses:
+        clauses.append(f"status IN ({','.join('?' for _ in statuses)})")
+        params.extend(statuses)
+    if created_from:
+        clauses.append("created_at >= ?")
+        params.append(created_from)
+    if created_before:
+        clauses.append("created_at < ?")
+        params.append(created_before)
+
+    query = _POST_SELECT
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " ORDER BY created_at DESC, id DESC"
+
+    conn = _connect()
+    try:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+    finally:
+        conn.close()
+
+
+# Private-use markers around matched terms in search snippets, swapped for <mark> tags after escaping.
+_SNIPPET_START, _SNIPPET_END = "\ue000", "\ue001"
+
 
+def _fts_query(text: str) -> str | None:
+    """
+    Turns free text into a safe FTS5 query: every word is quoted (so user input can never be
+    FTS5 syntax) and the last word matches as a prefix, for search-as-you-type.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    quoted = [f'"{word}"' for word in words]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+@_timed
+def search_posts(
+    text: str,
+    statuses: list[str] = None,
+    after_rank: float = None,
+    after_id: int = None,
+    limit: int = 20
+) -> list[dict]:
+    """
+    Full-text searches post content and hashtags, best BM25 match first.
+
+    Each result carries its "rank" (lower is better) and a "snippet_html" with matches wrapped
+    in <mark>. Pass the last result's (rank, id) as (after_rank, after_id) for the next page.
+    """
+    match = _fts_query(text)
+    if match is None:
+        return []
+
+    clauses = ["posts_fts MATCH ?"]
+    params = [match]
+    if statuses:
+        clauses.append(f"p.status IN ({','.join('?' for _ in statuses)})")
+        params.extend(statuses)
+    if after_rank is not None and after_id is not None:
+        clauses.append("(bm25(posts_fts), p.id) > (?, ?)")
+        params.extend([after_rank, after_id])
+    params.append(limit)
 
+    cursor = get_conn().execute(
+        f"""SELECT {', '.join('p.' + column for column in POST_COLUMNS)},
+                   bm25(posts_fts) AS rank,
+                   snippet(posts_fts, -1, '{_SNIPPET_START}', '{_SNIPPET_END}', '…', 16) AS snippet
+            FROM posts_fts JOIN posts p ON p.id = posts_fts.rowid
+            WHERE {' AND '.join(clauses)}
+            ORDER BY rank, p.id
+            LIMIT ?""",
+        params
+    )
+    results = []
+    for row in cursor.fetchall():
+        result = dict(row)
+        snippet = html.escape(result.pop("snippet"))
+        result["snippet_html"] = snippet.replace(_SNIPPET_START, "<mark>").replace(_SNIPPET_END, "</mark>")
+        results.append(result)
+    return results
+
+
+@_timed
 def mark_posted(post_id: int):
     """Marks a post as posted and sets the posted_at timestamp."""
-    conn = get_conn()
-    cursor = conn.cursor()
-    cursor.execute(
+    get_conn().execute(
         "UPDATE posts SET status = 'posted', posted_at = CURRENT_TIMESTAMP WHERE id = ?",
         (post_id,)
     )
-    conn.commit()
-    conn.close()
 
+@_timed
 def delete_posts(post_ids: list[int]):
     """Deletes one or more posts from the database by their IDs."""
     if not post_ids:
         return
-    conn = get_conn()
-    cursor = conn.cursor()
     placeholders = ','.join('?' for _ in post_ids)
     query = f"DELETE FROM posts WHERE id IN ({placeholders})"
-    cursor.execute(query, post_ids)
-    conn.commit()
-    conn.close()
+    get_conn().execute(query, post_ids)
+    for post_id in post_ids:
+        dedupe.index.remove(int(post_id))
 
 # --- User Profile Functions ---
 
+@_timed
 def upsert_user_profile(user_id: str, profile_summary: dict):
     """Inserts or updates a user's profile summary."""
-    conn = get_conn()
-    cursor = conn.cursor()
     profile_summary_json = json.dumps(profile_summary)
-    cursor.execute(
+    get_conn().execute(
         """INSERT INTO user_profiles (user_id, profile_summary_json, updated_at)
            VALUES (?, ?, CURRENT_TIMESTAMP)
            ON CONFLICT(user_id) DO UPDATE SET
@@ -86,38 +418,295 @@ def upsert_user_profile(user_id: str, profile_summary: dict):
            updated_at = CURRENT_TIMESTAMP""",
         (user_id, profile_summary_json)
     )
-    conn.commit()
-    conn.close()
 
+@_timed
 def get_user_profile(user_id: str) -> dict | None:
     """Retrieves a user's profile summary by their ID."""
-    conn = get_conn()
-    cursor = conn.cursor()
-    cursor.execute("SELECT profile_summary_json FROM user_profiles WHERE user_id = ?", (user_id,))
-    row = cursor.fetchone()
-    conn.close()
+    row = get_conn().execute(
+        "SELECT profile_summary_json FROM user_profiles WHERE user_id = ?", (user_id,)
+    ).fetchone()
     if row:
         return json.loads(row['profile_summary_json'])
     return None
 
+@_timed
+def get_table_versions() -> dict:
+    """
+    Returns the change counters of the posts and user_profiles tables, e.g. {"posts": 12, "user_profiles": 3}.
+    Triggers bump them on every write that changes what the dashboard shows.
+    """
+    rows = get_conn().execute("SELECT name, version FROM table_versions").fetchall()
+    return {row['name']: row['version'] for row in rows}
+
 # --- Trend Functions ---
 
+@_timed
 def add_trend(topic: str, source_url: str):
     """Adds a new trend to the database, ignoring duplicates."""
-    conn = get_conn()
-    cursor = conn.cursor()
-    cursor.execute(
+    get_conn().execute(
         "INSERT OR IGNORE INTO trends (topic, source_url) VALUES (?, ?)",
         (topic, source_url)
     )
-    conn.commit()
-    conn.close()
 
+@_timed
 def get_latest_trends(limit: int = 6) -> list[dict]:
     """Lists the most recent trends from the database."""
-    conn = get_conn()
-    cursor = conn.cursor()
-    cursor.execute("SELECT topic, source_url FROM trends ORDER BY created_at DESC LIMIT ?", (limit,))
-    trends = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return trends
\ No newline at end of file
+    cursor = get_conn().execute("SELECT topic, source_url FROM trends ORDER BY created_at DESC LIMIT ?", (limit,))
+    return [dict(row) for row in cursor.fetchall()]
+
+# --- LinkedIn Asset Functions ---
+
+@_timed
+def get_linkedin_asset(owner_urn: str, content_sha256: str, mime_type: str) -> str | None:
+    """Returns the unexpired asset URN previously uploaded for this owner and image content, if any."""
+    row = get_conn().execute(
+        """SELECT asset_urn FROM linkedin_assets
+           WHERE owner_urn = ? AND content_sha256 = ? AND mime_type = ? AND expires_at > CURRENT_TIMESTAMP""",
+        (owner_urn, content_sha256, mime_type)
+    ).fetchone()
+    return row['asset_urn'] if row else None
+
+@_timed
+def store_linkedin_asset(owner_urn: str, content_sha256: str, mime_type: str, asset_urn: str, ttl_seconds: int):
+    """Records an uploaded asset for reuse, replacing any previous (e.g. expired) entry."""
+    get_conn().execute(
+        """INSERT OR REPLACE INTO linkedin_assets (owner_urn, content_sha256, mime_type, asset_urn, expires_at)
+           VALUES (?, ?, ?, ?, datetime('now', ?))""",
+        (owner_urn, content_sha256, mime_type, asset_urn, f"+{int(ttl_seconds)} seconds")
+    )
+
+# --- Image Variant Functions ---
+
+@_timed
+def get_image_variant(source_sha256: str, variant: str) -> dict | None:
+    """Returns {"sha256", "mime_type"} of a stored image variant, or None."""
+    row = get_conn().execute(
+        "SELECT output_sha256, mime_type FROM image_variants WHERE source_sha256 = ? AND variant = ?",
+        (source_sha256, variant)
+    ).fetchone()
+    return {"sha256": row['output_sha256'], "mime_type": row['mime_type']} if row else None
+
+@_timed
+def store_image_variant(source_sha256: str, variant: str, output_sha256: str, mime_type: str):
+    get_conn().execute(
+        """INSERT OR REPLACE INTO image_variants (source_sha256, variant, output_sha256, mime_type)
+           VALUES (?, ?, ?, ?)""",
+        (source_sha256, variant, output_sha256, mime_type)
+    )
+
+# --- Publish Job Functions ---
+
+@_timed
+def enqueue_publish_job(post_id: int, access_token: str, images: list) -> int | None:
+    """
+    Queues a LinkedIn share for a post, with its images as blob store references
+    ({"sha256", "mime_type"} dicts), and marks the post as 'queued'. Returns the job ID, or
+    None when the post is missing or already queued, publishing or posted.
+    The status check and the insert share one BEGIN IMMEDIATE transaction, so concurrent
+    requests cannot queue the same post twice.
+    """
+    with transaction(immediate=True) as conn:
+        cursor = conn.execute(
+            "UPDATE posts SET status = 'queued' WHERE id = ? AND status NOT IN ('queued', 'publishing', 'posted')",
+            (post_id,)
+        )
+        if cursor.rowcount == 0:
+            return None
+        cursor = conn.execute(
+            "INSERT INTO publish_jobs (post_id, access_token) VALUES (?, ?)",
+            (post_id, access_token)
+        )
+        job_id = cursor.lastrowid
+        conn.executemany(
+            "INSERT INTO publish_job_images (job_id, position, sha256, mime_type) VALUES (?, ?, ?, ?)",
+            [(job_id, position, image["sha256"], image["mime_type"]) for position, image in enumerate(images)]
+        )
+    return job_id
+
+@_timed
+def claim_publish_job() -> dict | None:
+    """
+    Atomically claims the oldest due job, marking it and its post as 'publishing'.
+    BEGIN IMMEDIATE takes the write lock up front, so two workers (or processes) never claim the same job.
+    """
+    with transaction(immediate=True) as conn:
+        row = conn.execute(
+            """SELECT * FROM publish_jobs
+               WHERE status = 'queued' AND run_after <= CURRENT_TIMESTAMP
+               ORDER BY run_after, id LIMIT 1"""
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            """UPDATE publish_jobs SET status = 'publishing', attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+               WHERE id = ?""",
+            (row['id'],)
+        )
+        conn.execute("UPDATE posts SET status = 'publishing' WHERE id = ?", (row['post_id'],))
+    job = dict(row)
+    job['attempts'] += 1
+    job['status'] = 'publishing'
+    return job
+
+@_timed
+def get_publish_job_images(job_id: int) -> list[dict]:
+    """Returns a job's images as {"sha256", "mime_type"} blob store references, in their original order."""
+    rows = get_conn().execute(
+        "SELECT sha256, mime_type FROM publish_job_images WHERE job_id = ? ORDER BY position",
+        (job_id,)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+@_timed
+def release_expired_blobs(expired: set[str]) -> set[str]:
+    """
+    Called by the blob sweep with the digests about to be deleted. Deletes the image_variants
+    rows of expiring source images, and returns the expiring digests that must be kept: images
+    of unfinished publish jobs and variants whose source image is kept.
+    """
+    with transaction(immediate=True) as conn:
+        job_images = {row['sha256'] for row in conn.execute("SELECT DISTINCT sha256 FROM publish_job_images")}
+        conn.executemany(
+            "DELETE FROM image_variants WHERE source_sha256 = ?",
+            [(digest,) for digest in expired - job_images]
+        )
+        variants = {row['output_sha256'] for row in conn.execute("SELECT DISTINCT output_sha256 FROM image_variants")}
+    return (job_images | variants) & expired
+
+@_timed
+def complete_publish_job(job_id: int, post_id: int):
+    """Marks a job and its post as posted, and drops the stored token and images."""
+    with transaction() as conn:
+        conn.execute(
+            """UPDATE publish_jobs SET status = 'posted', access_token = NULL, last_error = NULL,
+               updated_at = CURRENT_TIMESTAMP WHERE id = ?""",
+            (job_id,)
+        )
+        conn.execute("DELETE FROM publish_job_images WHERE job_id = ?", (job_id,))
+        conn.execute(
+            "UPDATE posts SET status = 'posted', posted_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (post_id,)
+        )
+
+@_timed
+def retry_publish_job(job_id: int, post_id: int, error: str, delay_seconds: float):
+    """Puts a failed attempt back in the queue, due again after delay_seconds."""
+    with transaction() as conn:
+        conn.execute(
+            """UPDATE publish_jobs SET status = 'queued', last_error = ?, run_after = datetime('now', ?),
+               updated_at = CURRENT_TIMESTAMP WHERE id = ?""",
+            (error, f"+{int(delay_seconds)} seconds", job_id)
+        )
+        conn.execute("UPDATE posts SET status = 'queued' WHERE id = ?", (post_id,))
+
+@_timed
+def start_sharing_publish_job(job_id: int):
+    """
+    Records that a job's share request is about to be sent. From here on the job is never
+    retried or requeued, since LinkedIn may create the share even if the request fails.
+    """
+    get_conn().execute(
+        "UPDATE publish_jobs SET status = 'sharing', updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+        (job_id,)
+    )
+
+@_timed
+def fail_publish_job(job_id: int, post_id: int, error: str, status: str = 'failed'):
+    """
+    Ends a job and its post without retrying, and drops the stored token and images. status is
+    'failed', or 'unknown' when LinkedIn may have created the share anyway.
+    """
+    with transaction() as conn:
+        conn.execute(
+            """UPDATE publish_jobs SET status = ?, access_token = NULL, last_error = ?,
+               updated_at = CURRENT_TIMESTAMP WHERE id = ?""",
+            (status, error, job_id)
+        )
+        conn.execute("DELETE FROM publish_job_images WHERE job_id = ?", (job_id,))
+        conn.execute("UPDATE posts SET status = ? WHERE id = ?", (status, post_id))
+
+@_timed
+def get_publish_job(job_id: int) -> dict | None:
+    """Returns a job's public fields (never the access token), or None."""
+    row = get_conn().execute(
+        """SELECT id, post_id, status, attempts, last_error, run_after, created_at, updated_at
+           FROM publish_jobs WHERE id = ?""",
+        (job_id,)
+    ).fetchone()
+    return dict(row) if row else None
+
+@_timed
+def requeue_interrupted_publish_jobs(stale_after_seconds: int) -> int:
+    """
+    Returns jobs left 'publishing' by a crashed or restarted worker to the queue, and marks jobs
+    left 'sharing' as 'unknown', since their share may or may not have been created.
+    Only jobs untouched for stale_after_seconds are touched, so a job that another
+    process is still working on is left alone. Returns the number of jobs requeued.
+    """
+    stale_offset = f"-{int(stale_after_seconds)} seconds"
+    interrupted = "SELECT id FROM publish_jobs WHERE status = ? AND updated_at < datetime('now', ?)"
+    with transaction() as conn:
+        conn.execute(
+            f"UPDATE posts SET status = 'queued' WHERE id IN (SELECT post_id FROM publish_jobs WHERE id IN ({interrupted}))",
+            ('publishing', stale_offset)
+        )
+        requeued = conn.execute(
+            f"UPDATE publish_jobs SET status = 'queued', updated_at = CURRENT_TIMESTAMP WHERE id IN ({interrupted})",
+            ('publishing', stale_offset)
+        ).rowcount
+
+        conn.execute(
+            f"UPDATE posts SET status = 'unknown' WHERE id IN (SELECT post_id FROM publish_jobs WHERE id IN ({interrupted}))",
+            ('sharing', stale_offset)
+        )
+        conn.execute(f"DELETE FROM publish_job_images WHERE job_id IN ({interrupted})", ('sharing', stale_offset))
+        conn.execute(
+            f"""UPDATE publish_jobs SET status = 'unknown', access_token = NULL,
+                last_error = 'The worker stopped while sharing.', updated_at = CURRENT_TIMESTAMP
+                WHERE id IN ({interrupted})""",
+            ('sharing', stale_offset)
+        )
+    return requeued
+
+# --- Analysis Session Functions ---
+
+@_timed
+def get_analysis_state(session_id: str, ttl_seconds: int) -> dict | None:
+    """Returns a session's analysis state, or None if it does not exist or was not updated within ttl_seconds."""
+    row = get_conn().execute(
+        "SELECT state_json FROM analysis_sessions WHERE session_id = ? AND updated_at >= datetime('now', ?)",
+        (session_id, f"-{int(ttl_seconds)} seconds")
+    ).fetchone()
+    return json.loads(row['state_json']) if row else None
+
+@_timed
+def update_analysis_state(session_id: str, fields: dict, ttl_seconds: int):
+    """
+    Merges fields into a session's analysis state, starting from an empty state if it expired.
+    The read-modify-write is atomic across processes.
+    """
+    with transaction(immediate=True) as conn:
+        row = conn.execute(
+            "SELECT state_json FROM analysis_sessions WHERE session_id = ? AND updated_at >= datetime('now', ?)",
+            (session_id, f"-{int(ttl_seconds)} seconds")
+        ).fetchone()
+        state = json.loads(row['state_json']) if row else {}
+        state.update(fields)
+        conn.execute(
+            """INSERT INTO analysis_sessions (session_id, state_json) VALUES (?, ?)
+               ON CONFLICT(session_id) DO UPDATE SET state_json = excluded.state_json, updated_at = CURRENT_TIMESTAMP""",
+            (session_id, json.dumps(state))
+        )
+
+@_timed
+def delete_analysis_state(session_id: str):
+    get_conn().execute("DELETE FROM analysis_sessions WHERE session_id = ?", (session_id,))
+
+@_timed
+def delete_expired_analysis_states(ttl_seconds: int) -> int:
+    """Deletes analysis states not updated within ttl_seconds and returns how many were deleted."""
+    cursor = get_conn().execute(
+        "DELETE FROM analysis_sessions WHERE updated_at < datetime('now', ?)",
+        (f"-{int(ttl_seconds)} seconds",)
+    )
+    return cursor.rowcount
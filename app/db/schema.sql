@@ -5,11 +5,17 @@ CREATE TABLE IF NOT EXISTS posts (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     content TEXT NOT NULL,
     hashtags TEXT,
-    status TEXT NOT NULL DEFAULT 'draft', -- e.g., 'draft', 'posted'
+    status TEXT NOT NULL DEFAULT 'draft', -- 'draft', 'queued', 'publishing', 'posted', 'failed' or 'unknown'
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    posted_at TIMESTAMP
+    posted_at TIMESTAMP,
+    minhash BLOB -- MinHash signature of content, for near-duplicate detection (see app/dedupe.py)
 );
 
+-- Keyset pagination walks (created_at, id) newest first, optionally within one status.
+CREATE INDEX IF NOT EXISTS idx_posts_created_at ON posts (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_posts_status ON posts (status);
+CREATE INDEX IF NOT EXISTS idx_posts_status_created_at ON posts (status, created_at, id);
+
 -- Stores the analyzed profile data for each user.
 CREATE TABLE IF NOT EXISTS user_profiles (
     user_id TEXT PRIMARY KEY,
@@ -23,4 +29,132 @@ CREATE TABLE IF NOT EXISTS trends (
     topic TEXT NOT NULL UNIQUE,
     source_url TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
\ No newline at end of file
+);
+
+-- Maps uploaded image content to its LinkedIn asset, so identical images are not uploaded again.
+CREATE TABLE IF NOT EXISTS linkedin_assets (
+    owner_urn TEXT NOT NULL,
+    content_sha256 TEXT NOT NULL,
+    mime_type TEXT NOT NULL,
+    asset_urn TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (owner_urn, content_sha256, mime_type)
+);
+
+-- Durable queue of LinkedIn share jobs, claimed and processed by the in-process publish workers.
+CREATE TABLE IF NOT EXISTS publish_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    post_id INTEGER NOT NULL,
+    access_token TEXT, -- encrypted with a key derived from SECRET_KEY, cleared as soon as the job finishes
+    -- 'queued', 'publishing' (uploading images), 'sharing' (the share request was sent), 'posted', 'failed',
+    -- or 'unknown' when LinkedIn may or may not have created the share and someone has to check
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    run_after TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_publish_jobs_status_run_after ON publish_jobs (status, run_after);
+
+-- Images attached to a queued share job, kept until the job finishes. The bytes live in the
+-- blob store; blobs referenced here are never swept while the job is unfinished.
+CREATE TABLE IF NOT EXISTS publish_job_images (
+    job_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    mime_type TEXT NOT NULL,
+    PRIMARY KEY (job_id, position)
+);
+
+-- Full-text index over post content and hashtags, kept in sync with posts by the triggers below.
+CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+    content,
+    hashtags,
+    content='posts',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS posts_fts_after_insert AFTER INSERT ON posts BEGIN
+    INSERT INTO posts_fts (rowid, content, hashtags) VALUES (new.id, new.content, new.hashtags);
+END;
+
+CREATE TRIGGER IF NOT EXISTS posts_fts_after_delete AFTER DELETE ON posts BEGIN
+    INSERT INTO posts_fts (posts_fts, rowid, content, hashtags) VALUES ('delete', old.id, old.content, old.hashtags);
+END;
+
+CREATE TRIGGER IF NOT EXISTS posts_fts_after_update AFTER UPDATE OF content, hashtags ON posts BEGIN
+    INSERT INTO posts_fts (posts_fts, rowid, content, hashtags) VALUES ('delete', old.id, old.content, old.hashtags);
+    INSERT INTO posts_fts (rowid, content, hashtags) VALUES (new.id, new.content, new.hashtags);
+END;
+
+-- Normalized variants of uploaded images (see app/image_pipeline.py), keyed by the source
+-- image's hash and the variant's settings. The bytes live in the blob store.
+CREATE TABLE IF NOT EXISTS image_variants (
+    source_sha256 TEXT NOT NULL,
+    variant TEXT NOT NULL,
+    output_sha256 TEXT NOT NULL,
+    mime_type TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source_sha256, variant)
+);
+
+-- Per-session analysis state (see app/state.py), shared by every worker process.
+CREATE TABLE IF NOT EXISTS analysis_sessions (
+    session_id TEXT PRIMARY KEY,
+    state_json TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_analysis_sessions_updated_at ON analysis_sessions (updated_at);
+
+-- Change counters for the tables the dashboard caches (see app/dashboard_cache.py), bumped by
+-- the triggers below so writes from any worker process invalidate every process's cache.
+CREATE TABLE IF NOT EXISTS table_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO table_versions (name) VALUES ('posts'), ('user_profiles');
+
+CREATE TRIGGER IF NOT EXISTS posts_version_after_insert AFTER INSERT ON posts BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = 'posts';
+END;
+
+CREATE TRIGGER IF NOT EXISTS posts_version_after_delete AFTER DELETE ON posts BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = 'posts';
+END;
+
+-- Not on minhash, which only the dedupe index backfill writes and the dashboard never shows.
+CREATE TRIGGER IF NOT EXISTS posts_version_after_update AFTER UPDATE OF content, hashtags, status, created_at, posted_at ON posts BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = 'posts';
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_profiles_version_after_insert AFTER INSERT ON user_profiles BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = 'user_profiles';
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_profiles_version_after_update AFTER UPDATE ON user_profiles BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = 'user_profiles';
+END;
+
+-- Posts whose signature was added, changed or removed, in order. Each worker process keeps its
+-- own in-memory near-duplicate index and replays this log to see the other workers' saves and
+-- deletes (see sync_dedupe_index in database.py).
+CREATE TABLE IF NOT EXISTS post_signature_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    post_id INTEGER NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS post_signature_log_after_insert AFTER INSERT ON posts WHEN new.minhash IS NOT NULL BEGIN
+    INSERT INTO post_signature_log (post_id) VALUES (new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS post_signature_log_after_delete AFTER DELETE ON posts BEGIN
+    INSERT INTO post_signature_log (post_id) VALUES (old.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS post_signature_log_after_update AFTER UPDATE OF minhash ON posts BEGIN
+    INSERT INTO post_signature_log (post_id) VALUES (new.id);
+END;
@@ -0,0 +1,126 @@
+"""
+Near-duplicate detection for posts with MinHash signatures and an LSH index.
+
+Each post is reduced to a fixed-size MinHash signature over its word shingles; the
+fraction of matching signature slots estimates the Jaccard similarity of two posts.
+Signatures are split into bands and bucketed, so finding candidates only touches the
+posts that share a band with the query instead of scanning every post.
+
+The index lives in each worker process; database.sync_dedupe_index() replays the posts other
+workers saved or deleted before each duplicate check.
+"""
+import hashlib
+import random
+import re
+import threading
+from array import array
+
+NUM_PERMUTATIONS = 128
+BANDS = 32  # 32 bands of 4 rows: posts with Jaccard >= 0.6 share a band with probability > 0.99
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+SHINGLE_SIZE = 3  # words per shingle
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_random = random.Random(20240501)  # Fixed seed: stored signatures must stay comparable across restarts
+_PERMUTATIONS = [
+    (_random.randrange(1, _MERSENNE_PRIME), _random.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+
+def _shingle_hashes(text: str) -> set[int]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    return {
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for shingle in shingles
+    }
+
+
+def minhash_signature(text: str) -> array:
+    """Computes the MinHash signature of a post's text."""
+    hashes = _shingle_hashes(text)
+    return array("Q", [
+        min((a * value + b) % _MERSENNE_PRIME for value in hashes)
+        for a, b in _PERMUTATIONS
+    ])
+
+
+def signature_to_bytes(signature: array) -> bytes:
+    return signature.tobytes()
+
+
+def signature_from_bytes(data: bytes) -> array:
+    signature = array("Q")
+    signature.frombytes(data)
+    return signature
+
+
+def estimated_similarity(first: array, second: array) -> float:
+    """Estimates the Jaccard similarity of two posts from their signatures."""
+    return sum(1 for x, y in zip(first, second) if x == y) / NUM_PERMUTATIONS
+
+
+class LSHIndex:
+    """A thread-safe, in-memory banded LSH index of post signatures."""
+
+    def __init__(self):
+        self._buckets = [dict() for _ in range(BANDS)]  # band -> band key -> set of post IDs
+        self._signatures = {}  # post ID -> signature
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _band_keys(signature: array):
+        for band in range(BANDS):
+            yield band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes()
+
+    def add(self, post_id: int, signature: array):
+        with self._lock:
+            self._remove(post_id)
+            self._signatures[post_id] = signature
+            for band, key in self._band_keys(signature):
+                self._buckets[band].setdefault(key, set()).add(post_id)
+
+    def remove(self, post_id: int):
+        with self._lock:
+            self._remove(post_id)
+
+    def clear(self):
+        with self._lock:
+            self._buckets = [dict() for _ in range(BANDS)]
+            self._signatures.clear()
+
+    def find_similar(self, signature: array, threshold: float, exclude_id: int = None) -> list[tuple[int, float]]:
+        """Returns (post_id, estimated similarity) for indexed posts at or above threshold, most similar first."""
+        with self._lock:
+            candidates = set()
+            for band, key in self._band_keys(signature):
+                candidates.update(self._buckets[band].get(key, ()))
+            candidates.discard(exclude_id)
+            matches = []
+            for post_id in candidates:
+                similarity = estimated_similarity(signature, self._signatures[post_id])
+                if similarity >= threshold:
+                    matches.append((post_id, similarity))
+        return sorted(matches, key=lambda match: match[1], reverse=True)
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def _remove(self, post_id: int):
+        # Callers hold the lock.
+        signature = self._signatures.pop(post_id, None)
+        if signature is None:
+            return
+        for band, key in self._band_keys(signature):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(post_id)
+                if not bucket:
+                    del self._buckets[band][key]
+
+
+index = LSHIndex()
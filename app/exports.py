@@ -0,0 +1,96 @@
+"""
+Streaming export pipelines for saved posts.
+
+Each format is a generator that turns rows from database.iter_posts into text pieces;
+the pieces are encoded into reasonably sized byte chunks and optionally gzip-compressed
+on the fly, so exports start immediately and use constant memory.
+"""
+import csv
+import io
+import json
+import zlib
+
+# Target size of each chunk handed to the response.
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+# format -> (media type, download filename)
+EXPORT_FORMATS = {
+    "md": ("text/markdown", "influra_drafts.md"),
+    "csv": ("text/csv", "influra_drafts.csv"),
+    "jsonl": ("application/x-ndjson", "influra_drafts.jsonl"),
+}
+
+
+def markdown_pieces(posts):
+    # A fixed document layout, so unlike the tabular formats it takes no column list.
+    yield "# LinkedIn Drafts\n\n"
+    for post in posts:
+        yield (
+            f"## Draft (ID: {post['id']}, Status: {post['status']})\n"
+            f"**Created:** {post['created_at']}\n\n"
+            f"{post['content']}\n\n"
+            f"**Hashtags:** {post['hashtags']}\n\n"
+            "---\n\n"
+        )
+
+
+def csv_pieces(posts, columns):
+    # One small buffer is reused for every row instead of accumulating the whole file.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def render(values) -> str:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(values)
+        return buffer.getvalue()
+
+    yield render(columns)
+    for post in posts:
+        yield render([post[column] for column in columns])
+
+
+def jsonl_pieces(posts, columns):
+    for post in posts:
+        yield json.dumps({column: post[column] for column in columns}, ensure_ascii=False) + "\n"
+
+
+_FORMATTERS = {
+    "md": lambda posts, columns: markdown_pieces(posts),
+    "csv": csv_pieces,
+    "jsonl": jsonl_pieces,
+}
+
+
+def encode_chunks(pieces, chunk_size: int = EXPORT_CHUNK_BYTES):
+    """Encodes text pieces as UTF-8, yielding the first piece at once and then ~chunk_size byte chunks."""
+    buffer = []
+    size = 0
+    first = True
+    for piece in pieces:
+        data = piece.encode("utf-8")
+        buffer.append(data)
+        size += len(data)
+        if first or size >= chunk_size:
+            yield b"".join(buffer)
+            buffer = []
+            size = 0
+            first = False
+    if buffer:
+        yield b"".join(buffer)
+
+
+def gzip_chunks(chunks):
+    """Gzip-compresses a byte stream, sync-flushing each chunk so the client receives data as it is produced."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header and trailer
+    for chunk in chunks:
+        compressed = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_stream(export_format: str, posts, columns, gzip: bool = False):
+    """Builds the byte stream for an export in the given format."""
+    chunks = encode_chunks(_FORMATTERS[export_format](posts, columns))
+    return gzip_chunks(chunks) if gzip else chunks
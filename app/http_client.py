@@ -0,0 +1,109 @@
+"""
+Shared, pooled HTTP transport for outbound LinkedIn calls.
+
+A single requests.Session keeps connections alive per host, applies connect/read
+timeouts to every request, and retries 429/5xx responses with capped exponential
+backoff that honours Retry-After. Requests under NO_RETRY_URL_PREFIXES are never retried.
+"""
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from app.config import settings
+from app import metrics
+
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+# Endpoints that must see each request at most once: the OAuth token exchange spends a
+# single-use authorization code, so a retry can only fail or hide the first response.
+NO_RETRY_URL_PREFIXES = ("https://www.linkedin.com/oauth/",)
+
+
+class _RetryPolicy(Retry):
+    """
+    Retries GET/PUT on throttling and server errors, but POST only on 429: a throttled
+    POST was never processed, whereas a 5xx may already have created the post.
+    """
+
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        if method and method.upper() == "POST" and status_code != 429:
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+    def increment(self, *args, **kwargs):
+        new_retry = super().increment(*args, **kwargs)  # Raises once the budget is spent
+        metrics.retries_total.inc(component="linkedin_http")
+        return new_retry
+
+    def get_retry_after(self, response):
+        # Honour Retry-After, but never let one response pin a worker for longer than the backoff cap.
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, self.backoff_max)
+
+
+class _TimeoutHTTPAdapter(HTTPAdapter):
+    """An HTTPAdapter that applies a default (connect, read) timeout to every request."""
+
+    def __init__(self, timeout: tuple, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _build_session() -> requests.Session:
+    retry = _RetryPolicy(
+        total=settings.HTTP_MAX_RETRIES,
+        connect=settings.HTTP_MAX_RETRIES,
+        read=0,  # A read that timed out has already cost a full timeout; do not multiply it.
+        status=settings.HTTP_MAX_RETRIES,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset({"GET", "PUT", "POST"}),
+        backoff_factor=settings.HTTP_BACKOFF_FACTOR,
+        backoff_max=settings.HTTP_BACKOFF_MAX,
+        respect_retry_after_header=True,
+        raise_on_status=False,  # Hand the final response back so callers' raise_for_status() still applies
+    )
+    timeout = (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT)
+    adapter = _TimeoutHTTPAdapter(
+        timeout=timeout,
+        pool_connections=settings.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+        pool_block=True,  # Wait for a free connection instead of opening unpooled extras
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # requests picks the adapter with the longest matching prefix, so these override the one above
+    no_retry_adapter = _TimeoutHTTPAdapter(timeout=timeout, pool_connections=1, max_retries=0)
+    for prefix in NO_RETRY_URL_PREFIXES:
+        session.mount(prefix, no_retry_adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Returns the process-wide pooled session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def close_session():
+    """Closes pooled connections, e.g. on application shutdown."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
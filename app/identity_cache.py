@@ -0,0 +1,69 @@
+"""
+A small in-process cache of LinkedIn identity data (person URN and /v2/me profile),
+keyed by a hash of the access token so raw tokens are never held as keys.
+
+Entries expire with the token's `expires_in` when it is known, and are dropped as
+soon as LinkedIn rejects the token with a 401.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from app.config import settings
+
+
+def _token_key(access_token: str) -> str:
+    return hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+
+
+class IdentityCache:
+    """A bounded, thread-safe map of token hash -> identity fields with per-token expiry."""
+
+    def __init__(self, default_ttl: int, max_entries: int):
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # token hash -> {"expires_at": float, field: value}
+        self._lock = threading.Lock()
+
+    def remember_token(self, access_token: str, expires_in: int | None):
+        """Records when a token expires, so cached identity data never outlives it."""
+        ttl = int(expires_in) if expires_in else self.default_ttl
+        with self._lock:
+            entry = self._entry(_token_key(access_token))
+            entry["expires_at"] = time.time() + ttl
+
+    def get(self, access_token: str, field: str):
+        """Returns a cached field ("person_urn" or "profile") for the token, or None."""
+        key = _token_key(access_token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry["expires_at"] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry.get(field)
+
+    def set(self, access_token: str, field: str, value):
+        with self._lock:
+            self._entry(_token_key(access_token))[field] = value
+
+    def invalidate(self, access_token: str):
+        """Drops everything cached for a token, e.g. after LinkedIn answers 401."""
+        with self._lock:
+            self._entries.pop(_token_key(access_token), None)
+
+    def _entry(self, key: str) -> dict:
+        # Callers hold the lock.
+        entry = self._entries.get(key)
+        if entry is None or entry["expires_at"] <= time.time():
+            entry = {"expires_at": time.time() + self.default_ttl}
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._entries.move_to_end(key)
+        return entry
+
+
+identity_cache = IdentityCache(settings.IDENTITY_CACHE_DEFAULT_TTL, settings.IDENTITY_CACHE_MAX_ENTRIES)
@@ -0,0 +1,156 @@
+"""
+Normalization of uploaded images before they reach Gemini or LinkedIn.
+
+Images get two variants, rendered with Pillow on a process pool so decoding and
+resampling never block the event loop and spread across cores:
+
+- "analysis": downscaled and re-encoded for Gemini vision, which does not need full
+  resolution to describe an image and charges for every pixel it receives. Rendered at
+  upload time.
+- "linkedin": capped in size and dimensions to stay within LinkedIn's image limits.
+  Rendered only when a share is published, so uploads that are never shared skip it.
+
+Re-encoding drops EXIF (GPS, camera serials) after applying its orientation. Variants are
+stored in the blob store and looked up by the source image's hash, so re-uploading the
+same image skips the work.
+"""
+import asyncio
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi.concurrency import run_in_threadpool
+from app.config import settings
+from app import metrics
+from app.db import database
+from app.state import blob_store
+
+# Lowest JPEG quality tried before downscaling further to meet a byte limit.
+MIN_JPEG_QUALITY = 60
+
+
+def _variant_specs() -> dict:
+    """Returns the rendering parameters per variant: (max_side, max_bytes or None, JPEG quality)."""
+    return {
+        "analysis": (settings.IMAGE_ANALYSIS_MAX_SIDE, None, settings.IMAGE_ANALYSIS_QUALITY),
+        "linkedin": (settings.LINKEDIN_IMAGE_MAX_SIDE, settings.LINKEDIN_IMAGE_MAX_BYTES, settings.LINKEDIN_IMAGE_QUALITY),
+    }
+
+
+def render_variant(source_path: str, max_side: int, max_bytes: int | None, quality: int) -> tuple[bytes | None, str | None]:
+    """
+    Decodes an image, applies its EXIF orientation, fits it within max_side and re-encodes it
+    without metadata: PNG if it has transparency, JPEG otherwise, lowering quality and then size
+    until it fits in max_bytes. Returns (data, mime_type), or (None, None) when the source should
+    be used as it is (animated GIFs that already fit, whose animation re-encoding would lose).
+    Runs in a worker process, which is the only place Pillow is imported.
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+    try:
+        with Image.open(source_path) as source:
+            if getattr(source, "is_animated", False) and max_bytes is not None:
+                if os.path.getsize(source_path) <= max_bytes and max(source.size) <= max_side:
+                    return None, None
+            if source.format == "JPEG":
+                # Let the JPEG decoder skip detail that thumbnail() would throw away anyway.
+                source.draft("RGB", (max_side, max_side))
+            image = ImageOps.exif_transpose(source)
+            has_alpha = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+            image = image.convert("RGBA" if has_alpha else "RGB")
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise ValueError(f"Could not read image: {e}") from None
+
+    image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    while True:
+        if has_alpha:
+            data, mime_type = _encode(image, "PNG", optimize=True), "image/png"
+        else:
+            data, mime_type = _encode(image, "JPEG", quality=quality, optimize=True, progressive=True), "image/jpeg"
+            while max_bytes is not None and len(data) > max_bytes and quality > MIN_JPEG_QUALITY:
+                quality = max(quality - 10, MIN_JPEG_QUALITY)
+                data = _encode(image, "JPEG", quality=quality, optimize=True, progressive=True)
+        if max_bytes is None or len(data) <= max_bytes or min(image.size) <= 64:
+            return data, mime_type
+        image = image.resize((max(1, image.width * 3 // 4), max(1, image.height * 3 // 4)), Image.Resampling.LANCZOS)
+
+
+def _encode(image, image_format: str, **options) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)  # No exif= or pnginfo=, so no metadata is written
+    return buffer.getvalue()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Returns the shared process pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # Spawn rather than fork: forking a process that runs threads can copy held locks.
+                _executor = ProcessPoolExecutor(
+                    max_workers=settings.IMAGE_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+    return _executor
+
+
+def shutdown_executor():
+    """Stops the worker processes, e.g. on application shutdown."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
+
+
+async def prepare_variant(image: dict, variant: str) -> dict:
+    """
+    Returns {"sha256", "mime_type"} of a variant of a stored image ({"sha256", "mime_type"}),
+    rendering and storing it on the process pool unless it is cached.
+    """
+    global _executor
+    max_side, max_bytes, quality = _variant_specs()[variant]
+    cache_key = f"{variant}:{max_side}:{max_bytes}:{quality}"
+    cached = await run_in_threadpool(database.get_image_variant, image["sha256"], cache_key)
+    if cached is not None and await run_in_threadpool(blob_store.exists, cached["sha256"]):
+        metrics.cache_requests_total.inc(cache="image_variant", result="hit")
+        return cached
+    metrics.cache_requests_total.inc(cache="image_variant", result="miss")
+
+    executor = _get_executor()
+    try:
+        data, mime_type = await asyncio.get_running_loop().run_in_executor(
+            executor, render_variant, blob_store.path(image["sha256"]), max_side, max_bytes, quality
+        )
+    except BrokenProcessPool:
+        metrics.errors_total.inc(component="image_pipeline")
+        # A worker died (e.g. killed for memory); start a fresh pool for the next request.
+        with _executor_lock:
+            if _executor is executor:
+                _executor = None
+        raise
+
+    if data is None:
+        result = {"sha256": image["sha256"], "mime_type": image["mime_type"]}
+    else:
+        result = {"sha256": await run_in_threadpool(blob_store.put, data), "mime_type": mime_type}
+    await run_in_threadpool(database.store_image_variant, image["sha256"], cache_key, result["sha256"], result["mime_type"])
+    return result
+
+
+async def prepare_images(images: list[dict]) -> list[dict]:
+    """Renders the analysis variant of every image concurrently, in the original order."""
+    return list(await asyncio.gather(*[prepare_variant(image, "analysis") for image in images]))
+
+
+def prepare_variants_blocking(images: list[dict], variant: str) -> list[dict]:
+    """Runs prepare_variant for several images from a thread without an event loop, e.g. a publish worker."""
+    async def prepare_all():
+        return await asyncio.gather(*[prepare_variant(image, variant) for image in images])
+    return list(asyncio.run(prepare_all()))
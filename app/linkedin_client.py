@@ -1,5 +1,13 @@
 import requests
 import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.config import settings
+from app.http_client import get_session
+from app.identity_cache import identity_cache
+from app.db import database
+from app import metrics
 
 # LinkedIn API Endpoints
 LINKEDIN_UGC_POST_URL = "https://api.linkedin.com/v2/ugcPosts"
@@ -7,17 +15,38 @@ LINKEDIN_USER_INFO_URL = "https://api.linkedin.com/v2/userinfo"
 LINKEDIN_PROFILE_URL = "https://api.linkedin.com/v2/me" # For detailed profile
 LINKEDIN_ASSET_UPLOAD_REGISTER_URL = "https://api.linkedin.com/v2/assets?action=registerUpload"
 
+def _timed(call: str):
+    """Times one LinkedIn request into the linkedin histogram and the request's Server-Timing breakdown."""
+    return metrics.timed(metrics.linkedin_call_seconds, "linkedin", call=call)
+
+def _check_authorized(access_token: str, response):
+    """Drops cached identity data for a token that LinkedIn no longer accepts."""
+    if response is not None and response.status_code == 401:
+        identity_cache.invalidate(access_token)
+
 def get_person_urn(access_token: str) -> str:
     """
     Fetches the authenticated user's Person URN (Unique Resource Name) from the userinfo endpoint.
+    The URN is cached per token, so repeated calls for the same token do not hit LinkedIn.
     """
+    cached_urn = identity_cache.get(access_token, "person_urn")
+    metrics.cache_requests_total.inc(cache="identity", result="hit" if cached_urn else "miss")
+    if cached_urn:
+        return cached_urn
+
     headers = {"Authorization": f"Bearer {access_token}"}
+    response = None
     try:
-        response = requests.get(LINKEDIN_USER_INFO_URL, headers=headers)
+        with _timed("userinfo"):
+            response = get_session().get(LINKEDIN_USER_INFO_URL, headers=headers)
         response.raise_for_status()
         data = response.json()
-        return f"urn:li:person:{data['sub']}"
+        person_urn = f"urn:li:person:{data['sub']}"
+        identity_cache.set(access_token, "person_urn", person_urn)
+        return person_urn
     except requests.exceptions.RequestException as e:
+        _check_authorized(access_token, response)
+        metrics.errors_total.inc(component="linkedin")
         print(f"Error fetching Person URN: {e}")
         if response is not None: print(f"LinkedIn response: {response.text}")
         raise
@@ -25,25 +54,63 @@ def get_person_urn(access_token: str) -> str:
 def get_user_profile(access_token: str) -> dict:
     """
     Fetches the authenticated user's detailed profile from the /v2/me endpoint.
+    The profile is cached per token, so the login callback and the background analysis share one call.
     """
+    cached_profile = identity_cache.get(access_token, "profile")
+    metrics.cache_requests_total.inc(cache="identity", result="hit" if cached_profile else "miss")
+    if cached_profile:
+        return dict(cached_profile)
+
     headers = {"Authorization": f"Bearer {access_token}"}
     # Define the specific fields you want to retrieve.
     # This projection requests the user's ID, name, headline, and profile picture.
     params = {"projection": "(id,localizedFirstName,localizedLastName,headline)"}
+    response = None
     try:
-        response = requests.get(LINKEDIN_PROFILE_URL, headers=headers, params=params)
+        with _timed("profile"):
+            response = get_session().get(LINKEDIN_PROFILE_URL, headers=headers, params=params)
         response.raise_for_status()
-        return response.json()
+        profile = response.json()
+        identity_cache.set(access_token, "profile", profile)
+        return dict(profile)
     except requests.exceptions.RequestException as e:
+        _check_authorized(access_token, response)
+        metrics.errors_total.inc(component="linkedin")
         print(f"Error fetching user profile: {e}")
         if response is not None: print(f"LinkedIn response: {response.text}")
         raise
 
-def upload_image_to_linkedin(access_token: str, image_data: bytes, mime_type: str) -> str:
+# Chunk size for hashing file-like images without reading them into memory.
+_HASH_CHUNK_BYTES = 256 * 1024
+
+def _content_sha256(image) -> str:
+    """Hashes image bytes, or a seekable binary file-like object in chunks, rewinding it afterwards."""
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(image).hexdigest()
+    digest = hashlib.sha256()
+    image.seek(0)
+    while chunk := image.read(_HASH_CHUNK_BYTES):
+        digest.update(chunk)
+    image.seek(0)
+    return digest.hexdigest()
+
+def upload_image_to_linkedin(
+    access_token: str, image, mime_type: str, person_urn: str = None, content_sha256: str = None
+) -> str:
     """
     Uploads an image to LinkedIn's asset API and returns the asset URN.
+    image is either bytes or a seekable binary file-like object, which is sent as a streamed body.
+    Pass person_urn when the caller already knows it to skip the userinfo lookup, and
+    content_sha256 when the image's hash is already known (e.g. a blob store digest) to skip hashing it.
+    Identical bytes already uploaded by the same owner reuse the stored asset instead.
     """
-    person_urn = get_person_urn(access_token)
+    person_urn = person_urn or get_person_urn(access_token)
+
+    content_sha256 = content_sha256 or _content_sha256(image)
+    cached_asset_urn = database.get_linkedin_asset(person_urn, content_sha256, mime_type)
+    metrics.cache_requests_total.inc(cache="linkedin_asset", result="hit" if cached_asset_urn else "miss")
+    if cached_asset_urn:
+        return cached_asset_urn
 
     # Step 1: Register the upload
     register_headers = {
@@ -67,11 +134,12 @@ def upload_image_to_linkedin(access_token: str, image_data: bytes, mime_type: st
     }
 
     try:
-        register_response = requests.post(
-            LINKEDIN_ASSET_UPLOAD_REGISTER_URL,
-            headers=register_headers,
-            data=json.dumps(register_payload)
-        )
+        with _timed("register_upload"):
+            register_response = get_session().post(
+                LINKEDIN_ASSET_UPLOAD_REGISTER_URL,
+                headers=register_headers,
+                data=json.dumps(register_payload)
+            )
         register_response.raise_for_status()
         register_data = register_response.json()
         
@@ -83,12 +151,18 @@ def upload_image_to_linkedin(access_token: str, image_data: bytes, mime_type: st
             "Authorization": f"Bearer {access_token}",
             "Content-Type": mime_type # Use the actual image MIME type
         }
-        upload_response = requests.put(upload_url, headers=upload_headers, data=image_data)
+        # A file-like body is streamed from its current position; requests takes the Content-Length
+        # from its size, and a retried PUT rewinds it first.
+        with _timed("upload_image"):
+            upload_response = get_session().put(upload_url, headers=upload_headers, data=image)
         upload_response.raise_for_status()
 
+        database.store_linkedin_asset(person_urn, content_sha256, mime_type, asset_urn, settings.LINKEDIN_ASSET_TTL_SECONDS)
         return asset_urn
 
     except requests.exceptions.RequestException as e:
+        _check_authorized(access_token, e.response)
+        metrics.errors_total.inc(component="linkedin")
         print(f"Error uploading image to LinkedIn: {e}")
         if 'register_response' in locals() and register_response is not None:
             print(f"LinkedIn Register response: {register_response.text}")
@@ -96,11 +170,61 @@ def upload_image_to_linkedin(access_token: str, image_data: bytes, mime_type: st
             print(f"LinkedIn Upload response: {upload_response.text}")
         raise
 
-def post_linkedin_update(access_token: str, post_content: str, image_urns: list = None) -> dict:
+_upload_executor = None
+_upload_executor_lock = threading.Lock()
+
+def _get_upload_executor() -> ThreadPoolExecutor:
+    """Returns the shared, bounded pool used for image uploads, creating it on first use."""
+    global _upload_executor
+    if _upload_executor is None:
+        with _upload_executor_lock:
+            if _upload_executor is None:
+                _upload_executor = ThreadPoolExecutor(
+                    max_workers=settings.LINKEDIN_UPLOAD_WORKERS,
+                    thread_name_prefix="linkedin-upload"
+                )
+    return _upload_executor
+
+def upload_images_to_linkedin(access_token: str, images: list, person_urn: str = None) -> list[dict]:
+    """
+    Registers and uploads several images concurrently on a bounded worker pool.
+
+    Args:
+        images: A list of (image, mime_type) or (image, mime_type, content_sha256) tuples, where
+            image is bytes or a seekable binary file. Images without a known hash are hashed here.
+
+    Returns:
+        One result per image, in the original order: {"asset_urn": ...} on success,
+        or {"error": ..., "status_code": ...} if that image failed, where status_code is LinkedIn's
+        HTTP status or None. One failure does not cancel the others.
+    """
+    if not images:
+        return []
+    person_urn = person_urn or get_person_urn(access_token)
+
+    futures = []
+    for image, mime_type, *known_sha256 in images:
+        content_sha256 = known_sha256[0] if known_sha256 else None
+        futures.append(_get_upload_executor().submit(
+            upload_image_to_linkedin, access_token, image, mime_type, person_urn, content_sha256
+        ))
+    results = []
+    for future in futures:
+        try:
+            results.append({"asset_urn": future.result()})
+        except Exception as e:
+            response = getattr(e, "response", None)
+            results.append({"error": str(e), "status_code": response.status_code if response is not None else None})
+    return results
+
+def post_linkedin_update(access_token: str, post_content: str, image_urns: list = None, person_urn: str = None) -> dict:
     """
     Posts an update to LinkedIn on behalf of the authenticated user.
+    Pass person_urn when the caller already knows it to skip the userinfo lookup.
+    On failure returns {"error", "status_code", "linkedin_response"}; status_code is None
+    when no response came back.
     """
-    person_urn = get_person_urn(access_token)
+    person_urn = person_urn or get_person_urn(access_token)
 
     headers = {
         "Authorization": f"Bearer {access_token}",
@@ -136,12 +260,21 @@ def post_linkedin_update(access_token: str, post_content: str, image_urns: list
         # Correctly set shareMediaCategory based on content
         payload["specificContent"]["com.linkedin.ugc.ShareContent"]["shareMediaCategory"] = "IMAGE"
 
+    response = None
     try:
-        response = requests.post(LINKEDIN_UGC_POST_URL, headers=headers, data=json.dumps(payload))
+        with _timed("ugc_post"):
+            response = get_session().post(LINKEDIN_UGC_POST_URL, headers=headers, data=json.dumps(payload))
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
+        _check_authorized(access_token, response)
+        metrics.errors_total.inc(component="linkedin")
         print(f"Error posting to LinkedIn: {e}")
         if response is not None:
             print(f"LinkedIn response: {response.text}")
-        return {"error": str(e), "linkedin_response": response.text if response is not None else ""}
+        # status_code is None when no response came back (a timeout or dropped connection)
+        return {
+            "error": str(e),
+            "status_code": response.status_code if response is not None else None,
+            "linkedin_response": response.text if response is not None else "",
+        }
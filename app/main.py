@@ -1,20 +1,52 @@
+import threading
+import time
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response
 from starlette.middleware.sessions import SessionMiddleware
 
 from app.db import database
-from app.routers import profile, trends, posts, auth, images # Added images
-from app.state import latest_analysis
+from app.http_client import close_session
+from app import image_pipeline, metrics, profiling, publish_queue, uploads
+from app.ai import gemini_client
+from app.dashboard_cache import dashboard_cache
+from app.routers import profile, trends, posts, auth, images, debug # Added images
+from app.state import analysis_store, get_session_id, start_blob_sweeper, stop_blob_sweeper
 from app.config import settings
+from app.templating import templates
+
+
+def _warm_up():
+    """Imports the SDKs that are kept out of startup, so the first request needing them does not wait."""
+    started = time.perf_counter()
+    try:
+        gemini_client.load_sdk()
+        import requests_oauthlib # Used by /auth/login
+    except Exception as e:
+        print(f"Warm-up failed: {e}")
+        return
+    print(f"Warm-up finished in {(time.perf_counter() - started) * 1000:.0f} ms.")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initializes resources on startup and cleans up on shutdown."""
+    if settings.STARTUP_WARMUP == "eager":
+        _warm_up()
+    elif settings.STARTUP_WARMUP == "background":
+        threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+    elif settings.STARTUP_WARMUP != "off":
+        raise ValueError(f"Unknown STARTUP_WARMUP: {settings.STARTUP_WARMUP!r} (expected 'background', 'eager' or 'off')")
     database.init_db()
+    database.load_dedupe_index()
+    start_blob_sweeper()
+    publish_queue.start_workers()
     yield
+    publish_queue.stop_workers()
+    stop_blob_sweeper()
+    image_pipeline.shutdown_executor()
+    close_session()
+    database.close_all_connections()
 
 
 app = FastAPI(
@@ -36,8 +68,17 @@ app.include_router(trends.router)
 app.include_router(posts.router)
 app.include_router(auth.router)
 app.include_router(images.router) # Include images router
+app.include_router(debug.router)
+
+# Bounds upload bodies while they are received, before Starlette buffers them for the handler.
+app.add_middleware(uploads.UploadLimitMiddleware)
 
-templates = Jinja2Templates(directory="app/templates")
+# Only installed when profiling is configured, so it costs nothing otherwise.
+if profiling.is_enabled():
+    app.add_middleware(profiling.ProfilingMiddleware)
+
+# Added last so it is outermost: it times the whole request, session handling included.
+app.add_middleware(metrics.MetricsMiddleware)
 
 
 @app.get("/health")
@@ -46,21 +87,40 @@ def health_check():
     return {"status": "ok"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Exposes this process's timings and counters in Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/", response_class=HTMLResponse)
-def read_root(request: Request):
-    """Serves the main HTML dashboard, passing in current state."""
+def read_root(request: Request, status: str = None):
+    """
+    Serves the main HTML dashboard, passing in current state and the first page of saved posts.
+    Answers 304 when the browser's copy is current; otherwise reuses the cached post rows and
+    profile summary unless they changed (see app/dashboard_cache.py).
+    """
     user_id = request.session.get("user_id")
-    profile_summary = None
-    if user_id:
-        profile_summary = database.get_user_profile(user_id)
+    analysis = analysis_store.load(get_session_id(request))
+    versions = database.get_table_versions()
+    validators = dashboard_cache.validators(
+        versions["posts"],
+        user_id, versions["user_profiles"],
+        bool(request.session.get("linkedin_token")),
+        request.url.query, # Carries the status filter and the notices shown after redirects
+        analysis,
+    )
+    if dashboard_cache.is_not_modified(request.headers, validators):
+        return Response(status_code=304, headers=validators)
 
-    saved_posts = database.list_posts()
     context = {
         "request": request,
-        "profile_summary": profile_summary,
-        "trend_insights": latest_analysis.get("trend_insights"),
-        "generated_post": latest_analysis.get("generated_post"),
-        "saved_posts": saved_posts,
-        "image_analysis": latest_analysis.get("image_analysis"), # Pass image analysis to template
+        "profile_summary": dashboard_cache.profile_summary(user_id, versions["user_profiles"]),
+        "trend_insights": analysis["trend_insights"],
+        "generated_post": analysis["generated_post"],
+        "generated_variants": analysis["generated_variants"],
+        "saved_posts_html": dashboard_cache.posts_fragment(status, versions["posts"]),
+        "status_filter": status,
+        "image_analysis": analysis["image_analysis"], # Pass image analysis to template
     }
-    return templates.TemplateResponse("index.html", context)
\ No newline at end of file
+    return templates.TemplateResponse("index.html", context, headers=validators)
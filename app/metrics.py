@@ -0,0 +1,244 @@
+"""
+Lightweight in-process metrics, exposed in Prometheus text format at /metrics.
+
+Histograms time the expensive stages of a request (Gemini calls, LinkedIn calls, database
+helpers, template rendering); counters track errors, cache hits and retries. Modules that
+already keep their own stats dicts export them through register_collector() instead of
+counting twice.
+
+Each request also collects a breakdown of the time its stages took, which MetricsMiddleware
+returns as a Server-Timing header (visible in the browser's network panel). The header is
+sent with the response headers, so for streamed responses it covers the work done before
+the first byte. Metrics are per process; with several workers each has its own.
+"""
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from starlette.datastructures import MutableHeaders
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """A monotonically increasing count per label combination."""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values)
+        return lines
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observed values (seconds) per label combination."""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += 1
+            entry[-1] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted((key, list(entry)) for key, entry in self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, entry in values:
+            bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, entry):
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(entry[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {entry[-2]}")
+        return lines
+
+
+_registry: list = []
+_collectors: list = []
+
+
+def register_collector(collect):
+    """
+    Registers a function called on every scrape that returns extra metric families as
+    [(name, type, documentation, {label dict as tuple of pairs: value})], for stats a
+    module already keeps (e.g. the Gemini response cache counters).
+    """
+    _collectors.append(collect)
+
+
+def render() -> str:
+    """Returns every metric in Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        try:
+            families = collect()
+        except Exception as e:
+            print(f"Error collecting metrics from {collect.__qualname__}: {e}")
+            continue
+        for name, metric_type, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples.items():
+                names, values = zip(*labels) if labels else ((), ())
+                lines.append(f"{name}{_format_labels(names, values)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Metrics shared across the app ---
+
+gemini_call_seconds = Histogram(
+    "influra_gemini_call_seconds", "Gemini JSON calls, including cache lookups, rate limiting and retries.", ("prompt_type",)
+)
+linkedin_call_seconds = Histogram("influra_linkedin_call_seconds", "LinkedIn API requests, including transport retries.", ("call",))
+db_call_seconds = Histogram("influra_db_call_seconds", "Database helper calls.", ("call",))
+template_render_seconds = Histogram("influra_template_render_seconds", "Jinja template rendering.", ("template",))
+http_request_seconds = Histogram(
+    "influra_http_request_seconds", "Time to the end of each HTTP response, by route.", ("method", "route", "status")
+)
+errors_total = Counter("influra_errors_total", "Errors by component.", ("component",))
+cache_requests_total = Counter("influra_cache_requests_total", "Cache lookups by cache and result (hit or miss).", ("cache", "result"))
+retries_total = Counter("influra_retries_total", "Retried calls by component.", ("component",))
+
+
+# --- Request-scoped timing breakdown (Server-Timing) ---
+
+# Stage name -> [total seconds, calls] for the request being handled, or None outside a request.
+# Worker threads started with run_in_threadpool see the same dict through the copied context.
+_request_timings: contextvars.ContextVar = contextvars.ContextVar("request_timings", default=None)
+# Stages already being timed further up the call stack, so nested helpers are not counted twice.
+_active_stages: contextvars.ContextVar = contextvars.ContextVar("active_stages", default=())
+_timings_lock = threading.Lock()
+
+
+@contextmanager
+def timed(histogram: Histogram, stage: str, **labels):
+    """Times the block into histogram and adds it to the current request's `stage` timing."""
+    active = _active_stages.get()
+    token = _active_stages.set(active + (stage,))
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        _active_stages.reset(token)
+        histogram.observe(elapsed, **labels)
+        timings = _request_timings.get()
+        if timings is not None and stage not in active:
+            with _timings_lock:
+                entry = timings.setdefault(stage, [0.0, 0])
+                entry[0] += elapsed
+                entry[1] += 1
+
+
+def timed_function(histogram: Histogram, stage: str, label: str = "call"):
+    """Decorator version of timed(), labelling each observation with the function's name."""
+    def decorator(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with timed(histogram, stage, **{label: function.__name__}):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with timed(histogram, stage, **{label: function.__name__}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def server_timing_header(timings: dict, total_seconds: float) -> str:
+    entries = [
+        f'{stage};dur={seconds * 1000:.1f};desc="{calls} call{"s" if calls != 1 else ""}"'
+        for stage, (seconds, calls) in sorted(timings.items())
+    ]
+    entries.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request by route and adds a Server-Timing header with the request's
+    per-stage breakdown. A plain ASGI middleware, so the handler runs in the context that
+    holds the breakdown.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings = {}
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                with _timings_lock:
+                    header = server_timing_header(timings, time.perf_counter() - started)
+                MutableHeaders(scope=message).append("Server-Timing", header)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            # Label by route template (/posts/{post_id}/share), not by path, to keep the series bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_request_seconds.observe(time.perf_counter() - started, method=scope["method"], route=route, status=status)
+            if status >= 500:
+                errors_total.inc(component="http")
@@ -0,0 +1,339 @@
+"""
+On-demand sampling profiler for live requests.
+
+Off unless PROFILING_ADMIN_TOKEN is set; the middleware is not even installed otherwise.
+When on, a request is profiled if it carries the admin token (X-Profile-Token header or
+profile_token query parameter), and PROFILING_SAMPLE_RATE of all other requests are
+profiled at random, so slow paths that only show up under real traffic get captured too.
+
+While a profiled request is in flight, one background thread samples every
+PROFILING_INTERVAL_MS:
+
+- the event loop thread, when it is running the request's task;
+- worker threads running the request's sync code (sync endpoints, run_in_threadpool),
+  recognised by the request context they run in, appended to the await chain that led there;
+- otherwise the request's await chain, ending in what it is waiting on (e.g. a Gemini call).
+
+So the profile shows wall-clock time, I/O waits included. Captures are stored as collapsed
+stacks (flamegraph.pl, speedscope) in a ring of the last PROFILING_MAX_PROFILES on disk,
+listed at /debug/profiles.
+"""
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import random
+import re
+import secrets
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qs
+from fastapi.concurrency import run_in_threadpool
+from app.config import settings
+
+TOKEN_HEADER = b"x-profile-token"
+TOKEN_QUERY_PARAMETER = "profile_token"
+
+_PROFILE_ID = re.compile(r"^\d{13}-[0-9a-f]{8}$")
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_STDLIB = sysconfig.get_paths()["stdlib"]
+
+try:
+    from anyio._backends._asyncio import WorkerThread
+    # Frame of the loop in AnyIO's worker threads that runs each job in its caller's context
+    _WORKER_RUN_CODE = WorkerThread.run.__code__
+except (ImportError, AttributeError):
+    _WORKER_RUN_CODE = None  # Unknown AnyIO internals: profiles then show worker jobs as awaits
+
+# The capture of the request being handled, inherited by its tasks and worker threads.
+_current_capture: contextvars.ContextVar = contextvars.ContextVar("profile_capture", default=None)
+
+
+def is_enabled() -> bool:
+    return bool(settings.PROFILING_ADMIN_TOKEN)
+
+
+def is_admin_token(token: str | None) -> bool:
+    return bool(token) and is_enabled() and secrets.compare_digest(token, settings.PROFILING_ADMIN_TOKEN)
+
+
+@functools.lru_cache(maxsize=4096)
+def _short_path(filename: str) -> str:
+    """Shortens a source path to its package-relative form, e.g. app/routers/posts.py or fastapi/routing.py."""
+    if "site-packages" in filename:
+        return filename.rsplit("site-packages" + os.sep, 1)[-1]
+    for root in (_PROJECT_ROOT, _STDLIB):
+        if filename.startswith(root + os.sep):
+            return os.path.relpath(filename, root)
+    return filename
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    # The function's first line rather than the current line, so samples aggregate per function
+    return f"{code.co_qualname} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _thread_stack(frame, stop_code=None) -> list:
+    """Root-first frames of a thread's stack, starting below the frame running stop_code if given."""
+    frames = []
+    while frame is not None:
+        if frame.f_code is stop_code:
+            break
+        frames.append(frame)
+        frame = frame.f_back
+    return [_frame_label(f) for f in reversed(frames)]
+
+
+def _await_chain(task, stop_code) -> list:
+    """Root-first frames of a suspended task's coroutine chain, ending in what it awaits."""
+    labels = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            labels.append(f"[{type(awaitable).__name__}]")  # A future, e.g. an HTTP response or a worker thread
+            break
+        if frame.f_code is stop_code:
+            labels = []  # Only keep what runs inside the profiling middleware
+        else:
+            labels.append(_frame_label(frame))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return labels
+
+
+def _worker_context(frame):
+    """Returns the contextvars.Context an AnyIO worker thread is running its job in, if any."""
+    while frame is not None:
+        if frame.f_code is _WORKER_RUN_CODE:
+            context = frame.f_locals.get("context")
+            return context if isinstance(context, contextvars.Context) else None
+        frame = frame.f_back
+    return None
+
+
+def _worker_job_frames(frame) -> list:
+    """Frames of a worker thread's job, without the AnyIO worker loop beneath it."""
+    frames = []
+    while frame is not None and frame.f_code is not _WORKER_RUN_CODE:
+        frames.append(frame)
+        frame = frame.f_back
+    return [_frame_label(f) for f in reversed(frames)]
+
+
+class _Capture:
+    """Samples collected for one profiled request."""
+
+    def __init__(self, scope: dict, task: asyncio.Task, reason: str):
+        self.method = scope["method"]
+        self.path = scope["path"]  # Never the query string, which may hold the admin token
+        self.reason = reason
+        self.task = task
+        self.loop_thread = threading.get_ident()
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = time.perf_counter()
+        self.created_at = time.time()
+
+    def owns(self, task) -> bool:
+        if task is self.task:
+            return True
+        # Child tasks (e.g. gather) inherit the request's context; Task.get_context() needs Python 3.12+.
+        get_context = getattr(task, "get_context", None)
+        return get_context is not None and get_context().get(_current_capture) is self
+
+    def sample(self, frames: dict, stop_code):
+        stacks = []
+        for thread_id, frame in frames.items():
+            if thread_id == self.loop_thread:
+                continue
+            context = _worker_context(frame)
+            if context is not None and context.get(_current_capture) is self:
+                stacks.append(_worker_job_frames(frame))
+
+        running = None
+        try:
+            running = asyncio.current_task(self.task.get_loop())
+        except RuntimeError:
+            pass
+        if running is not None and self.owns(running):
+            stacks.append(_thread_stack(frames.get(self.loop_thread), stop_code))
+        elif stacks:
+            # The task is waiting on the worker threads; show the await chain that led to them.
+            chain = _await_chain(self.task, stop_code)
+            stacks = [chain + stack for stack in stacks]
+        else:
+            stacks.append(_await_chain(self.task, stop_code))
+
+        for stack in stacks:
+            if stack:
+                self.stacks[";".join(stack)] += 1
+        self.samples += 1
+
+
+class _Sampler:
+    """One daemon thread sampling every in-flight capture, started on first use."""
+
+    def __init__(self):
+        self._captures = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def add(self, capture: _Capture):
+        with self._lock:
+            self._captures.add(capture)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def remove(self, capture: _Capture):
+        with self._lock:
+            self._captures.discard(capture)
+
+    def _run(self):
+        interval = settings.PROFILING_INTERVAL_MS / 1000
+        stop_code = ProfilingMiddleware.__call__.__code__
+        while True:
+            with self._lock:
+                captures = list(self._captures)
+                if not captures:
+                    self._wakeup.clear()
+            if not captures:
+                self._wakeup.wait()
+                continue
+            frames = sys._current_frames()
+            frames.pop(threading.get_ident(), None)
+            for capture in captures:
+                try:
+                    capture.sample(frames, stop_code)
+                except Exception as e:  # The sampled stacks change under us; skip a bad sample
+                    print(f"Profiler sample failed: {e}")
+            del frames
+            time.sleep(interval)
+
+
+class ProfileStore:
+    """Captured profiles on disk, keeping only the newest max_profiles."""
+
+    def __init__(self, directory: str, max_profiles: int):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def _path(self, profile_id: str, extension: str) -> str:
+        if not _PROFILE_ID.match(profile_id):
+            raise ValueError(f"Invalid profile ID: {profile_id!r}")
+        return os.path.join(self.directory, f"{profile_id}.{extension}")
+
+    def save(self, capture: _Capture, status: int, duration_ms: float) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = f"{int(capture.created_at * 1000):013d}-{secrets.token_hex(4)}"
+        folded = "".join(f"{stack} {count}\n" for stack, count in capture.stacks.most_common())
+        with open(self._path(profile_id, "folded"), "w") as f:
+            f.write(folded)
+        meta = {
+            "id": profile_id,
+            "method": capture.method,
+            "path": capture.path,
+            "status": status,
+            "reason": capture.reason,
+            "duration_ms": round(duration_ms, 1),
+            "samples": capture.samples,
+            "interval_ms": settings.PROFILING_INTERVAL_MS,
+            "created_at": capture.created_at,
+        }
+        # Metadata last, so a listed profile always has its stacks
+        with open(self._path(profile_id, "json"), "w") as f:
+            json.dump(meta, f)
+        self._prune()
+        return profile_id
+
+    def _prune(self):
+        ids = sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith(".json"))
+        for profile_id in ids[:-self.max_profiles] if self.max_profiles > 0 else ids:
+            for extension in ("json", "folded"):
+                try:
+                    os.remove(self._path(profile_id, extension))
+                except (OSError, ValueError):
+                    pass
+
+    def list(self) -> list[dict]:
+        """Metadata of the stored profiles, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if name.endswith(".json") and _PROFILE_ID.match(name[:-5]):
+                try:
+                    with open(os.path.join(self.directory, name)) as f:
+                        profiles.append(json.load(f))
+                except (OSError, ValueError):
+                    continue  # Pruned or half-written by another worker
+        return profiles
+
+    def read_folded(self, profile_id: str) -> str | None:
+        try:
+            with open(self._path(profile_id, "folded")) as f:
+                return f.read()
+        except (OSError, ValueError):
+            return None
+
+
+def _request_token(scope: dict) -> str | None:
+    for name, value in scope["headers"]:
+        if name == TOKEN_HEADER:
+            return value.decode("latin-1")
+    query_string = scope.get("query_string", b"")
+    if TOKEN_QUERY_PARAMETER.encode() in query_string:
+        return parse_qs(query_string.decode("latin-1")).get(TOKEN_QUERY_PARAMETER, [None])[0]
+    return None
+
+
+class ProfilingMiddleware:
+    """Profiles requests that carry the admin token, plus PROFILING_SAMPLE_RATE of the rest."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        # Reading the profiles carries the token too, but should not push real captures out of the ring
+        if scope["type"] != "http" or scope["path"].startswith("/debug/"):
+            return await self.app(scope, receive, send)
+        if is_admin_token(_request_token(scope)):
+            reason = "requested"
+        elif settings.PROFILING_SAMPLE_RATE > 0 and random.random() < settings.PROFILING_SAMPLE_RATE:
+            reason = "sampled"
+        else:
+            return await self.app(scope, receive, send)
+
+        capture = _Capture(scope, asyncio.current_task(), reason)
+        token = _current_capture.set(capture)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        _sampler.add(capture)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _sampler.remove(capture)
+            _current_capture.reset(token)
+            duration_ms = (time.perf_counter() - capture.started) * 1000
+            if capture.samples and duration_ms >= settings.PROFILING_MIN_DURATION_MS:
+                try:
+                    await run_in_threadpool(profile_store.save, capture, status, duration_ms)
+                except OSError as e:
+                    print(f"Error saving profile: {e}")
+
+
+_sampler = _Sampler()
+profile_store = ProfileStore(settings.PROFILING_DIR, settings.PROFILING_MAX_PROFILES)
@@ -0,0 +1,222 @@
+"""
+Background publishing of LinkedIn shares.
+
+Share requests are written to the publish_jobs table and return immediately. A pool of
+in-process worker threads claims due jobs atomically and runs each in two phases:
+
+- 'publishing': the images are rendered and uploaded. Uploads are cached per image, so
+  transient failures are retried with capped exponential backoff.
+- 'sharing': the share itself is created. This request is never repeated, since a 5xx or a
+  timeout may come after LinkedIn created the share. A rejected share fails the job, and an
+  ambiguous one leaves it 'unknown' for the user to check on LinkedIn.
+
+Errors another attempt cannot fix (an expired token, a missing post or image) fail the job at once.
+
+A job stores the share's access token encrypted with a key derived from SECRET_KEY, and its
+images as references to the blob store, which keeps them until the job finishes.
+"""
+import base64
+import functools
+import hashlib
+import threading
+import time
+import requests
+from app import image_pipeline, linkedin_client, metrics
+from app.config import settings
+from app.db import database
+from app.state import blob_store
+
+# How often one worker sweeps for jobs abandoned by a dead worker in any process.
+STALE_SWEEP_INTERVAL_SECONDS = 60
+
+_wakeup = threading.Event()
+_stop = threading.Event()
+_workers: list[threading.Thread] = []
+
+
+class PublishError(Exception):
+    """Raised when one attempt at publishing a job fails; the job is retried."""
+
+
+class PermanentPublishError(PublishError):
+    """Raised when another attempt cannot succeed; the job fails at once."""
+
+
+class AmbiguousShareError(PublishError):
+    """Raised when LinkedIn may or may not have created the share; the job is left 'unknown'."""
+
+
+def _is_permanent_status(status_code: int | None) -> bool:
+    """Whether an HTTP status means LinkedIn rejected the request for good (e.g. 401/403 for an expired token)."""
+    return status_code is not None and 400 <= status_code < 500 and status_code not in (408, 429)
+
+
+def _is_permanent(error: Exception) -> bool:
+    if isinstance(error, PermanentPublishError):
+        return True
+    if isinstance(error, requests.exceptions.RequestException) and error.response is not None:
+        return _is_permanent_status(error.response.status_code)
+    return False
+
+
+@functools.cache
+def _token_cipher():
+    # Imported here so app startup does not pay for the cryptography package
+    from cryptography.fernet import Fernet
+    key = hashlib.sha256(b"influra-publish-token:" + settings.SECRET_KEY.encode("utf-8")).digest()
+    return Fernet(base64.urlsafe_b64encode(key))
+
+
+def _encrypt_token(access_token: str) -> str:
+    return _token_cipher().encrypt(access_token.encode("utf-8")).decode("ascii")
+
+
+def _decrypt_token(stored_token: str | None) -> str:
+    from cryptography.fernet import InvalidToken
+    if not stored_token:
+        raise PermanentPublishError("The job has no access token.")
+    try:
+        return _token_cipher().decrypt(stored_token.encode("ascii")).decode("utf-8")
+    except InvalidToken:
+        raise PermanentPublishError("The stored access token cannot be decrypted (was SECRET_KEY changed?).") from None
+
+
+def enqueue_share(post_id: int, access_token: str, images: list) -> int | None:
+    """
+    Queues a post for sharing with its images as {"sha256", "mime_type"} blob store references,
+    and returns the job ID, or None if the post is already queued, publishing or posted.
+    Wakes an idle worker so the job starts without waiting for the next poll.
+    """
+    job_id = database.enqueue_publish_job(post_id, _encrypt_token(access_token), images)
+    if job_id is not None:
+        _wakeup.set()
+    return job_id
+
+
+def start_workers(count: int = None):
+    """Starts the worker threads. Safe to call once per process on startup."""
+    if _workers:
+        return
+    _stop.clear()
+    requeued = database.requeue_interrupted_publish_jobs(settings.PUBLISH_STALE_SECONDS)
+    if requeued:
+        print(f"Requeued {requeued} interrupted publish job(s).")
+
+    for index in range(count if count is not None else settings.PUBLISH_WORKERS):
+        worker = threading.Thread(target=_worker_loop, args=(index,), name=f"publish-worker-{index}", daemon=True)
+        worker.start()
+        _workers.append(worker)
+
+
+def stop_workers(timeout: float = 10):
+    """Signals the workers to stop after their current job and waits for them."""
+    _stop.set()
+    _wakeup.set()
+    for worker in _workers:
+        worker.join(timeout)
+    _workers.clear()
+
+
+def _worker_loop(index: int):
+    last_sweep = time.monotonic()
+    while not _stop.is_set():
+        try:
+            if index == 0 and time.monotonic() - last_sweep > STALE_SWEEP_INTERVAL_SECONDS:
+                database.requeue_interrupted_publish_jobs(settings.PUBLISH_STALE_SECONDS)
+                last_sweep = time.monotonic()
+
+            job = database.claim_publish_job()
+            if job is None:
+                _wakeup.wait(settings.PUBLISH_POLL_SECONDS)
+                _wakeup.clear()
+                continue
+            _process_job(job)
+        except Exception as e:
+            # Never let one bad job or a locked database kill the worker.
+            print(f"Publish worker {index} error: {e}")
+            _stop.wait(settings.PUBLISH_POLL_SECONDS)
+
+
+def _process_job(job: dict):
+    try:
+        _publish(job)
+    except AmbiguousShareError as e:
+        metrics.errors_total.inc(component="publish")
+        print(f"Publish job {job['id']} may or may not have been shared, leaving it for the user to check: {e}")
+        database.fail_publish_job(job['id'], job['post_id'], str(e), status='unknown')
+        return
+    except Exception as e:
+        error = str(e)
+        if _is_permanent(e) or job['attempts'] >= settings.PUBLISH_MAX_ATTEMPTS:
+            metrics.errors_total.inc(component="publish")
+            print(f"Publish job {job['id']} failed after {job['attempts']} attempt(s): {error}")
+            database.fail_publish_job(job['id'], job['post_id'], error)
+        else:
+            delay = min(
+                settings.PUBLISH_RETRY_BASE_SECONDS * 2 ** (job['attempts'] - 1),
+                settings.PUBLISH_RETRY_MAX_SECONDS
+            )
+            metrics.retries_total.inc(component="publish")
+            print(f"Publish job {job['id']} attempt {job['attempts']} failed, retrying in {delay:.0f}s: {error}")
+            database.retry_publish_job(job['id'], job['post_id'], error, delay)
+        return
+
+    database.complete_publish_job(job['id'], job['post_id'])
+    print(f"Publish job {job['id']} posted post {job['post_id']} to LinkedIn.")
+
+
+def _publish(job: dict):
+    """Runs one attempt: upload the job's images, then create the share."""
+    access_token = _decrypt_token(job['access_token'])
+    post = database.get_post(job['post_id'])
+    if not post:
+        raise PermanentPublishError("Post no longer exists.")
+
+    # Resolve the author once and pass it through, instead of one userinfo call per image and post
+    person_urn = linkedin_client.get_person_urn(access_token)
+
+    image_urns = []
+    images = []
+    try:
+        job_images = database.get_publish_job_images(job['id'])
+        for position, image in enumerate(job_images):
+            if not blob_store.exists(image["sha256"]):
+                raise PermanentPublishError(f"Image {position + 1} is missing from the blob store.")
+        # LinkedIn-ready copies are rendered on the first attempt and cached by source hash for retries
+        try:
+            linkedin_images = image_pipeline.prepare_variants_blocking(job_images, "linkedin") if job_images else []
+        except ValueError as e:  # The image cannot be decoded
+            raise PermanentPublishError(str(e)) from None
+
+        # The images are streamed from the blob store to LinkedIn without being read into memory
+        for position, image in enumerate(linkedin_images):
+            image_file = blob_store.open(image["sha256"])
+            if image_file is None:
+                raise PublishError(f"Image {position + 1} is missing from the blob store.")
+            # Blobs are named by their SHA-256, so the uploader does not need to hash them again
+            images.append((image_file, image["mime_type"], image["sha256"]))
+        if images:
+            # Upload all images concurrently; results come back in the original order
+            upload_results = linkedin_client.upload_images_to_linkedin(access_token, images, person_urn=person_urn)
+            failed = [(i, result) for i, result in enumerate(upload_results) if "error" in result]
+            if failed:
+                message = "Image upload failed (" + "; ".join(f"image {i + 1}: {result['error']}" for i, result in failed) + ")"
+                if any(_is_permanent_status(result["status_code"]) for _, result in failed):
+                    raise PermanentPublishError(message)
+                raise PublishError(message)
+            image_urns = [result["asset_urn"] for result in upload_results]
+    finally:
+        for image_file, *_ in images:
+            image_file.close()
+
+    database.start_sharing_publish_job(job['id'])
+    try:
+        linkedin_response = linkedin_client.post_linkedin_update(access_token, post['content'], image_urns, person_urn=person_urn)
+    except Exception as e:
+        raise AmbiguousShareError(f"Sharing failed: {e}") from e
+    if "error" in linkedin_response:
+        status_code = linkedin_response["status_code"]
+        if status_code is not None and 400 <= status_code < 500:
+            # LinkedIn answered and refused, so nothing was created; the request is still not repeated.
+            raise PermanentPublishError(f"LinkedIn API Error: {linkedin_response['error']}")
+        raise AmbiguousShareError(f"LinkedIn API Error: {linkedin_response['error']}")
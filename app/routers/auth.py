@@ -1,13 +1,15 @@
 from fastapi import APIRouter, Request, HTTPException, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import RedirectResponse
-from requests_oauthlib import OAuth2Session
 from app.config import settings
 from typing import Optional
 import requests
 
 # Import our project modules
 from app import linkedin_client
-from app.ai import gemini_client, prompts
+from app.http_client import get_session
+from app.identity_cache import identity_cache
+from app.ai import gemini_client, prompts, rate_limiter
 from app.db import database
 
 router = APIRouter()
@@ -19,14 +21,14 @@ LINKEDIN_TOKEN_URL = "https://www.linkedin.com/oauth/v2/accessToken"
 # Scopes requested from LinkedIn - r_liteprofile is needed for the /v2/me endpoint
 LINKEDIN_SCOPES = ["openid", "profile", "email", "w_member_social", "r_liteprofile"]
 
-def analyze_and_store_profile(access_token: str):
+async def analyze_and_store_profile(access_token: str):
     """
     Background task to fetch, analyze, and store a user's LinkedIn profile.
     """
     try:
         print("Starting background profile analysis...")
         # 1. Fetch detailed profile from LinkedIn
-        profile_data = linkedin_client.get_user_profile(access_token)
+        profile_data = await run_in_threadpool(linkedin_client.get_user_profile, access_token)
         user_id = profile_data.get("id")
         if not user_id:
             print("Error: Could not get user ID from LinkedIn profile.")
@@ -42,14 +44,17 @@ def analyze_and_store_profile(access_token: str):
 
         # 3. Build the prompt and call the AI for analysis
         prompt = prompts.build_profile_prompt(profile_text)
-        analysis_result = gemini_client.call_gemini_json([prompt])
+        # Nobody is waiting on this call, so interactive requests go ahead of it when Gemini is busy
+        analysis_result = await gemini_client.call_gemini_json_async(
+            [prompt], prompt_type="profile", priority=rate_limiter.PRIORITY_BACKGROUND
+        )
 
         if not analysis_result or "error" in analysis_result:
             print(f"Error analyzing profile with Gemini: {analysis_result.get('error')}")
             return
 
         # 4. Save the analysis to the database
-        database.upsert_user_profile(user_id, analysis_result)
+        await run_in_threadpool(database.upsert_user_profile, user_id, analysis_result)
         print(f"Successfully analyzed and stored profile for user {user_id}")
 
     except Exception as e:
@@ -60,6 +65,8 @@ def linkedin_login(request: Request):
     """
     Initiates the LinkedIn OAuth2 login flow.
     """
+    from requests_oauthlib import OAuth2Session # Only needed here, so kept out of app startup
+
     redirect_uri = request.url_for("linkedin_callback")
     linkedin = OAuth2Session(
         settings.LINKEDIN_CLIENT_ID,
@@ -96,8 +103,10 @@ def linkedin_callback(request: Request, background_tasks: BackgroundTasks, code:
         "client_secret": settings.LINKEDIN_CLIENT_SECRET,
     }
 
+    response = None
     try:
-        response = requests.post(LINKEDIN_TOKEN_URL, data=token_data)
+        # Sent once: the code is single use, so http_client never retries this endpoint
+        response = get_session().post(LINKEDIN_TOKEN_URL, data=token_data)
         response.raise_for_status()
         token = response.json()
     except requests.exceptions.RequestException as e:
@@ -109,6 +118,7 @@ def linkedin_callback(request: Request, background_tasks: BackgroundTasks, code:
     access_token = token.get("access_token")
 
     if access_token:
+        identity_cache.remember_token(access_token, token.get("expires_in"))
         # Get user profile to store user_id in session
         try:
             profile_data = linkedin_client.get_user_profile(access_token)
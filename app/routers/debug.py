@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from app import profiling
+
+router = APIRouter()
+
+def _require_admin(request: Request, x_profile_token: str | None):
+    """Hides the endpoints unless profiling is on, and requires the admin token."""
+    if not profiling.is_enabled():
+        raise HTTPException(status_code=404, detail="Not Found")
+    token = x_profile_token or request.query_params.get(profiling.TOKEN_QUERY_PARAMETER)
+    if not profiling.is_admin_token(token):
+        raise HTTPException(status_code=403, detail="A valid profiling token is required.")
+
+@router.get("/debug/profiles")
+async def list_profiles(request: Request, x_profile_token: str = Header(None)):
+    """
+    Lists the captured request profiles, newest first, with a link to each one's collapsed stacks.
+    """
+    _require_admin(request, x_profile_token)
+    profiles = await run_in_threadpool(profiling.profile_store.list)
+    for profile in profiles:
+        profile["url"] = str(request.url_for("get_profile", profile_id=profile["id"]))
+    return profiles
+
+@router.get("/debug/profiles/{profile_id}", name="get_profile")
+async def get_profile(request: Request, profile_id: str, x_profile_token: str = Header(None)):
+    """
+    Returns one profile as collapsed stacks ("frame;frame;frame count" per line), which
+    flamegraph.pl and speedscope.app open directly.
+    """
+    _require_admin(request, x_profile_token)
+    folded = await run_in_threadpool(profiling.profile_store.read_folded, profile_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    return PlainTextResponse(folded, headers={"Content-Disposition": f"attachment; filename={profile_id}.folded"})
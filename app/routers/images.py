@@ -1,7 +1,9 @@
 from fastapi import APIRouter, UploadFile, File, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import RedirectResponse
 from app.ai import gemini_client, prompts
-from app.state import latest_analysis
+from app import image_pipeline, metrics, uploads
+from app.state import analysis_store, blob_store, get_session_id
 from typing import List
 
 router = APIRouter()
@@ -10,34 +12,33 @@ router = APIRouter()
 async def analyze_image(request: Request, images: List[UploadFile] = File(...)):
     """
     Analyzes uploaded images using Gemini Vision.
-    Stores the result in the in-memory state and redirects to the main page.
+    The uploads are streamed into the blob store in chunks (see app/uploads.py) and normalized
+    (see app/image_pipeline.py); the session's analysis state keeps the result and references to
+    the uploaded images, whose LinkedIn-ready copies are rendered when a share is published.
     """
+    session_id = get_session_id(request)
     try:
-        all_image_data = []
-        all_image_mime_types = []
+        stored_images = await uploads.spool_images(images, blob_store)
+        # Downscaled copies go to Gemini; the originals are kept for sharing
+        analysis_images = await image_pipeline.prepare_images(stored_images)
+
+        # The Gemini SDK needs each inline image as bytes, so they are read back one at a time here.
         prompt_parts = []
+        for image in analysis_images:
+            image_data = await run_in_threadpool(blob_store.get, image["sha256"])
+            prompt_parts.append({"mime_type": image["mime_type"], "data": image_data})
 
-        for image in images:
-            image_data = await image.read()
-            image_mime_type = image.content_type
-            all_image_data.append(image_data)
-            all_image_mime_types.append(image_mime_type)
-            prompt_parts.append({"mime_type": image_mime_type, "data": image_data})
-        
         # Add the text prompt for image analysis
         prompt_parts.append({"text": prompts.IMAGE_PROMPT_TEMPLATE})
         
-        analysis_result = gemini_client.call_gemini_json(prompt_parts)
+        analysis_result = await gemini_client.call_gemini_json_async(prompt_parts, prompt_type="image")
 
-        # Store the result and image data
-        latest_analysis["image_analysis"] = analysis_result
-        latest_analysis["image_data"] = all_image_data
-        latest_analysis["image_mime_types"] = all_image_mime_types
+        # Store the result and references to the image data
+        await analysis_store.aupdate(session_id, image_analysis=analysis_result, images=stored_images)
 
     except Exception as e:
+        metrics.errors_total.inc(component="image_analysis")
         print(f"Error analyzing image: {e}")
-        latest_analysis["image_analysis"] = {"error": str(e)}
-        latest_analysis["image_data"] = []
-        latest_analysis["image_mime_types"] = []
+        await analysis_store.aupdate(session_id, image_analysis={"error": str(e)}, images=[])
 
-    return RedirectResponse("/", status_code=303)
+    return RedirectResponse("/", status_code=303)
\ No newline at end of file
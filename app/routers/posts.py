@@ -1,54 +1,288 @@
-from fastapi import APIRouter, Form, Response, Request, HTTPException
-from fastapi.responses import RedirectResponse, StreamingResponse
+from fastapi import APIRouter, Form, Query, Request, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
 from app.ai import gemini_client, prompts
-from app.state import latest_analysis
+from app.state import analysis_store, blob_store, get_session_id
 from app.db import database
-from app import linkedin_client # Import the new linkedin_client
-import io
-import csv
+from app import dedupe, exports, publish_queue
+from app.config import settings
+from app.templating import templates
+import json
+import asyncio
+from datetime import date, timedelta
 from typing import List
+from urllib.parse import urlencode
 
 router = APIRouter()
 
+# Upper bound for /post/generate/batch, and the temperature range its variants are spread over
+MAX_BATCH_VARIANTS = 8
+VARIANT_TEMPERATURE_RANGE = (0.3, 1.0)
+
 @router.post("/post/generate")
-def generate_post(manual_context: str = Form(None)):
+async def generate_post(request: Request, manual_context: str = Form(None)):
     """
     Generates a LinkedIn post using the stored profile, trend analysis, and optional manual context.
-    Stores the generated post in the in-memory state.
+    Stores the generated post in the session's analysis state.
     """
-    profile_summary = latest_analysis.get("profile_summary")
-    trend_insights = latest_analysis.get("trend_insights")
-    image_analysis = latest_analysis.get("image_analysis") # Get image analysis
+    session_id = get_session_id(request)
+    analysis = await analysis_store.aload(session_id)
+    profile_summary = analysis["profile_summary"]
+    trend_insights = analysis["trend_insights"]
+    image_analysis = analysis["image_analysis"] # Get image analysis
 
     # Ensure we have at least profile and trend for a basic post
     if not profile_summary or not trend_insights:
-        latest_analysis["generated_post"] = {"error": "Please analyze a profile and trends before generating a post.", "raw_response": ""}
+        await analysis_store.aupdate(session_id, generated_post={"error": "Please analyze a profile and trends before generating a post.", "raw_response": ""})
         return RedirectResponse("/", status_code=303)
 
     # Pass image_analysis and manual_context to the prompt builder
     prompt_text = prompts.build_post_prompt(profile_summary, trend_insights, image_analysis, manual_context)
     
     # Call Gemini
-    generated_post = gemini_client.call_gemini_json([prompt_text]) # Pass as list for multimodal compatibility
+    generated_post = await gemini_client.call_gemini_json_async([prompt_text], prompt_type="post") # Pass as list for multimodal compatibility
 
-    latest_analysis["generated_post"] = generated_post
+    await analysis_store.aupdate(session_id, generated_post=generated_post)
 
     return RedirectResponse("/", status_code=303)
 
+@router.post("/post/generate/stream")
+async def generate_post_stream(request: Request, manual_context: str = Form(None)):
+    """
+    Streams post generation to the dashboard in server-sent event format, read by fetch().
+    Emits "delta" events with new post text as it arrives, then a single "done" (or "error")
+    event once the final JSON is parsed and stored in the session's analysis state.
+    A POST with the same form as /post/generate, so a cross-site link or image cannot start a
+    model call with the session cookie (it is SameSite=lax) and the context stays out of URLs.
+    """
+    session_id = get_session_id(request)
+    analysis = await analysis_store.aload(session_id)
+    profile_summary = analysis["profile_summary"]
+    trend_insights = analysis["trend_insights"]
+    image_analysis = analysis["image_analysis"]
+
+    if not profile_summary or not trend_insights:
+        error = {"error": "Please analyze a profile and trends before generating a post.", "raw_response": ""}
+        await analysis_store.aupdate(session_id, generated_post=error)
+        events = iter([_sse_event("error", error)])
+    else:
+        prompt_text = prompts.build_post_prompt(profile_summary, trend_insights, image_analysis, manual_context)
+        events = _stream_post_events(session_id, prompt_text)
+
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _stream_post_events(session_id: str, prompt_text: str):
+    """Relays streamed post text as SSE events, then validates and stores the final post."""
+    buffer = ""
+    sent_length = 0
+    try:
+        async for chunk in gemini_client.stream_gemini_text_async([prompt_text], prompt_type="post"):
+            buffer += chunk
+            partial_post = gemini_client.extract_partial_json_string(buffer, "post")
+            if partial_post and len(partial_post) > sent_length:
+                yield _sse_event("delta", {"text": partial_post[sent_length:]})
+                sent_length = len(partial_post)
+    except Exception as e:
+        print(f"Error streaming post from Gemini: {e}")
+        error = {"error": str(e), "raw_response": buffer}
+        await analysis_store.aupdate(session_id, generated_post=error)
+        yield _sse_event("error", error)
+        return
+
+    generated_post = _validate_generated_post(gemini_client.parse_json_response(buffer), buffer)
+    await analysis_store.aupdate(session_id, generated_post=generated_post)
+    yield _sse_event("error" if "error" in generated_post else "done", generated_post)
+
+@router.post("/post/generate/batch")
+async def generate_post_batch(
+    request: Request,
+    n: int = Query(3, ge=1, le=MAX_BATCH_VARIANTS),
+    manual_context: str = Form(None),
+    save: bool = Form(False)
+):
+    """
+    Generates n distinct post variants in one request by fanning out concurrent model calls,
+    each with its own temperature and variant instruction, so the wall-clock time is close to one call.
+    Stores the variants in the session's analysis state and optionally saves the valid ones as drafts.
+    Returns JSON when the client asks for it, otherwise redirects to the dashboard.
+    """
+    session_id = get_session_id(request)
+    analysis = await analysis_store.aload(session_id)
+    profile_summary = analysis["profile_summary"]
+    trend_insights = analysis["trend_insights"]
+    image_analysis = analysis["image_analysis"]
+
+    if not profile_summary or not trend_insights:
+        variants = [{"error": "Please analyze a profile and trends before generating a post.", "raw_response": ""}]
+        await analysis_store.aupdate(session_id, generated_variants=variants)
+        return _batch_response(request, variants, [])
+
+    prompt_text = prompts.build_post_prompt(profile_summary, trend_insights, image_analysis, manual_context)
+    low, high = VARIANT_TEMPERATURE_RANGE
+    temperatures = [round(low + (high - low) * i / max(n - 1, 1), 2) for i in range(n)]
+
+    # Every click should produce fresh options, so the variants bypass the response cache.
+    results = await asyncio.gather(*[
+        gemini_client.call_gemini_json_async(
+            [prompts.build_post_variant_prompt(prompt_text, i, n)],
+            prompt_type="post",
+            use_cache=False,
+            temperature=temperatures[i]
+        )
+        for i in range(n)
+    ])
+    variants = [_validate_generated_post(result, json.dumps(result)) for result in results]
+    saved_ids = []
+    if save:
+        saved_ids = await run_in_threadpool(_save_variants, variants)
+        await analysis_store.aupdate(session_id, generated_variants=[v for v in variants if "error" in v])
+    else:
+        await analysis_store.aupdate(session_id, generated_variants=variants)
+
+    return _batch_response(request, variants, saved_ids)
+
+def _save_variants(variants: list[dict]) -> list[int]:
+    """Saves every valid variant as a draft and returns the new post IDs."""
+    return [
+        database.insert_post(variant["post"], ", ".join(variant["hashtags"]))
+        for variant in variants
+        if "error" not in variant
+    ]
+
+def _batch_response(request: Request, variants: list[dict], saved_ids: list[int]):
+    """Returns the batch results as JSON for API clients, or redirects browsers to the dashboard."""
+    if "application/json" in request.headers.get("accept", ""):
+        return JSONResponse({"variants": variants, "saved_ids": saved_ids})
+    return RedirectResponse("/", status_code=303)
+
+def _validate_generated_post(result, raw_response: str) -> dict:
+    """Checks that a parsed response has the {post, hashtags} shape the dashboard expects."""
+    if not isinstance(result, dict) or "error" in result:
+        return result if isinstance(result, dict) else {"error": "AI response not valid JSON", "raw_response": raw_response}
+    if not isinstance(result.get("post"), str) or not result["post"].strip():
+        return {"error": "AI response is missing the post text", "raw_response": raw_response}
+    hashtags = result.get("hashtags")
+    if isinstance(hashtags, str):
+        hashtags = [tag.strip() for tag in hashtags.replace(",", " ").split() if tag.strip()]
+    if not isinstance(hashtags, list):
+        return {"error": "AI response is missing hashtags", "raw_response": raw_response}
+    return {"post": result["post"], "hashtags": [str(tag) for tag in hashtags]}
+
+def _sse_event(event: str, data: dict) -> str:
+    """Formats one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _find_duplicate(signature, exclude_id: int = None, statuses: tuple = None) -> dict | None:
+    """
+    Returns the most similar existing post at or above DEDUPE_THRESHOLD as
+    {"post_id", "similarity"}, or None. Pass statuses to only consider posts in those states.
+    """
+    if settings.DEDUPE_MODE == "off":
+        return None
+    database.sync_dedupe_index()  # Pick up posts saved or deleted by other worker processes
+    matches = dedupe.index.find_similar(signature, settings.DEDUPE_THRESHOLD, exclude_id=exclude_id)
+    if statuses is not None and matches:
+        allowed_ids = {post['id'] for post in database.get_posts([post_id for post_id, _ in matches]) if post['status'] in statuses}
+        matches = [match for match in matches if match[0] in allowed_ids]
+    if not matches:
+        return None
+    post_id, similarity = matches[0]
+    return {"post_id": post_id, "similarity": similarity}
+
+def _duplicate_query(duplicate: dict, action: str) -> str:
+    """Builds the dashboard query string that reports a near-duplicate."""
+    return urlencode({
+        "duplicate_of": duplicate["post_id"],
+        "duplicate_similarity": f"{duplicate['similarity']:.0%}",
+        "duplicate_action": action,
+    })
+
 @router.post("/posts/save")
-def save_post():
+def save_post(request: Request, variant: int = Form(None)):
     """
-    Saves the latest generated post to the database.
+    Saves the session's latest generated post, or one of its latest batch variants, to the database.
     """
-    post_data = latest_analysis.get("generated_post")
+    session_id = get_session_id(request)
+    analysis = analysis_store.load(session_id)
+    variants = analysis["generated_variants"] or []
+    if variant is not None:
+        post_data = variants[variant] if 0 <= variant < len(variants) else None
+    else:
+        post_data = analysis["generated_post"]
+
     if post_data and 'post' in post_data and 'hashtags' in post_data:
         content = post_data['post']
         hashtags_str = ", ".join(post_data['hashtags'])
-        database.insert_post(content, hashtags_str)
-        latest_analysis["generated_post"] = None
+
+        signature = dedupe.minhash_signature(content)
+        duplicate = _find_duplicate(signature)
+        if duplicate and settings.DEDUPE_MODE == "reject":
+            # Keep the generated post on the dashboard so it can be edited or discarded
+            return RedirectResponse(f"/?{_duplicate_query(duplicate, 'rejected')}", status_code=303)
+
+        database.insert_post(content, hashtags_str, signature=signature)
+        if variant is not None:
+            analysis_store.update(session_id, generated_variants=variants[:variant] + variants[variant + 1:])
+        else:
+            analysis_store.update(session_id, generated_post=None)
+        if duplicate:
+            return RedirectResponse(f"/?{_duplicate_query(duplicate, 'saved')}", status_code=303)
 
     return RedirectResponse("/", status_code=303)
 
+@router.get("/posts/page")
+def list_posts_page(
+    request: Request,
+    after_created_at: str = None,
+    after_id: int = None,
+    limit: int = Query(None, ge=1, le=200),
+    status: List[str] = Query(None)
+):
+    """
+    Returns the next keyset page of saved posts, newest first.
+    Browsers get table rows for the dashboard's infinite scroll; clients that ask for JSON
+    get {"posts": [...], "next": {"after_created_at", "after_id"} or null}.
+    """
+    limit = limit or settings.POSTS_PAGE_SIZE
+    posts = database.list_posts(statuses=status, after_created_at=after_created_at, after_id=after_id, limit=limit + 1)
+    has_more = len(posts) > limit
+    posts = posts[:limit]
+
+    if "application/json" in request.headers.get("accept", ""):
+        next_cursor = {"after_created_at": posts[-1]["created_at"], "after_id": posts[-1]["id"]} if has_more else None
+        return JSONResponse({"posts": posts, "next": next_cursor})
+
+    return templates.TemplateResponse("_post_rows.html", {
+        "request": request,
+        "saved_posts": posts,
+        "has_more": has_more,
+        "status_filter": status[0] if status else None,
+        "is_first_page": False,
+    })
+
+@router.get("/posts/search")
+def search_posts(
+    q: str,
+    after_rank: float = None,
+    after_id: int = None,
+    limit: int = Query(None, ge=1, le=100),
+    status: List[str] = Query(None)
+):
+    """
+    Full-text searches saved drafts and hashtags, ranked by BM25, with highlighted snippets.
+    Returns {"results": [...], "next": {"after_rank", "after_id"} or null} for keyset paging.
+    """
+    limit = limit or settings.POSTS_PAGE_SIZE
+    results = database.search_posts(q, statuses=status, after_rank=after_rank, after_id=after_id, limit=limit + 1)
+    has_more = len(results) > limit
+    results = results[:limit]
+    next_cursor = {"after_rank": results[-1]["rank"], "after_id": results[-1]["id"]} if has_more else None
+    return {"results": results, "next": next_cursor}
+
 @router.post("/posts/delete")
 def delete_posts(post_ids: List[int] = Form(...)):
     """
@@ -76,89 +310,81 @@ def mark_post_as_posted(post_id: int):
 @router.post("/posts/{post_id}/share")
 def share_post_on_linkedin(request: Request, post_id: int):
     """
-    Shares a saved post to LinkedIn using the authenticated user's token.
+    Queues a saved post for sharing to LinkedIn using the authenticated user's token.
+    The upload and publish steps run on the background publish workers; the dashboard
+    polls the returned job until it is posted or failed.
     """
     linkedin_token = request.session.get("linkedin_token")
     if not linkedin_token:
         raise HTTPException(status_code=401, detail="Not authenticated with LinkedIn. Please log in.")
 
-    post = next((p for p in database.list_posts() if p['id'] == post_id), None)
+    post = database.get_post(post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found.")
+    if post['status'] in ('queued', 'publishing', 'posted'):
+        raise HTTPException(status_code=409, detail=f"Post is already {post['status']}.")
 
-    post_content = post['content']
-    image_urns = [] # Initialize list for multiple image URNs
-
-    # Check if images were analyzed and stored
-    all_image_data = latest_analysis.get("image_data", [])
-    all_image_mime_types = latest_analysis.get("image_mime_types", [])
-
-    if all_image_data and all_image_mime_types and len(all_image_data) == len(all_image_mime_types):
-        for i, image_data in enumerate(all_image_data):
-            mime_type = all_image_mime_types[i]
-            try:
-                # Upload each image to LinkedIn Assets
-                urn = linkedin_client.upload_image_to_linkedin(linkedin_token['access_token'], image_data, mime_type)
-                image_urns.append(urn)
-                print(f"DEBUG: Image uploaded to LinkedIn, URN: {urn}")
-            except Exception as e:
-                print(f"Error uploading image {i+1} to LinkedIn Assets: {e}")
-                # Continue with other images or return an error
-                return RedirectResponse("/?linkedin_error=true&image_upload_error=true", status_code=303)
-
-    try:
-        # Pass the list of image_urns to post_linkedin_update
-        linkedin_response = linkedin_client.post_linkedin_update(linkedin_token['access_token'], post_content, image_urns)
-        
-        if "error" in linkedin_response:
-            print(f"LinkedIn API Error: {linkedin_response['error']}")
-            return RedirectResponse("/?linkedin_error=true", status_code=303)
-        else:
-            database.mark_posted(post_id)
-            return RedirectResponse("/?linkedin_success=true", status_code=303)
-    except Exception as e:
-        print(f"Error sharing to LinkedIn: {e}")
-        return RedirectResponse("/?linkedin_error=true", status_code=303)
-
-@router.get("/export/md")
-def export_md():
-    """
-    Exports all posts as a Markdown file.
-    """
-    posts = database.list_posts()
-    md_content = "# LinkedIn Drafts\n\n"
-    for post in posts:
-        md_content += f"## Draft (ID: {post['id']}, Status: {post['status']})\n"
-        md_content += f"**Created:** {post['created_at']}\n\n"
-        md_content += f"{post['content']}\n\n"
-        md_content += f"**Hashtags:** {post['hashtags']}\n\n"
-        md_content += "---\n\n"
-    
-    return Response(
-        content=md_content,
-        media_type="text/markdown",
-        headers={"Content-Disposition": "attachment; filename=influra_drafts.md"}
+    # Only posts that are (or are about to be) live on LinkedIn count as duplicates when sharing
+    duplicate = _find_duplicate(
+        dedupe.minhash_signature(post['content']),
+        exclude_id=post_id,
+        statuses=('queued', 'publishing', 'posted', 'unknown'),
     )
+    if duplicate and settings.DEDUPE_MODE == "reject":
+        return RedirectResponse(f"/?{_duplicate_query(duplicate, 'not_shared')}", status_code=303)
 
-@router.get("/export/csv")
-def export_csv():
+    # Pin the session's analyzed images into the job now, so later uploads cannot change what it publishes
+    images = analysis_store.load(get_session_id(request))["images"]
+    # Touching the blobs keeps them from being swept before the job row pins them
+    if not all(blob_store.touch(image["sha256"]) for image in images):
+        raise HTTPException(status_code=409, detail="The analyzed images have expired. Please upload them again.")
+
+    job_id = publish_queue.enqueue_share(post_id, linkedin_token['access_token'], images)
+    if job_id is None:
+        # Another request queued or published the post after the check above
+        raise HTTPException(status_code=409, detail="Post is already queued or published.")
+    if duplicate:
+        return RedirectResponse(f"/?linkedin_queued={job_id}&{_duplicate_query(duplicate, 'shared')}", status_code=303)
+    return RedirectResponse(f"/?linkedin_queued={job_id}", status_code=303)
+
+@router.get("/posts/jobs/{job_id}")
+def get_publish_job_status(job_id: int):
     """
-    Exports all posts as a CSV file.
+    Returns the status of a publish job as JSON, for the dashboard to poll.
     """
-    posts = database.list_posts()
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    if posts:
-        writer.writerow(posts[0].keys())
-        # Write data
-        for post in posts:
-            writer.writerow(post.values())
-    
-    output.seek(0)
+    job = database.get_publish_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Publish job not found.")
+    return job
+
+@router.get("/export/{export_format}")
+def export_posts(
+    export_format: str,
+    status: List[str] = Query(None),
+    created_from: date = None,
+    created_to: date = None,
+    gzip: bool = False
+):
+    """
+    Streams saved posts as a Markdown, CSV or JSONL file.
+    Optionally filtered by status and by an inclusive created_at date range,
+    and optionally gzip-compressed in transit.
+    """
+    if export_format not in exports.EXPORT_FORMATS:
+        raise HTTPException(status_code=404, detail="Unknown export format.")
+    media_type, filename = exports.EXPORT_FORMATS[export_format]
+
+    posts = database.iter_posts(
+        statuses=status,
+        created_from=created_from.isoformat() if created_from else None,
+        created_before=(created_to + timedelta(days=1)).isoformat() if created_to else None
+    )
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+
     return StreamingResponse(
-        output,
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=influra_drafts.csv"}
+        exports.export_stream(export_format, posts, database.POST_COLUMNS, gzip=gzip),
+        media_type=media_type,
+        headers=headers
     )
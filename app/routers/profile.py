@@ -1,22 +1,22 @@
-from fastapi import APIRouter, Form
+from fastapi import APIRouter, Form, Request
 from fastapi.responses import RedirectResponse
 from app.ai import gemini_client, prompts
-from app.state import latest_analysis
+from app.state import analysis_store, get_session_id
 
 router = APIRouter()
 
 @router.post("/profile/analyze")
-def analyze_profile(text: str = Form(...)):
+async def analyze_profile(request: Request, text: str = Form(...)):
     """
     Analyzes the provided LinkedIn profile text.
-    Stores the result in the in-memory state and redirects to the main page.
+    Stores the result in the session's analysis state and redirects to the main page.
     """
     # Build the prompt and call the AI
     prompt = prompts.build_profile_prompt(text)
-    summary = gemini_client.call_gemini_json(prompt)
+    summary = await gemini_client.call_gemini_json_async(prompt, prompt_type="profile")
 
     # Store the result
-    latest_analysis["profile_summary"] = summary
+    await analysis_store.aupdate(get_session_id(request), profile_summary=summary)
 
     # Redirect back to the home page to see the results
     return RedirectResponse("/", status_code=303)
\ No newline at end of file
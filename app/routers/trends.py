@@ -1,19 +1,19 @@
-from fastapi import APIRouter, Form
+from fastapi import APIRouter, Form, Request
 from fastapi.responses import RedirectResponse
-from app.ai import gemini_client, prompts
-from app.state import latest_analysis
+from app.ai import trend_analysis
+from app.state import analysis_store, get_session_id
 
 router = APIRouter()
 
 @router.post("/trends/analyze")
-def analyze_trends(text: str = Form(...)):
+async def analyze_trends(request: Request, text: str = Form(...)):
     """
     Analyzes the provided trend or news text.
-    Stores the result in the in-memory state and redirects to the main page.
+    Stores the result in the session's analysis state and redirects to the main page.
     """
-    prompt = prompts.build_trends_prompt(text)
-    insights = gemini_client.call_gemini_json(prompt)
+    # Long texts are chunked and analyzed concurrently, then merged; short ones take a single call
+    insights = await trend_analysis.analyze_trends(text)
 
-    latest_analysis["trend_insights"] = insights
+    await analysis_store.aupdate(get_session_id(request), trend_insights=insights)
 
     return RedirectResponse("/", status_code=303)
\ No newline at end of file
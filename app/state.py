@@ -1,13 +1,326 @@
-# A simple in-memory store for the application state.
+"""
+Per-session storage for analysis results between requests.
 
-# This will hold the latest analysis results to be used in post generation.
-# In a production app, this would be replaced by a more robust session management
-# system like Redis, a database cache, or client-side storage.
+Each browser session gets its own analysis state (profile summary, trend insights, image
+analysis, generated posts and references to the uploaded images). Two implementations
+share one small interface:
 
-latest_analysis = {
+- MemoryAnalysisStore keeps states in an in-process LRU bounded by a total byte budget.
+  It is the fastest option, but only correct with a single worker process.
+- SqliteAnalysisStore keeps states in the main database, so every worker process sees
+  the same state and uvicorn can run with several workers.
+
+Uploaded image bytes never live in the state itself. They are written once to
+content-addressed files by BlobStore and the state only holds their hashes.
+"""
+import hashlib
+import json
+import os
+import secrets
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from fastapi.concurrency import run_in_threadpool
+from app.config import settings
+from app.db import database
+
+SESSION_KEY = "analysis_id"
+
+# The fields every analysis state starts with.
+DEFAULT_STATE = {
     "profile_summary": None,
     "trend_insights": None,
-    "image_analysis": None, # Added for image analysis results
-    "image_data": [],      # Changed to list for multiple images
-    "image_mime_types": []  # Changed to list for multiple images
-}
\ No newline at end of file
+    "image_analysis": None,
+    "images": [],  # [{"sha256": str, "mime_type": str}], payloads live in the blob store
+    "generated_post": None,
+    "generated_variants": None,
+}
+
+
+def get_session_id(request) -> str:
+    """Returns the analysis session ID stored in the signed session cookie, creating one on first use."""
+    session_id = request.session.get(SESSION_KEY)
+    if not session_id:
+        session_id = secrets.token_urlsafe(16)
+        request.session[SESSION_KEY] = session_id
+    return session_id
+
+
+class AnalysisStore:
+    """The interface routers use to read and update a session's analysis state."""
+
+    def load(self, session_id: str) -> dict:
+        """Returns a copy of the session's state, with defaults for missing fields."""
+        raise NotImplementedError
+
+    def update(self, session_id: str, **fields):
+        """Sets the given fields of the session's state, leaving the others unchanged."""
+        raise NotImplementedError
+
+    def clear(self, session_id: str):
+        raise NotImplementedError
+
+    # Async handlers use these, so a store that may block (SQLite) never stalls the event loop.
+    async def aload(self, session_id: str) -> dict:
+        return await run_in_threadpool(self.load, session_id)
+
+    async def aupdate(self, session_id: str, **fields):
+        await run_in_threadpool(self.update, session_id, **fields)
+
+
+class MemoryAnalysisStore(AnalysisStore):
+    """
+    Keeps states as JSON strings in an LRU. Sessions are evicted, least recently used first,
+    once the states together exceed max_bytes or a state is older than ttl seconds.
+    """
+
+    def __init__(self, max_bytes: int, ttl: int):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._states = OrderedDict()  # session ID -> (state JSON, updated_at)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def load(self, session_id: str) -> dict:
+        with self._lock:
+            entry = self._states.get(session_id)
+            if entry is not None and entry[1] + self.ttl <= time.time():
+                self._remove(session_id)
+                entry = None
+            if entry is None:
+                return dict(DEFAULT_STATE)
+            self._states.move_to_end(session_id)
+        return {**DEFAULT_STATE, **json.loads(entry[0])}
+
+    def update(self, session_id: str, **fields):
+        with self._lock:
+            entry = self._states.get(session_id)
+            fresh = entry is not None and entry[1] + self.ttl > time.time()
+            state = json.loads(entry[0]) if fresh else {}
+            state.update(fields)
+            data = json.dumps(state)
+            self._remove(session_id)
+            self._states[session_id] = (data, time.time())
+            self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes and len(self._states) > 1:
+                self._remove(next(iter(self._states)))
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._remove(session_id)
+
+    # Only an in-memory lock is taken, which is cheaper than a thread pool round trip.
+    async def aload(self, session_id: str) -> dict:
+        return self.load(session_id)
+
+    async def aupdate(self, session_id: str, **fields):
+        self.update(session_id, **fields)
+
+    def _remove(self, session_id: str):
+        # Callers hold the lock.
+        entry = self._states.pop(session_id, None)
+        if entry is not None:
+            self._total_bytes -= len(entry[0])
+
+
+class SqliteAnalysisStore(AnalysisStore):
+    """Keeps states in the analysis_sessions table, shared by every worker process."""
+
+    # How often expired sessions are deleted, in seconds.
+    SWEEP_INTERVAL = 600
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._last_sweep = 0.0
+
+    def load(self, session_id: str) -> dict:
+        state = database.get_analysis_state(session_id, self.ttl)
+        return {**DEFAULT_STATE, **(state or {})}
+
+    def update(self, session_id: str, **fields):
+        database.update_analysis_state(session_id, fields, self.ttl)
+        if time.monotonic() - self._last_sweep > self.SWEEP_INTERVAL:
+            self._last_sweep = time.monotonic()
+            database.delete_expired_analysis_states(self.ttl)
+
+    def clear(self, session_id: str):
+        database.delete_analysis_state(session_id)
+
+
+class BlobStore:
+    """
+    Stores binary payloads as files named by their SHA-256, so identical uploads are stored
+    once and any worker process can read them. Files untouched for max_age seconds are swept,
+    except those kept by pinned, which is given the expired digests and returns the ones that
+    are still referenced (e.g. images of queued publish jobs).
+    """
+
+    # How often the background sweeper runs, in seconds.
+    SWEEP_INTERVAL = 3600
+
+    def __init__(self, directory: str, max_age: int, pinned=None):
+        self.directory = directory
+        self.max_age = max_age
+        self.pinned = pinned
+
+    def path(self, digest: str) -> str:
+        """Returns the file path for a digest, whether or not it is stored."""
+        if len(digest) != 64 or not all(c in "0123456789abcdef" for c in digest):
+            raise ValueError(f"Invalid blob digest: {digest!r}")
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def put(self, data: bytes) -> str:
+        """Stores data and returns its SHA-256 hex digest."""
+        writer = self.open_writer()
+        try:
+            writer.write(data)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.commit()
+
+    def open_writer(self) -> "BlobWriter":
+        """Starts a blob that is written in chunks; its digest is only known once it is committed."""
+        os.makedirs(self.directory, exist_ok=True)
+        return BlobWriter(self)
+
+    def _commit(self, temp_path: str, digest: str) -> str:
+        path = self.path(digest)
+        if os.path.exists(path):
+            os.remove(temp_path)
+            os.utime(path)  # Keep re-uploaded blobs from being swept
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)  # Atomic, so readers never see a partial blob
+        return digest
+
+    def get(self, digest: str) -> bytes | None:
+        """Returns the stored data, or None if it was never stored or has been swept."""
+        f = self.open(digest)
+        if f is None:
+            return None
+        with f:
+            return f.read()
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def touch(self, digest: str) -> bool:
+        """Restarts a blob's expiry clock. Returns False if it is gone."""
+        try:
+            os.utime(self.path(digest))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def open(self, digest: str):
+        """Opens the stored data as a binary file for streaming, or returns None if it is gone."""
+        try:
+            return open(self.path(digest), "rb")
+        except FileNotFoundError:
+            return None
+
+    def sweep(self):
+        """Deletes blobs that have not been written for max_age seconds and are not pinned."""
+        cutoff = time.time() - self.max_age
+        expired = {}
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        expired[name] = path
+                except FileNotFoundError:
+                    pass  # Swept concurrently by another process
+        if not expired:
+            return
+        pinned = self.pinned(set(expired)) if self.pinned else set()
+        removed = 0
+        for name, path in expired.items():
+            if name in pinned:
+                continue
+            try:
+                if os.path.getmtime(path) < cutoff:  # Not re-uploaded since the walk
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        if removed:
+            print(f"Removed {removed} expired analysis blob(s).")
+
+
+class BlobWriter:
+    """Writes one blob in chunks to a temporary file, hashing as it goes."""
+
+    def __init__(self, store: BlobStore):
+        self._store = store
+        self._hash = hashlib.sha256()
+        self._file = tempfile.NamedTemporaryFile(dir=store.directory, suffix=".tmp", delete=False)
+        self.size = 0
+
+    def write(self, chunk: bytes):
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> str:
+        """Finishes the blob and returns its SHA-256 hex digest."""
+        self._file.close()
+        return self._store._commit(self._file.name, self._hash.hexdigest())
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._file.name)
+        except FileNotFoundError:
+            pass
+
+
+def _build_analysis_store() -> AnalysisStore:
+    if settings.ANALYSIS_STORE == "sqlite":
+        return SqliteAnalysisStore(settings.ANALYSIS_SESSION_TTL_SECONDS)
+    if settings.ANALYSIS_STORE != "memory":
+        raise ValueError(f"Unknown ANALYSIS_STORE: {settings.ANALYSIS_STORE!r} (expected 'memory' or 'sqlite')")
+    return MemoryAnalysisStore(settings.ANALYSIS_MEMORY_MAX_BYTES, settings.ANALYSIS_SESSION_TTL_SECONDS)
+
+
+analysis_store = _build_analysis_store()
+# Blobs outlive their sessions by a margin, so a session that was just updated keeps its images.
+# Images of unfinished publish jobs, and rendered variants of images that are kept, are kept
+# however old they are.
+blob_store = BlobStore(
+    settings.ANALYSIS_BLOB_DIR, 2 * settings.ANALYSIS_SESSION_TTL_SECONDS, pinned=database.release_expired_blobs
+)
+
+_sweeper_stop = threading.Event()
+_sweeper: threading.Thread | None = None
+
+
+def start_blob_sweeper():
+    """Sweeps the blob store now, then every SWEEP_INTERVAL seconds on a background thread."""
+    global _sweeper
+    if _sweeper is not None:
+        return
+    _sweeper_stop.clear()
+    blob_store.sweep()
+    _sweeper = threading.Thread(target=_sweeper_loop, name="blob-sweeper", daemon=True)
+    _sweeper.start()
+
+
+def stop_blob_sweeper(timeout: float = 10):
+    """Stops the background sweeper and waits for a sweep in progress to finish."""
+    global _sweeper
+    _sweeper_stop.set()
+    if _sweeper is not None:
+        _sweeper.join(timeout)
+        _sweeper = None
+
+
+def _sweeper_loop():
+    while not _sweeper_stop.wait(BlobStore.SWEEP_INTERVAL):
+        try:
+            blob_store.sweep()
+        except Exception as e:
+            # Never let a locked database or an unreadable directory kill the sweeper.
+            print(f"Blob sweeper error: {e}")
@@ -0,0 +1,16 @@
+import os
+from fastapi.templating import Jinja2Templates
+from app import metrics
+
+
+class _TimedTemplates(Jinja2Templates):
+    """Jinja2Templates that times rendering, which happens when the response is constructed."""
+
+    def TemplateResponse(self, *args, **kwargs):
+        name = kwargs.get("name") or next((arg for arg in args if isinstance(arg, str)), "unknown")
+        with metrics.timed(metrics.template_render_seconds, "template", template=name):
+            return super().TemplateResponse(*args, **kwargs)
+
+
+# Shared template environment for the dashboard and the routers that render HTML fragments.
+templates = _TimedTemplates(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates"))
@@ -0,0 +1,129 @@
+"""
+Streaming ingestion of uploaded images.
+
+Starlette parses a multipart body into spooled files before the handler runs, so
+UploadLimitMiddleware bounds the body while it is received: a Content-Length over the limit
+is refused before anything is read, and a longer body is cut off with 413 as soon as it
+passes the limit. Uploads are then copied in fixed-size chunks from the spooled files into
+the blob store, so an upload never has to fit in memory. The per-image limits and the image
+type check (by magic bytes, not the client's Content-Type) run on the first chunks, so an
+oversized or non-image upload is rejected before the rest of it is copied.
+"""
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from app.config import settings
+from app.state import BlobStore
+
+UPLOAD_CHUNK_BYTES = 256 * 1024
+
+# Room for the multipart boundaries, part headers and form fields on top of IMAGE_MAX_TOTAL_BYTES.
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Leading bytes of the image formats both Gemini and LinkedIn accept.
+_IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+class ImageRejected(ValueError):
+    """Raised when an upload is too large or is not a supported image."""
+
+
+def sniff_image_type(head: bytes) -> str | None:
+    """Returns the MIME type for the leading bytes of an image, or None if it is not a supported image."""
+    for signature, mime_type in _IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def max_body_bytes() -> int:
+    """The largest multipart request body accepted."""
+    return settings.IMAGE_MAX_TOTAL_BYTES + MULTIPART_OVERHEAD_BYTES
+
+
+def _too_large_message() -> str:
+    return f"The upload is larger than {settings.IMAGE_MAX_TOTAL_BYTES // (1024 * 1024)} MiB."
+
+
+class UploadLimitMiddleware:
+    """
+    Rejects multipart request bodies over max_body_bytes() with 413 before Starlette has
+    buffered them. A plain ASGI middleware, so it sees the body as it arrives.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _is_multipart(scope):
+            return await self.app(scope, receive, send)
+
+        limit = max_body_bytes()
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > limit:
+            response = PlainTextResponse(_too_large_message(), status_code=413)
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # FastAPI re-raises HTTPExceptions from body parsing, so this becomes the response.
+                    raise HTTPException(status_code=413, detail=_too_large_message())
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def _is_multipart(scope) -> bool:
+    content_type = dict(scope["headers"]).get(b"content-type", b"")
+    return content_type.lower().startswith(b"multipart/")
+
+
+async def spool_images(uploads: list[UploadFile], blob_store: BlobStore) -> list[dict]:
+    """
+    Streams each upload into the blob store, enforcing IMAGE_MAX_BYTES per image and
+    IMAGE_MAX_TOTAL_BYTES across the images (the raw request body was already bounded by
+    UploadLimitMiddleware). Returns [{"sha256", "mime_type", "size"}] in upload order.
+    """
+    if len(uploads) > settings.IMAGE_MAX_COUNT:
+        raise ImageRejected(f"Upload at most {settings.IMAGE_MAX_COUNT} images at a time.")
+
+    stored = []
+    total_bytes = 0
+    for upload in uploads:
+        writer = await run_in_threadpool(blob_store.open_writer)
+        try:
+            mime_type = None
+            while chunk := await upload.read(UPLOAD_CHUNK_BYTES):
+                if mime_type is None:
+                    mime_type = sniff_image_type(chunk)
+                    if mime_type is None:
+                        raise ImageRejected(f"{upload.filename} is not a PNG, JPEG, GIF or WebP image.")
+                total_bytes += len(chunk)
+                if writer.size + len(chunk) > settings.IMAGE_MAX_BYTES:
+                    raise ImageRejected(f"{upload.filename} is larger than {settings.IMAGE_MAX_BYTES // (1024 * 1024)} MiB.")
+                if total_bytes > settings.IMAGE_MAX_TOTAL_BYTES:
+                    raise ImageRejected(f"The images together are larger than {settings.IMAGE_MAX_TOTAL_BYTES // (1024 * 1024)} MiB.")
+                await run_in_threadpool(writer.write, chunk)
+            if mime_type is None:
+                raise ImageRejected(f"{upload.filename} is empty.")
+            digest = await run_in_threadpool(writer.commit)
+        except BaseException:
+            await run_in_threadpool(writer.abort)
+            raise
+        finally:
+            await upload.close()
+        stored.append({"sha256": digest, "mime_type": mime_type, "size": writer.size})
+    return stored
@@ -0,0 +1,197 @@
+"""
+Local stand-ins for Gemini and LinkedIn, so the app can be load-tested offline.
+
+- FakeGenerativeModel replaces genai.GenerativeModel. It sleeps for a configurable latency,
+  fails a configurable share of calls with 429 ResourceExhausted, and returns JSON that satisfies
+  every response schema in app/ai/schemas.py, padded to a configurable size.
+- FakeLinkedIn is a threaded HTTP server implementing the endpoints app/linkedin_client.py
+  calls, with its own latency and 5xx error rate.
+
+Both are installed with install_fakes() before the app starts serving.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from google.api_core import exceptions as google_exceptions
+
+_WORDS = (
+    "growth team product launch customers insight data strategy leadership hiring remote "
+    "engineering design market lesson feedback culture roadmap scale quality focus"
+).split()
+
+
+@dataclass
+class FakeConfig:
+    """Latency (seconds, mean and jitter), error rate (0-1) and response size (bytes) of a fake service."""
+    latency: float = 0.5
+    jitter: float = 0.2
+    error_rate: float = 0.0
+    payload_bytes: int = 1200
+
+    def sleep_time(self) -> float:
+        return max(0.0, random.gauss(self.latency, self.jitter))
+
+    def should_fail(self) -> bool:
+        return random.random() < self.error_rate
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _fake_payload(size: int) -> str:
+    """A JSON object valid for every prompt type, with a post text of roughly size bytes."""
+    rng = random.Random()
+    post = []
+    while sum(len(s) + 1 for s in post) < size:
+        post.append(_sentence(rng, rng.randint(6, 14)))
+    return json.dumps({
+        "strengths": [_sentence(rng, 3) for _ in range(3)],
+        "tone": "Practical",
+        "niche": "Product engineering",
+        "voice": "First person, direct",
+        "insights": [_sentence(rng, 10) for _ in range(4)],
+        "description": _sentence(rng, 12),
+        "tags": ["office", "team", "chart"],
+        "post": " ".join(post),
+        "hashtags": ["#growth", "#product", "#engineering"],
+    })
+
+
+class _FakeUsage:
+    def __init__(self, total_token_count: int):
+        self.total_token_count = total_token_count
+
+
+class _FakeChunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _FakeResponse:
+    def __init__(self, text: str, chunk_bytes: int = 64):
+        self.text = text
+        self.usage_metadata = _FakeUsage(len(text) // 4)
+        self._chunk_bytes = chunk_bytes
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        for i in range(0, len(self.text), self._chunk_bytes):
+            await asyncio.sleep(0)
+            yield _FakeChunk(self.text[i:i + self._chunk_bytes])
+
+
+class FakeGenerativeModel:
+    """Drop-in for genai.GenerativeModel; behaviour comes from the class-level config."""
+    config = FakeConfig()
+    calls = 0
+    _lock = threading.Lock()
+
+    def __init__(self, model_name: str, **kwargs):
+        self.model_name = model_name
+
+    async def generate_content_async(self, prompt_parts, generation_config=None, stream=False, **kwargs):
+        with FakeGenerativeModel._lock:
+            FakeGenerativeModel.calls += 1
+        await asyncio.sleep(self.config.sleep_time())
+        if self.config.should_fail():
+            raise google_exceptions.ResourceExhausted("Fake quota exceeded")
+        return _FakeResponse(_fake_payload(self.config.payload_bytes))
+
+
+class _LinkedInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self):
+        server = self.server
+        # Drain the body in chunks, as LinkedIn would, without keeping uploaded images around
+        remaining = int(self.headers.get("Content-Length") or 0)
+        while remaining > 0:
+            remaining -= len(self.rfile.read(min(remaining, 256 * 1024)))
+        path = self.path.split("?")[0]
+        time.sleep(server.config.sleep_time())
+        if server.config.should_fail():
+            return self._send(503, {"message": "Fake LinkedIn error"})
+
+        if path == "/v2/userinfo":
+            return self._send(200, {"sub": "bench-user"})
+        if path == "/v2/me":
+            return self._send(200, {"id": "bench-user", "localizedFirstName": "Bench", "localizedLastName": "User"})
+        if path == "/v2/assets":
+            with server.lock:
+                server.asset_count += 1
+                asset = server.asset_count
+            upload_url = f"http://127.0.0.1:{server.server_port}/upload/{asset}"
+            return self._send(200, {"value": {
+                "uploadMechanism": {"com.linkedin.digitalmedia.uploading.MediaUploadHttpRequest": {"uploadUrl": upload_url}},
+                "asset": f"urn:li:digitalmediaAsset:{asset}",
+            }})
+        if path.startswith("/upload/"):
+            return self._send(201, {})
+        if path == "/v2/ugcPosts":
+            with server.lock:
+                server.post_count += 1
+                share = server.post_count
+            return self._send(201, {"id": f"urn:li:share:{share}"})
+        return self._send(404, {"message": "Not found"})
+
+    do_GET = do_POST = do_PUT = _handle
+
+
+class FakeLinkedIn:
+    """A local LinkedIn API on an ephemeral port, served from a background thread."""
+
+    def __init__(self, config: FakeConfig):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _LinkedInHandler)
+        self.server.daemon_threads = True
+        self.server.config = config
+        self.server.lock = threading.Lock()
+        self.server.asset_count = 0
+        self.server.post_count = 0
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-linkedin", daemon=True)
+
+    @property
+    def post_count(self) -> int:
+        return self.server.post_count
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def install_fakes(gemini_config: FakeConfig, linkedin_config: FakeConfig) -> FakeLinkedIn:
+    """Points the app's Gemini and LinkedIn clients at the fakes. Call after importing app.main."""
+    from app import linkedin_client
+    from app.ai import gemini_client
+
+    FakeGenerativeModel.config = gemini_config
+    gemini_client.load_sdk().GenerativeModel = FakeGenerativeModel
+
+    linkedin = FakeLinkedIn(linkedin_config)
+    linkedin.start()
+    linkedin_client.LINKEDIN_UGC_POST_URL = f"{linkedin.url}/v2/ugcPosts"
+    linkedin_client.LINKEDIN_USER_INFO_URL = f"{linkedin.url}/v2/userinfo"
+    linkedin_client.LINKEDIN_PROFILE_URL = f"{linkedin.url}/v2/me"
+    linkedin_client.LINKEDIN_ASSET_UPLOAD_REGISTER_URL = f"{linkedin.url}/v2/assets?action=registerUpload"
+    return linkedin
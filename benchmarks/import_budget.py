@@ -0,0 +1,98 @@
+"""
+Import-time budget for app startup.
+
+Imports app.main in fresh interpreters under `python -X importtime` and fails (exit status 1)
+when the median import time exceeds the budget, or when a module that is meant to load lazily
+(the Gemini SDK, requests-oauthlib, Pillow, cryptography) is imported at startup. Prints the
+slowest modules, so a regression points at its cause. tests/test_import_budget.py runs the same
+checks with a generous ceiling as part of the test suite.
+
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --budget-ms 400 --runs 9 --top 25
+
+Times include the -X importtime overhead and vary with the machine; set the budget from a run
+on the hardware the workers use.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+DEFAULT_BUDGET_MS = 600
+# Modules app startup must not import; they load on first use, in the lifespan warm-up
+# or (Pillow) only in the image worker processes.
+LAZY_MODULES = ("google.generativeai", "requests_oauthlib", "PIL", "cryptography")
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# "import time:       self [us] |  cumulative | imported package", nesting shown by indentation
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="maximum median import time of app.main")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to time; the median is checked")
+    parser.add_argument("--top", type=int, default=15, help="slowest top-level imports to list")
+    parser.add_argument("--module", default="app.main", help="module to import")
+    return parser.parse_args(argv)
+
+
+def measure(module: str, workdir: str) -> dict:
+    """Imports module in a fresh interpreter and returns {imported module: (self us, cumulative us, depth)}."""
+    env = dict(os.environ)
+    env.setdefault("SECRET_KEY", "import-budget")
+    env["DATABASE_URL"] = os.path.join(workdir, "influra_posts.db")
+    env["PYTHONWARNINGS"] = "ignore"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules[name] = (int(self_us), int(cumulative_us), len(indent) // 2)
+    return modules
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="influra-imports-") as workdir:
+        runs = [measure(args.module, workdir) for _ in range(args.runs)]
+
+    totals = [run[args.module][1] / 1000 for run in runs]
+    median_ms = statistics.median(totals)
+    last = runs[-1]
+    # Direct imports of the measured module, i.e. what each of its dependencies costs in total
+    top_level = sorted(
+        ((name, cumulative) for name, (_, cumulative, depth) in last.items() if depth == 1),
+        key=lambda item: item[1], reverse=True,
+    )
+    print(f"{'module':<40} {'cumulative ms':>14}")
+    for name, cumulative in top_level[:args.top]:
+        print(f"{name:<40} {cumulative / 1000:>14.1f}")
+
+    failures = []
+    eager = [name for name in LAZY_MODULES if any(run_name == name for run_name in last)]
+    if eager:
+        failures.append(f"imported at startup but meant to load lazily: {', '.join(eager)}")
+    if median_ms > args.budget_ms:
+        failures.append(f"median import time {median_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+
+    print(f"\n{args.module}: median {median_ms:.0f} ms over {args.runs} runs "
+          f"(min {min(totals):.0f}, max {max(totals):.0f}), budget {args.budget_ms:.0f} ms")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
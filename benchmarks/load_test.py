@@ -0,0 +1,442 @@
+"""
+Offline load test for the app.
+
+Starts the app under uvicorn in this process with Gemini and LinkedIn replaced by the local
+fakes in benchmarks/fakes.py, then drives a weighted mix of dashboard loads, post generation,
+image analysis, LinkedIn shares and exports from client threads at each concurrency level.
+Reports p50/p95/p99 latency, throughput and peak RSS per level and writes them as JSON, so runs
+can be compared with --baseline.
+
+    python -m benchmarks.load_test --concurrency 1,8,32 --duration 30
+    python -m benchmarks.load_test --baseline benchmarks/results/before.json
+
+The app runs against a throwaway database and blob directory. Settings can be overridden
+through the usual environment variables; Gemini's RPM/TPM budgets default to off here so the
+fakes' own latency and error rate are what shape the load.
+"""
+import argparse
+import base64
+import io
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import secrets
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+DEFAULT_MIX = "dashboard=40,generate=20,image=10,share=10,export=20"
+OPERATIONS = ("dashboard", "generate", "image", "share", "export")
+EXPORT_FORMATS = ("md", "csv", "jsonl")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated client thread counts, one stage each")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per stage")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--seed-posts", type=int, default=2000, help="saved posts created before the run")
+    parser.add_argument("--image-bytes", type=int, default=2 * 1024 * 1024, help="approximate size of each uploaded image")
+    parser.add_argument("--image-pool", type=int, default=8, help="distinct images uploaded (repeats hit the variant and response caches)")
+    parser.add_argument("--gemini-latency", type=float, default=0.8, help="mean fake model latency in seconds")
+    parser.add_argument("--gemini-jitter", type=float, default=0.3)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0, help="share of model calls failing with 429")
+    parser.add_argument("--gemini-payload-bytes", type=int, default=1200, help="size of the generated post text")
+    parser.add_argument("--linkedin-latency", type=float, default=0.15, help="mean fake LinkedIn latency in seconds")
+    parser.add_argument("--linkedin-jitter", type=float, default=0.05)
+    parser.add_argument("--linkedin-error-rate", type=float, default=0.0, help="share of LinkedIn calls failing with 503")
+    parser.add_argument("--drain-timeout", type=float, default=60, help="seconds to wait for queued shares to publish")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the request mix")
+    args = parser.parse_args(argv)
+    args.concurrency = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    args.mix = _parse_mix(args.mix)
+    return args
+
+
+def _parse_mix(raw: str) -> dict:
+    mix = {}
+    for item in raw.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise SystemExit(f"Unknown operation in --mix: {name!r} (expected one of {', '.join(OPERATIONS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def configure_environment(workdir: str):
+    """Points the app at a throwaway database before app.config is imported."""
+    os.environ.setdefault("SECRET_KEY", secrets.token_urlsafe(32))
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    os.environ["DATABASE_URL"] = os.path.join(workdir, "bench.db")
+    os.environ["ANALYSIS_BLOB_DIR"] = os.path.join(workdir, "blobs")
+    os.environ.setdefault("GEMINI_CACHE_DB", "")
+    os.environ.setdefault("GEMINI_RPM", "0")
+    os.environ.setdefault("GEMINI_TPM", "0")
+    os.environ.setdefault("PUBLISH_RETRY_BASE_SECONDS", "0.5")
+    os.environ.setdefault("PUBLISH_POLL_SECONDS", "0.5")
+
+
+# --- Percentiles and memory -------------------------------------------------------------------
+
+def percentile(sorted_values: list, p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: list, errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "max": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        },
+    }
+
+
+def _rss_bytes(pid) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class MemorySampler:
+    """Samples the RSS of this process and of the image worker processes, keeping the peaks."""
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_worker_rss = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        rss = _rss_bytes("self")
+        if not rss:  # No /proc (e.g. macOS): fall back to the kernel's high-water mark
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        workers = sum(_rss_bytes(child.pid) for child in multiprocessing.active_children())
+        self.peak_rss = max(self.peak_rss, rss)
+        self.peak_worker_rss = max(self.peak_worker_rss, workers)
+
+    def reset(self):
+        self.peak_rss = self.peak_worker_rss = 0
+        self.sample()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+# --- Server ---------------------------------------------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(app):
+    """Runs the app under uvicorn on a background thread; returns (server, thread, base_url)."""
+    import uvicorn
+    port = _free_port()
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, name="uvicorn", daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 30
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise SystemExit("The app failed to start.")
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+def session_cookie(data: dict, secret_key: str) -> str:
+    """Signs session data the way Starlette's SessionMiddleware does, to start clients logged in."""
+    import itsdangerous
+    payload = base64.b64encode(json.dumps(data).encode())
+    return itsdangerous.TimestampSigner(secret_key).sign(payload).decode()
+
+
+# --- Workload -------------------------------------------------------------------------------------
+
+def make_images(count: int, approx_bytes: int) -> list[bytes]:
+    """Noisy JPEGs (the worst case for re-encoding) of roughly approx_bytes each."""
+    from PIL import Image
+    side = max(64, int(math.sqrt(approx_bytes / 1.5)))
+    images = []
+    for _ in range(count):
+        image = Image.frombytes("RGB", (side, side), os.urandom(side * side * 3))
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+def random_text(rng: random.Random, words: int) -> str:
+    vocabulary = ("launch", "hiring", "roadmap", "customers", "pricing", "remote", "growth", "metrics",
+                  "feedback", "design", "founders", "quarter", "retention", "onboarding", "culture")
+    return " ".join(rng.choice(vocabulary) for _ in range(words))
+
+
+class VirtualUser:
+    """One browser session: a cookie jar with a LinkedIn login and an analyzed profile and trend."""
+
+    def __init__(self, index: int, base_url: str, secret_key: str, images: list, rng: random.Random):
+        import requests
+        self.index = index
+        self.base_url = base_url
+        self.images = images
+        self.rng = rng
+        self.http = requests.Session()
+        cookie = session_cookie({"linkedin_token": {"access_token": f"bench-token-{index}"}}, secret_key)
+        self.http.cookies.set("session", cookie, domain="127.0.0.1", path="/")
+        self.job_ids = []
+
+    def setup(self):
+        self._post("/profile/analyze", data={"text": f"Profile {self.index}: " + random_text(self.rng, 120)})
+        self._post("/trends/analyze", data={"text": random_text(self.rng, 400)})
+
+    def _post(self, path: str, **kwargs):
+        return self.http.post(self.base_url + path, allow_redirects=False, timeout=120, **kwargs)
+
+    def run(self, operation: str) -> bool:
+        """Performs one operation; returns whether it succeeded."""
+        if operation == "dashboard":
+            response = self.http.get(self.base_url + "/", timeout=120)
+        elif operation == "generate":
+            response = self._post("/post/generate", data={"manual_context": random_text(self.rng, 12)})
+        elif operation == "image":
+            image = self.rng.choice(self.images)
+            response = self._post("/image/analyze", files=[("images", ("photo.jpg", image, "image/jpeg"))])
+        elif operation == "share":
+            response = self._post(f"/posts/{self.share_post_id}/share")
+            location = response.headers.get("location", "")
+            if "linkedin_queued=" in location:
+                self.job_ids.append(int(location.split("linkedin_queued=")[1].split("&")[0]))
+        else:
+            export_format = self.rng.choice(EXPORT_FORMATS)
+            params = {"gzip": "true"} if self.rng.random() < 0.5 else {}
+            response = self.http.get(f"{self.base_url}/export/{export_format}", params=params, stream=True, timeout=120)
+            for _ in response.iter_content(64 * 1024):
+                pass
+        return response.status_code < 400
+
+    def prepare(self, operation: str):
+        """Untimed setup for an operation: every share needs a fresh saved post."""
+        if operation == "share":
+            from app.db import database
+            self.share_post_id = database.insert_post(random_text(self.rng, 60), "#bench")
+
+
+def run_stage(users: list, concurrency: int, duration: float, mix: dict, seed: int) -> dict:
+    """Runs the mix from `concurrency` client threads for `duration` seconds."""
+    operations, weights = zip(*mix.items())
+    results = {op: {"latencies": [], "errors": 0} for op in operations}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(user: VirtualUser):
+        rng = random.Random(seed * 1000 + user.index)
+        while time.monotonic() < deadline:
+            operation = rng.choices(operations, weights)[0]
+            user.prepare(operation)
+            started = time.perf_counter()
+            try:
+                ok = user.run(operation)
+            except Exception as e:
+                print(f"{operation} failed: {e}")
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                results[operation]["latencies"].append(elapsed)
+                results[operation]["errors"] += 0 if ok else 1
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=client, args=(user,), daemon=True) for user in users[:concurrency]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    all_latencies = [latency for r in results.values() for latency in r["latencies"]]
+    stage = summarize(all_latencies, sum(r["errors"] for r in results.values()), elapsed)
+    stage["concurrency"] = concurrency
+    stage["duration_s"] = round(elapsed, 2)
+    stage["operations"] = {op: summarize(r["latencies"], r["errors"], elapsed) for op, r in results.items()}
+    return stage
+
+
+def wait_for_publish_jobs(job_ids: list, timeout: float) -> dict:
+    """Waits for queued shares to finish; returns the count of jobs per final status."""
+    from app.db import database
+    deadline = time.monotonic() + timeout
+    while True:
+        statuses = {}
+        for job_id in job_ids:
+            job = database.get_publish_job(job_id)
+            status = job["status"] if job else "missing"
+            statuses[status] = statuses.get(status, 0) + 1
+        if set(statuses) <= {"posted", "failed", "missing"} or time.monotonic() > deadline:
+            return statuses
+        time.sleep(0.5)
+
+
+# --- Reporting ------------------------------------------------------------------------------------
+
+def print_stage(stage: dict):
+    print(f"\nconcurrency {stage['concurrency']}: {stage['requests']} requests in {stage['duration_s']}s, "
+          f"{stage['throughput_rps']} req/s, {stage['errors']} errors, peak RSS {stage['peak_rss_mib']} MiB "
+          f"(+{stage['peak_worker_rss_mib']} MiB image workers)")
+    print(f"  {'operation':<10} {'n':>6} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}")
+    for name, op in [("all", stage)] + sorted(stage["operations"].items()):
+        latency = op["latency_ms"]
+        print(f"  {name:<10} {op['requests']:>6} {op['errors']:>5} {latency['p50']:>9} {latency['p95']:>9} "
+              f"{latency['p99']:>9} {op['throughput_rps']:>8}")
+
+
+def _change(new: float, old: float) -> str:
+    return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+
+def print_comparison(results: dict, baseline: dict):
+    """Prints p95 latency and throughput changes against a baseline run, per stage and operation."""
+    print(f"\nCompared with {baseline.get('started_at')} ({baseline.get('git_commit') or 'unknown commit'}):")
+    previous = {stage["concurrency"]: stage for stage in baseline.get("stages", [])}
+    for stage in results["stages"]:
+        old_stage = previous.get(stage["concurrency"])
+        if old_stage is None:
+            continue
+        print(f"  concurrency {stage['concurrency']}: throughput {_change(stage['throughput_rps'], old_stage['throughput_rps'])}, "
+              f"p95 {_change(stage['latency_ms']['p95'], old_stage['latency_ms']['p95'])}, "
+              f"peak RSS {_change(stage['peak_rss_mib'], old_stage['peak_rss_mib'])}")
+        for name, op in sorted(stage["operations"].items()):
+            old_op = old_stage["operations"].get(name)
+            if old_op:
+                print(f"    {name:<10} p95 {_change(op['latency_ms']['p95'], old_op['latency_ms']['p95']):>8}  "
+                      f"p99 {_change(op['latency_ms']['p99'], old_op['latency_ms']['p99']):>8}  "
+                      f"req/s {_change(op['throughput_rps'], old_op['throughput_rps']):>8}")
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="influra-bench-")
+    configure_environment(workdir)
+
+    from app.main import app
+    from app.config import settings
+    from app.ai import gemini_client
+    from app.ai.rate_limiter import gemini_limiter
+    from app.db import database
+    from benchmarks.fakes import FakeConfig, FakeGenerativeModel, install_fakes
+
+    gemini_config = FakeConfig(args.gemini_latency, args.gemini_jitter, args.gemini_error_rate, args.gemini_payload_bytes)
+    linkedin_config = FakeConfig(args.linkedin_latency, args.linkedin_jitter, args.linkedin_error_rate)
+    linkedin = install_fakes(gemini_config, linkedin_config)
+    server, server_thread, base_url = start_server(app)
+    sampler = MemorySampler()
+    sampler.start()
+
+    results = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "stages": [],
+    }
+    try:
+        rng = random.Random(args.seed)
+        print(f"Seeding {args.seed_posts} posts and {args.image_pool} images in {workdir} ...")
+        for _ in range(args.seed_posts):
+            database.insert_post(random_text(rng, rng.randint(40, 120)), "#bench #seed", rng.choice(("draft", "draft", "posted")))
+        images = make_images(args.image_pool, args.image_bytes)
+
+        users = []
+        for concurrency in args.concurrency:
+            while len(users) < concurrency:
+                user = VirtualUser(len(users), base_url, settings.SECRET_KEY, images, random.Random(args.seed + len(users)))
+                user.setup()
+                users.append(user)
+            sampler.reset()
+            print(f"Running {concurrency} clients for {args.duration}s ...")
+            stage = run_stage(users, concurrency, args.duration, args.mix, args.seed)
+            sampler.sample()
+            stage["peak_rss_mib"] = round(sampler.peak_rss / 2 ** 20, 1)
+            stage["peak_worker_rss_mib"] = round(sampler.peak_worker_rss / 2 ** 20, 1)
+            results["stages"].append(stage)
+            print_stage(stage)
+
+        job_ids = [job_id for user in users for job_id in user.job_ids]
+        results["publish_jobs"] = wait_for_publish_jobs(job_ids, args.drain_timeout)
+        results["gemini"] = {
+            "model_calls": FakeGenerativeModel.calls,
+            "parse": dict(gemini_client.parse_stats),
+            "limiter": {**gemini_limiter.stats, "concurrency_limit": round(gemini_limiter.limit, 2)},
+        }
+        results["linkedin_posts"] = linkedin.post_count
+    finally:
+        server.should_exit = True
+        server_thread.join(timeout=30)
+        sampler.stop()
+        linkedin.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\nPublish jobs: {results['publish_jobs']}; Gemini: {results['gemini']}")
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            print_comparison(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
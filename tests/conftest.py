@@ -0,0 +1,14 @@
+"""
+Shared test setup. Settings are read from the environment when app.config is imported, so the
+app is pointed at a throwaway database and blob directory before any test imports it. The tests
+need no network access or API keys.
+"""
+import os
+import tempfile
+
+_workdir = tempfile.mkdtemp(prefix="influra-tests-")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ["DATABASE_URL"] = os.path.join(_workdir, "influra_posts.db")
+os.environ["ANALYSIS_BLOB_DIR"] = os.path.join(_workdir, "blobs")
+os.environ["GEMINI_CACHE_DB"] = ""
+os.environ["GEMINI_API_KEY"] = ""
@@ -0,0 +1,88 @@
+import os
+import time
+import pytest
+from app.db import database
+from app.state import BlobStore
+
+
+@pytest.fixture()
+def store(tmp_path):
+    database.init_db()
+    conn = database.get_conn()
+    for table in ("publish_job_images", "publish_jobs", "posts", "image_variants"):
+        conn.execute(f"DELETE FROM {table}")
+    return BlobStore(str(tmp_path / "blobs"), max_age=3600, pinned=database.release_expired_blobs)
+
+
+def _age(store, digest, seconds=7200):
+    old = time.time() - seconds
+    os.utime(store.path(digest), (old, old))
+
+
+def _pin_for_job(digest):
+    post_id = database.insert_post("A post with an image", "#images")
+    return database.enqueue_publish_job(post_id, "token", [{"sha256": digest, "mime_type": "image/png"}])
+
+
+def test_sweep_removes_only_expired_blobs(store):
+    old, fresh = store.put(b"old"), store.put(b"fresh")
+    _age(store, old)
+    store.sweep()
+    assert not store.exists(old)
+    assert store.exists(fresh)
+
+
+def test_rewriting_a_blob_restarts_its_expiry(store):
+    digest = store.put(b"again")
+    _age(store, digest)
+    store.put(b"again")
+    store.sweep()
+    assert store.exists(digest)
+
+
+def test_sweep_keeps_images_of_unfinished_publish_jobs(store):
+    digest = store.put(b"queued image")
+    _age(store, digest)
+    _pin_for_job(digest)
+    store.sweep()
+    assert store.exists(digest)
+
+
+def test_sweep_keeps_variants_of_kept_sources(store):
+    source, variant = store.put(b"source"), store.put(b"variant")
+    database.store_image_variant(source, "analysis", variant, "image/jpeg")
+    _age(store, variant)
+    store.sweep()
+    assert store.exists(variant)
+    assert database.get_image_variant(source, "analysis") == {"sha256": variant, "mime_type": "image/jpeg"}
+
+
+def test_sweep_drops_variants_with_their_expired_source(store):
+    source, variant = store.put(b"source"), store.put(b"variant")
+    database.store_image_variant(source, "analysis", variant, "image/jpeg")
+    _age(store, source)
+    _age(store, variant)
+    store.sweep()
+    assert not store.exists(source)
+    assert not store.exists(variant)
+    assert database.get_image_variant(source, "analysis") is None
+
+
+def test_sweep_drops_a_variant_that_is_its_own_source(store):
+    # An image already within a variant's limits is its own variant
+    source = store.put(b"small image")
+    database.store_image_variant(source, "linkedin", source, "image/png")
+    _age(store, source)
+    store.sweep()
+    assert not store.exists(source)
+    assert database.get_image_variant(source, "linkedin") is None
+
+
+def test_sweep_keeps_variant_rows_of_job_images(store):
+    source, variant = store.put(b"source"), store.put(b"variant")
+    database.store_image_variant(source, "linkedin", variant, "image/jpeg")
+    _pin_for_job(source)
+    _age(store, source)
+    store.sweep()
+    assert store.exists(source)
+    assert database.get_image_variant(source, "linkedin") is not None
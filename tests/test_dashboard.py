@@ -0,0 +1,52 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.dashboard_cache import dashboard_cache
+from app.db import database
+from app.main import app
+
+
+@pytest.fixture()
+def client():
+    database.init_db()
+    return TestClient(app)
+
+
+def test_dashboard_answers_304_while_nothing_changed(client):
+    first = client.get("/")
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    again = client.get("/", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == first.headers["ETag"]
+    assert again.content == b""
+
+
+def test_dashboard_etag_changes_when_posts_change(client):
+    etag = client.get("/").headers["ETag"]
+    database.insert_post("A brand new draft about onboarding", "#onboarding")
+    response = client.get("/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert "A brand new draft about onboarding" in response.text
+
+
+def test_dashboard_etag_depends_on_the_status_filter(client):
+    assert client.get("/").headers["ETag"] != client.get("/", params={"status": "posted"}).headers["ETag"]
+
+
+def test_weak_and_listed_etags_match():
+    validators = {"ETag": '"abc"', "Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT"}
+    assert dashboard_cache.is_not_modified({"if-none-match": 'W/"abc"'}, validators)
+    assert dashboard_cache.is_not_modified({"if-none-match": '"xyz", "abc"'}, validators)
+    assert dashboard_cache.is_not_modified({"if-none-match": "*"}, validators)
+    assert not dashboard_cache.is_not_modified({"if-none-match": '"xyz"'}, validators)
+
+
+def test_if_modified_since_is_only_used_without_if_none_match():
+    validators = {"ETag": '"abc"', "Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT"}
+    later = "Thu, 02 Jan 2025 00:00:00 GMT"
+    assert dashboard_cache.is_not_modified({"if-modified-since": later}, validators)
+    assert not dashboard_cache.is_not_modified({"if-modified-since": "Tue, 31 Dec 2024 00:00:00 GMT"}, validators)
+    assert not dashboard_cache.is_not_modified({"if-modified-since": "not a date"}, validators)
+    assert not dashboard_cache.is_not_modified({"if-none-match": '"xyz"', "if-modified-since": later}, validators)
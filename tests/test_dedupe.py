@@ -0,0 +1,92 @@
+import sqlite3
+from app import dedupe
+from app.config import settings
+from app.db import database
+
+POST = (
+    "Three lessons from scaling our support team: hire for curiosity, write everything down, "
+    "and measure what customers actually feel rather than what is easy to count."
+)
+EDITED = POST.replace("write everything down", "write most things down")
+OTHER = "Our quarterly offsite is in Lisbon this year, and the agenda is mostly hiking and good food."
+
+
+def test_signature_is_deterministic_and_fixed_size():
+    signature = dedupe.minhash_signature(POST)
+    assert len(signature) == dedupe.NUM_PERMUTATIONS
+    assert signature == dedupe.minhash_signature(POST)
+
+
+def test_signature_ignores_case_and_punctuation():
+    assert dedupe.minhash_signature(POST) == dedupe.minhash_signature(POST.upper().replace(",", ""))
+
+
+def test_signature_round_trips_through_bytes():
+    signature = dedupe.minhash_signature(POST)
+    assert dedupe.signature_from_bytes(dedupe.signature_to_bytes(signature)) == signature
+
+
+def test_similarity_estimates():
+    signature = dedupe.minhash_signature(POST)
+    assert dedupe.estimated_similarity(signature, signature) == 1.0
+    assert dedupe.estimated_similarity(signature, dedupe.minhash_signature(EDITED)) > 0.6
+    assert dedupe.estimated_similarity(signature, dedupe.minhash_signature(OTHER)) < 0.2
+
+
+def test_short_texts_get_a_signature():
+    assert len(dedupe.minhash_signature("hi")) == dedupe.NUM_PERMUTATIONS
+
+
+def test_index_finds_near_duplicates_most_similar_first():
+    index = dedupe.LSHIndex()
+    index.add(1, dedupe.minhash_signature(EDITED))
+    index.add(2, dedupe.minhash_signature(OTHER))
+    index.add(3, dedupe.minhash_signature(POST))
+
+    matches = index.find_similar(dedupe.minhash_signature(POST), threshold=0.6)
+    assert [post_id for post_id, _ in matches] == [3, 1]
+    assert matches[0][1] == 1.0
+
+
+def test_index_excludes_the_post_itself():
+    index = dedupe.LSHIndex()
+    signature = dedupe.minhash_signature(POST)
+    index.add(1, signature)
+    assert index.find_similar(signature, threshold=0.6, exclude_id=1) == []
+
+
+def test_index_remove_and_readd():
+    index = dedupe.LSHIndex()
+    signature = dedupe.minhash_signature(POST)
+    index.add(1, signature)
+    index.add(1, dedupe.minhash_signature(OTHER))  # Re-adding replaces the old signature
+    assert len(index) == 1
+    assert index.find_similar(signature, threshold=0.6) == []
+
+    index.remove(1)
+    assert len(index) == 0
+    assert all(not buckets for buckets in index._buckets)
+
+
+def test_sync_picks_up_posts_saved_and_deleted_by_another_worker():
+    database.init_db()
+    database.load_dedupe_index()
+    signature = dedupe.minhash_signature(POST)
+
+    # Another worker process writes through its own connection
+    other_worker = sqlite3.connect(settings.DATABASE_URL, isolation_level=None)
+    try:
+        post_id = other_worker.execute(
+            "INSERT INTO posts (content, hashtags, minhash) VALUES (?, '', ?)",
+            (POST, dedupe.signature_to_bytes(signature))
+        ).lastrowid
+        assert all(match_id != post_id for match_id, _ in dedupe.index.find_similar(signature, 0.6))
+
+        database.sync_dedupe_index()
+        assert (post_id, 1.0) in dedupe.index.find_similar(signature, 0.6)
+
+        other_worker.execute("DELETE FROM posts WHERE id = ?", (post_id,))
+        database.sync_dedupe_index()
+        assert all(match_id != post_id for match_id, _ in dedupe.index.find_similar(signature, 0.6))
+    finally:
+        other_worker.close()
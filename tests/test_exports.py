@@ -0,0 +1,48 @@
+import csv
+import gzip
+import io
+import json
+from app import exports
+
+POSTS = [
+    {"id": 2, "content": "Second, with \"quotes\"\nand a newline", "hashtags": "#b", "status": "draft",
+     "created_at": "2025-02-01 10:00:00", "posted_at": None, "signature": b"internal"},
+    {"id": 1, "content": "First", "hashtags": "#a", "status": "posted",
+     "created_at": "2025-01-01 10:00:00", "posted_at": "2025-01-02 10:00:00", "signature": b"internal"},
+]
+COLUMNS = ("id", "content", "status")
+
+
+def export(export_format, compress=False):
+    return b"".join(exports.export_stream(export_format, iter(POSTS), COLUMNS, gzip=compress))
+
+
+def test_csv_export_has_a_header_and_only_the_given_columns():
+    rows = list(csv.reader(io.StringIO(export("csv").decode("utf-8"))))
+    assert rows[0] == list(COLUMNS)
+    assert rows[1] == ["2", POSTS[0]["content"], "draft"]
+    assert len(rows) == 3
+
+
+def test_jsonl_export_has_only_the_given_columns():
+    lines = export("jsonl").decode("utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"id": 2, "content": POSTS[0]["content"], "status": "draft"},
+        {"id": 1, "content": "First", "status": "posted"},
+    ]
+
+
+def test_markdown_export_lists_every_post():
+    text = export("md").decode("utf-8")
+    assert text.startswith("# LinkedIn Drafts")
+    assert "## Draft (ID: 2, Status: draft)" in text
+    assert "**Hashtags:** #a" in text
+
+
+def test_gzip_export_decompresses_to_the_plain_export():
+    assert gzip.decompress(export("jsonl", compress=True)) == export("jsonl")
+
+
+def test_first_piece_is_sent_at_once_then_chunks_are_batched():
+    chunks = list(exports.encode_chunks(["header\n"] + ["x" * 10] * 5, chunk_size=25))
+    assert chunks == [b"header\n", b"x" * 30, b"x" * 20]
@@ -0,0 +1,110 @@
+import asyncio
+from app import metrics
+from app.ai import gemini_client, schemas
+from app.ai.gemini_client import _parse_json, extract_partial_json_string, parse_json_response
+
+
+def test_parse_json_direct():
+    assert _parse_json('{"post": "Hi", "hashtags": []}') == ({"post": "Hi", "hashtags": []}, "direct")
+
+
+def test_parse_json_from_fence():
+    text = 'Here you go:\n```json\n{"insights": ["a", "b"]}\n```\nAnything else?'
+    assert _parse_json(text) == ({"insights": ["a", "b"]}, "tolerant")
+
+
+def test_parse_json_from_surrounding_prose_with_trailing_commas():
+    text = 'Sure! {"tags": ["x", "y",], "description": "d",} Hope this helps.'
+    assert _parse_json(text) == ({"tags": ["x", "y"], "description": "d"}, "tolerant")
+
+
+def test_parse_json_bare_array():
+    assert _parse_json('Result: ["one", "two"]') == (["one", "two"], "tolerant")
+
+
+def test_parse_json_failure():
+    assert _parse_json("no json here") == (None, None)
+    assert _parse_json('{"unterminated": ') == (None, None)
+
+
+def test_parse_json_response_wraps_failures():
+    assert parse_json_response("nope") == {"error": "AI response not valid JSON", "raw_response": "nope"}
+
+
+def test_partial_string_before_the_field_starts():
+    assert extract_partial_json_string('{"hashtags": ["a"], "po', "post") is None
+
+
+def test_partial_string_while_streaming():
+    assert extract_partial_json_string('{"post": "Big news: we', "post") == "Big news: we"
+
+
+def test_partial_string_complete_field():
+    assert extract_partial_json_string('{"post": "Done.", "hashtags": []}', "post") == "Done."
+
+
+def test_partial_string_decodes_escapes():
+    text = r'{"post": "Line one\nSaid \"hi\" été \\ end"'
+    assert extract_partial_json_string(text, "post") == 'Line one\nSaid "hi" été \\ end'
+
+
+def test_partial_string_stops_before_an_incomplete_escape():
+    assert extract_partial_json_string('{"post": "caf\\u00', "post") == "caf"
+    assert extract_partial_json_string('{"post": "end\\', "post") == "end"
+
+
+def test_validate_accepts_matching_response():
+    response = {"post": "Hello", "hashtags": ["#a", "#b"]}
+    assert schemas.validate(response, schemas.get_schema("post")) is None
+
+
+def test_validate_reports_missing_field():
+    assert schemas.validate({"post": "Hello"}, schemas.get_schema("post")) == "$.hashtags is missing"
+
+
+def test_validate_reports_wrong_item_type_with_path():
+    problem = schemas.validate({"post": "Hello", "hashtags": ["#a", 3]}, schemas.get_schema("post"))
+    assert problem == "$.hashtags[1] should be string, got int"
+
+
+def test_validate_rejects_wrong_top_level_type():
+    assert schemas.validate(["insight"], schemas.get_schema("trends")) == "$ should be object, got list"
+
+
+def test_validate_does_not_treat_booleans_as_numbers():
+    assert schemas.validate(True, {"type": "INTEGER"}) == "$ should be integer, got bool"
+    assert schemas.validate(True, {"type": "BOOLEAN"}) is None
+
+
+def test_every_prompt_type_has_a_schema():
+    for prompt_type in ("profile", "trends", "image", "post"):
+        assert schemas.get_schema(prompt_type)["type"] == "OBJECT"
+    assert schemas.get_schema("unknown") is None
+
+
+def test_coalesced_callers_each_time_their_own_wait(monkeypatch):
+    seen_in_shared_call = []
+
+    async def fake_generate_text(prompt_parts, generation_config, priority):
+        seen_in_shared_call.append(metrics._request_timings.get())
+        await asyncio.sleep(0.05)
+        return '{"post": "Hi", "hashtags": []}'
+
+    monkeypatch.setattr(gemini_client, "_generate_text_async", fake_generate_text)
+    gemini_client.response_cache.memory.clear()
+
+    async def caller(timings):
+        metrics._request_timings.set(timings)
+        return await gemini_client.call_gemini_json_async(["coalesced prompt"], prompt_type="post")
+
+    async def scenario():
+        first, second = {}, {}
+        results = await asyncio.gather(caller(first), caller(second))
+        return results, first, second
+
+    results, first, second = asyncio.run(scenario())
+    assert results[0] == results[1] == {"post": "Hi", "hashtags": []}
+    assert seen_in_shared_call == [None]  # one model call, outside either request's context
+    for timings in (first, second):
+        seconds, calls = timings["gemini"]
+        assert calls == 1 and seconds >= 0.04
@@ -0,0 +1,21 @@
+"""
+Keeps app startup lean: importing app.main in a fresh interpreter must not load the modules
+meant to load lazily, and must stay under a ceiling generous enough for slow CI machines.
+benchmarks/import_budget.py reports the same measurement in detail, with a tighter budget.
+"""
+import tempfile
+from benchmarks.import_budget import LAZY_MODULES, measure
+
+# Well above the ~0.5 s app.main takes today; a breach means a heavy import crept back in.
+IMPORT_CEILING_MS = 3000
+
+
+def test_app_startup_imports():
+    with tempfile.TemporaryDirectory(prefix="influra-imports-") as workdir:
+        modules = measure("app.main", workdir)
+
+    eager = [name for name in LAZY_MODULES if name in modules]
+    assert eager == [], f"imported at startup but meant to load lazily: {eager}"
+
+    total_ms = modules["app.main"][1] / 1000
+    assert total_ms < IMPORT_CEILING_MS, f"importing app.main took {total_ms:.0f} ms"
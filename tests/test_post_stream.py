@@ -0,0 +1,53 @@
+import json
+from fastapi.testclient import TestClient
+from app.ai import gemini_client
+from app.main import app
+from app.state import analysis_store
+
+
+def _events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_endpoint_only_accepts_post():
+    client = TestClient(app)
+    assert client.get("/post/generate/stream", params={"manual_context": "x"}).status_code == 405
+
+
+def test_stream_without_analysis_sends_one_error_event():
+    client = TestClient(app)
+    response = client.post("/post/generate/stream")
+    assert response.headers["content-type"].startswith("text/event-stream")
+    [(event, data)] = _events(response.text)
+    assert event == "error"
+    assert "analyze a profile" in data["error"]
+
+
+def test_stream_relays_post_text_and_stores_the_final_post(monkeypatch):
+    prompts_seen, stored = [], []
+
+    async def fake_stream(prompt_parts, prompt_type=None):
+        prompts_seen.append(prompt_parts[0])
+        for piece in ('{"post": "Hel', 'lo wor', 'ld", "hashtags": ["#a"]}'):
+            yield piece
+
+    async def fake_load(session_id):
+        return {"profile_summary": {"summary": "Data coach"}, "trend_insights": {"insights": ["AI"]}, "image_analysis": None}
+
+    async def fake_update(session_id, **fields):
+        stored.append(fields)
+
+    monkeypatch.setattr(gemini_client, "stream_gemini_text_async", fake_stream)
+    monkeypatch.setattr(analysis_store, "aload", fake_load)
+    monkeypatch.setattr(analysis_store, "aupdate", fake_update)
+
+    response = TestClient(app).post("/post/generate/stream", data={"manual_context": "Launch on Friday"})
+    events = _events(response.text)
+    assert "".join(data["text"] for event, data in events if event == "delta") == "Hello world"
+    assert events[-1] == ("done", {"post": "Hello world", "hashtags": ["#a"]})
+    assert stored == [{"generated_post": {"post": "Hello world", "hashtags": ["#a"]}}]
+    assert "Launch on Friday" in prompts_seen[0]
@@ -0,0 +1,201 @@
+import pytest
+import requests
+from app import linkedin_client, publish_queue
+from app.config import settings
+from app.db import database
+from app.state import blob_store
+
+
+@pytest.fixture()
+def db():
+    database.init_db()
+    conn = database.get_conn()
+    for table in ("publish_job_images", "publish_jobs", "posts"):
+        conn.execute(f"DELETE FROM {table}")
+    return database
+
+
+@pytest.fixture()
+def linkedin(monkeypatch):
+    """Records LinkedIn calls; tests set upload_results / share_result to script the responses."""
+    fake = type("FakeLinkedIn", (), {})()
+    fake.uploads = []
+    fake.shares = []
+    fake.upload_results = None
+    fake.share_result = {"id": "urn:li:share:1"}
+
+    def upload_images(access_token, images, person_urn=None):
+        fake.uploads.append((access_token, [(f.read(), mime_type, sha256) for f, mime_type, sha256 in images]))
+        return fake.upload_results or [{"asset_urn": f"urn:li:asset:{i}"} for i in range(len(images))]
+
+    def post_update(access_token, content, image_urns=None, person_urn=None):
+        fake.shares.append((access_token, content, image_urns))
+        if isinstance(fake.share_result, Exception):
+            raise fake.share_result
+        return fake.share_result
+
+    monkeypatch.setattr(linkedin_client, "get_person_urn", lambda access_token: "urn:li:person:me")
+    monkeypatch.setattr(linkedin_client, "upload_images_to_linkedin", upload_images)
+    monkeypatch.setattr(linkedin_client, "post_linkedin_update", post_update)
+    # Render nothing: the LinkedIn variant of a test image is the image itself
+    monkeypatch.setattr(publish_queue.image_pipeline, "prepare_variants_blocking", lambda images, variant: images)
+    return fake
+
+
+def _queue(db, images=()):
+    post_id = db.insert_post("Launching our new course on data storytelling", "#data")
+    job_id = publish_queue.enqueue_share(post_id, "access-token", list(images))
+    return post_id, job_id
+
+
+def _run_next_job():
+    job = database.claim_publish_job()
+    assert job is not None
+    publish_queue._process_job(job)
+    return database.get_publish_job(job["id"])
+
+
+def _make_due(job_id):
+    database.get_conn().execute("UPDATE publish_jobs SET run_after = CURRENT_TIMESTAMP WHERE id = ?", (job_id,))
+
+
+def test_enqueue_marks_post_queued_and_encrypts_the_token(db):
+    post_id, job_id = _queue(db)
+    assert db.get_post(post_id)["status"] == "queued"
+    assert db.get_publish_job(job_id)["status"] == "queued"
+    stored = db.get_conn().execute("SELECT access_token FROM publish_jobs WHERE id = ?", (job_id,)).fetchone()[0]
+    assert "access-token" not in stored
+
+
+def test_a_post_cannot_be_queued_twice(db):
+    post_id, job_id = _queue(db)
+    assert job_id is not None
+    assert publish_queue.enqueue_share(post_id, "access-token", []) is None
+    assert publish_queue.enqueue_share(10**9, "access-token", []) is None  # Missing post
+
+
+def test_claim_takes_each_due_job_once(db):
+    _, first = _queue(db)
+    _, second = _queue(db)
+    claimed = [db.claim_publish_job(), db.claim_publish_job()]
+    assert [job["id"] for job in claimed] == [first, second]
+    assert all(job["status"] == "publishing" and job["attempts"] == 1 for job in claimed)
+    assert db.claim_publish_job() is None
+
+
+def test_successful_job_uploads_images_and_shares(db, linkedin):
+    digest = blob_store.put(b"fake image bytes")
+    post_id, job_id = _queue(db, [{"sha256": digest, "mime_type": "image/png"}])
+
+    job = _run_next_job()
+
+    assert job["status"] == "posted"
+    assert db.get_post(post_id)["status"] == "posted"
+    assert linkedin.uploads == [("access-token", [(b"fake image bytes", "image/png", digest)])]
+    assert linkedin.shares == [("access-token", db.get_post(post_id)["content"], ["urn:li:asset:0"])]
+    token = db.get_conn().execute("SELECT access_token FROM publish_jobs WHERE id = ?", (job_id,)).fetchone()[0]
+    assert token is None
+    assert db.get_publish_job_images(job_id) == []
+
+
+def test_transient_upload_failure_is_retried_with_backoff(db, linkedin, monkeypatch):
+    monkeypatch.setattr(settings, "PUBLISH_MAX_ATTEMPTS", 2)
+    digest = blob_store.put(b"retry me")
+    post_id, job_id = _queue(db, [{"sha256": digest, "mime_type": "image/png"}])
+    linkedin.upload_results = [{"error": "503 Service Unavailable", "status_code": 503}]
+
+    job = _run_next_job()
+    assert job["status"] == "queued"
+    assert job["last_error"].startswith("Image upload failed")
+    assert db.get_post(post_id)["status"] == "queued"
+    assert db.claim_publish_job() is None  # Not due until the backoff has passed
+    assert linkedin.shares == []
+
+    _make_due(job_id)
+    job = _run_next_job()
+    assert job["status"] == "failed"  # The last attempt fails the job for good
+    assert job["attempts"] == 2
+    assert db.get_post(post_id)["status"] == "failed"
+
+
+def test_expired_token_fails_without_retrying(db, linkedin):
+    digest = blob_store.put(b"unauthorized")
+    post_id, _ = _queue(db, [{"sha256": digest, "mime_type": "image/png"}])
+    linkedin.upload_results = [{"error": "401 Unauthorized", "status_code": 401}]
+
+    job = _run_next_job()
+    assert job["status"] == "failed"
+    assert job["attempts"] == 1
+    assert db.get_post(post_id)["status"] == "failed"
+
+
+def test_userinfo_403_fails_without_retrying(db, linkedin, monkeypatch):
+    response = requests.Response()
+    response.status_code = 403
+
+    def forbidden(access_token):
+        raise requests.exceptions.HTTPError("403 Forbidden", response=response)
+
+    monkeypatch.setattr(linkedin_client, "get_person_urn", forbidden)
+    _queue(db)
+    assert _run_next_job()["status"] == "failed"
+
+
+def test_missing_post_or_blob_fails_without_retrying(db, linkedin):
+    post_id, _ = _queue(db)
+    db.delete_posts([post_id])
+    assert _run_next_job()["status"] == "failed"
+
+    _, job_id = _queue(db, [{"sha256": "0" * 64, "mime_type": "image/png"}])
+    job = _run_next_job()
+    assert job["status"] == "failed"
+    assert "missing" in job["last_error"]
+    assert linkedin.uploads == []
+
+
+def test_rejected_share_fails_and_is_not_repeated(db, linkedin):
+    post_id, _ = _queue(db)
+    linkedin.share_result = {"error": "422 Unprocessable Entity", "status_code": 422, "linkedin_response": ""}
+
+    job = _run_next_job()
+    assert job["status"] == "failed"
+    assert db.get_post(post_id)["status"] == "failed"
+    assert len(linkedin.shares) == 1
+
+
+@pytest.mark.parametrize("share_result", [
+    {"error": "502 Bad Gateway", "status_code": 502, "linkedin_response": ""},
+    {"error": "Read timed out", "status_code": None, "linkedin_response": ""},
+    RuntimeError("connection reset"),
+])
+def test_ambiguous_share_is_left_unknown_and_not_repeated(db, linkedin, share_result):
+    post_id, job_id = _queue(db)
+    linkedin.share_result = share_result
+
+    job = _run_next_job()
+    assert job["status"] == "unknown"
+    assert db.get_post(post_id)["status"] == "unknown"
+    assert db.claim_publish_job() is None
+    assert len(linkedin.shares) == 1
+
+    # The user can share it again once they have checked LinkedIn
+    assert publish_queue.enqueue_share(post_id, "access-token", []) is not None
+
+
+def test_interrupted_jobs_are_requeued_or_left_unknown_by_phase(db):
+    uploading_post, uploading_job = _queue(db)
+    sharing_post, sharing_job = _queue(db)
+    db.claim_publish_job()
+    db.claim_publish_job()
+    db.start_sharing_publish_job(sharing_job)
+
+    # Jobs touched recently may still be running in another process
+    assert db.requeue_interrupted_publish_jobs(stale_after_seconds=3600) == 0
+    assert db.get_publish_job(uploading_job)["status"] == "publishing"
+
+    db.get_conn().execute("UPDATE publish_jobs SET updated_at = datetime('now', '-2 hours')")
+    assert db.requeue_interrupted_publish_jobs(stale_after_seconds=3600) == 1
+    assert db.get_publish_job(uploading_job)["status"] == "queued"
+    assert db.get_post(uploading_post)["status"] == "queued"
+    assert db.get_publish_job(sharing_job)["status"] == "unknown"
+    assert db.get_post(sharing_post)["status"] == "unknown"
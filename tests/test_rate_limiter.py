@@ -0,0 +1,143 @@
+import asyncio
+import pytest
+from app.ai import rate_limiter
+from app.ai.rate_limiter import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, GeminiLimiter, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture()
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", fake)
+    return fake
+
+
+def test_bucket_starts_full_and_refills_continuously(clock):
+    bucket = TokenBucket(per_minute=60, burst_seconds=10)  # 1 per second, holds 10
+    assert bucket.wait_time(10) == 0
+    bucket.take(10)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+
+    clock.now += 0.5
+    assert bucket.wait_time(1) == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.wait_time(1) == 0
+
+
+def test_bucket_never_fills_past_capacity(clock):
+    bucket = TokenBucket(per_minute=60, burst_seconds=10)
+    clock.now += 3600
+    bucket.take(10)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+
+
+def test_bucket_debt_delays_later_callers(clock):
+    bucket = TokenBucket(per_minute=60, burst_seconds=10)
+    bucket.take(15)  # Five units of debt
+    assert bucket.wait_time(1) == pytest.approx(6.0)
+
+
+def test_bucket_refund_never_fills_past_capacity(clock):
+    bucket = TokenBucket(per_minute=60, burst_seconds=10)
+    bucket.take(2)
+    bucket.take(-50)  # A refund larger than what was taken
+    assert bucket.available == bucket.capacity
+    bucket.take(11)
+    assert bucket.wait_time(1) == pytest.approx(2.0)
+
+
+def test_bucket_amount_above_capacity_only_needs_a_full_bucket(clock):
+    bucket = TokenBucket(per_minute=60, burst_seconds=10)
+    assert bucket.wait_time(50) == 0
+    bucket.take(1)
+    assert bucket.wait_time(50) == pytest.approx(1.0)
+
+
+def test_disabled_bucket_never_waits():
+    bucket = TokenBucket(per_minute=0)
+    bucket.take(1_000_000)
+    assert bucket.wait_time(1_000_000) == 0
+
+
+def _unlimited(max_concurrency: int) -> GeminiLimiter:
+    return GeminiLimiter(0, 0, min_concurrency=1, max_concurrency=max_concurrency)
+
+
+def test_waiters_are_admitted_by_priority_then_arrival():
+    async def scenario():
+        limiter = _unlimited(max_concurrency=1)
+        admitted = []
+
+        async def call(name, priority):
+            await limiter.acquire(priority, estimated_tokens=1)
+            admitted.append(name)
+            await asyncio.sleep(0)
+            limiter.release("success")
+
+        await limiter.acquire(PRIORITY_INTERACTIVE, 1)  # Holds the only slot while the others queue
+        tasks = [
+            asyncio.create_task(call("background-1", PRIORITY_BACKGROUND)),
+            asyncio.create_task(call("background-2", PRIORITY_BACKGROUND)),
+            asyncio.create_task(call("interactive-1", PRIORITY_INTERACTIVE)),
+            asyncio.create_task(call("interactive-2", PRIORITY_INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        assert admitted == []
+        limiter.release("success")
+        await asyncio.gather(*tasks)
+        return admitted, limiter
+
+    admitted, limiter = asyncio.run(scenario())
+    assert admitted == ["interactive-1", "interactive-2", "background-1", "background-2"]
+    assert limiter.in_flight == 0
+    assert limiter.stats["admitted"] == 5
+
+
+def test_concurrency_limit_halves_on_throttling_and_grows_on_success():
+    async def scenario():
+        limiter = _unlimited(max_concurrency=8)
+        await limiter.acquire(PRIORITY_INTERACTIVE, 1)
+        limiter.release("throttled")
+        after_throttle = limiter.limit
+        await limiter.acquire(PRIORITY_INTERACTIVE, 1)
+        limiter.release("throttled")  # Within the cooldown, so not halved again
+        after_second_throttle = limiter.limit
+        for _ in range(4):
+            await limiter.acquire(PRIORITY_INTERACTIVE, 1)
+            limiter.release("success")
+        return after_throttle, after_second_throttle, limiter.limit
+
+    after_throttle, after_second_throttle, after_successes = asyncio.run(scenario())
+    assert after_throttle == 4
+    assert after_second_throttle == 4
+    assert after_successes == pytest.approx(5.0, abs=0.1)
+
+
+def test_cancelled_waiter_is_skipped():
+    async def scenario():
+        limiter = _unlimited(max_concurrency=1)
+        await limiter.acquire(PRIORITY_INTERACTIVE, 1)
+        cancelled = asyncio.create_task(limiter.acquire(PRIORITY_INTERACTIVE, 1))
+        waiting = asyncio.create_task(limiter.acquire(PRIORITY_BACKGROUND, 1))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        limiter.release("success")
+        await waiting
+        return limiter.in_flight
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_estimate_tokens_counts_text_and_images():
+    base = rate_limiter.settings.GEMINI_OUTPUT_TOKENS_ESTIMATE
+    assert rate_limiter.estimate_tokens("x" * 40) == base + 10
+    parts = [{"text": "y" * 8}, {"mime_type": "image/png", "data": b"..."}]
+    assert rate_limiter.estimate_tokens(parts) == base + 2 + rate_limiter.IMAGE_TOKENS
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+from app.ai.response_cache import (
+    DEFAULT_TTLS, INLINE_HASH_BYTES, MemoryTier, ResponseCache, SqliteTier, make_cache_key, make_cache_key_async
+)
+
+CONFIG = {"temperature": 0.3}
+
+
+def test_cache_key_is_stable_and_ignores_config_key_order():
+    first = make_cache_key(["hello", {"text": "world"}], "model", {"a": 1, "b": 2})
+    second = make_cache_key(["hello", {"text": "world"}], "model", {"b": 2, "a": 1})
+    assert first == second
+
+
+def test_cache_key_changes_with_model_config_and_parts():
+    key = make_cache_key(["hello"], "model", CONFIG)
+    assert make_cache_key(["hello"], "other-model", CONFIG) != key
+    assert make_cache_key(["hello"], "model", {"temperature": 0.9}) != key
+    assert make_cache_key(["hello!"], "model", CONFIG) != key
+
+
+def test_cache_key_part_boundaries_do_not_collide():
+    assert make_cache_key(["ab", "c"], "model", CONFIG) != make_cache_key(["a", "bc"], "model", CONFIG)
+
+
+def test_cache_key_covers_image_bytes_and_mime_type():
+    key = make_cache_key([{"mime_type": "image/png", "data": b"\x89PNG1"}], "model", CONFIG)
+    assert make_cache_key([{"mime_type": "image/png", "data": b"\x89PNG2"}], "model", CONFIG) != key
+    assert make_cache_key([{"mime_type": "image/jpeg", "data": b"\x89PNG1"}], "model", CONFIG) != key
+
+
+def test_string_prompt_matches_single_part_list():
+    assert make_cache_key("hello", "model", CONFIG) == make_cache_key(["hello"], "model", CONFIG)
+
+
+def test_memory_tier_evicts_least_recently_used_over_byte_budget():
+    tier = MemoryTier(max_entries=10, max_bytes=10)
+    expires_at = time.time() + 60
+    tier.put("a", "aaaa", expires_at)
+    tier.put("b", "bbbb", expires_at)
+    assert tier.get("a") == "aaaa"  # "b" is now the least recently used
+
+    assert tier.put("c", "cccc", expires_at) == 1
+    assert tier.get("b") is None
+    assert tier.get("a") == "aaaa"
+    assert tier.get("c") == "cccc"
+    assert tier._size == 8
+
+
+def test_memory_tier_replacing_a_key_updates_its_size():
+    tier = MemoryTier(max_entries=10, max_bytes=10)
+    expires_at = time.time() + 60
+    tier.put("a", "aaaaaaaa", expires_at)
+    tier.put("a", "aa", expires_at)
+    assert tier._size == 2
+    assert tier.put("b", "bbbbbbbb", expires_at) == 0
+
+
+def test_memory_tier_evicts_over_entry_count():
+    tier = MemoryTier(max_entries=2, max_bytes=1000)
+    expires_at = time.time() + 60
+    for key in ("a", "b", "c"):
+        tier.put(key, key, expires_at)
+    assert tier.get("a") is None
+    assert tier._size == 2
+
+
+def test_memory_tier_skips_payloads_larger_than_the_budget():
+    tier = MemoryTier(max_entries=10, max_bytes=4)
+    assert tier.put("big", "too large", time.time() + 60) == 0
+    assert tier.get("big") is None
+    assert tier._size == 0
+
+
+def test_memory_tier_drops_expired_entries_on_read():
+    tier = MemoryTier(max_entries=10, max_bytes=100)
+    tier.put("old", "payload", time.time() - 1)
+    assert tier.get("old") is None
+    assert tier._size == 0
+
+
+class RecordingTier(SqliteTier):
+    """A SQLite tier that records which thread each call ran on."""
+
+    def __init__(self, path):
+        super().__init__(path, max_bytes=1_000_000)
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.get_ident())
+        return super().get(key)
+
+    def put(self, key, prompt_type, payload, expires_at):
+        self.threads.append(threading.get_ident())
+        return super().put(key, prompt_type, payload, expires_at)
+
+
+def test_async_cache_uses_the_disk_tier_off_the_event_loop(tmp_path):
+    disk = RecordingTier(str(tmp_path / "cache.db"))
+    cache = ResponseCache(MemoryTier(10, 10_000), disk, dict(DEFAULT_TTLS))
+
+    async def scenario():
+        await cache.aput("key", "post", {"text": "hello"})
+        cache.memory.clear()
+        found = await cache.aget("key")  # served from disk and promoted to memory
+        again = await cache.aget("key")
+        return found, again
+
+    found, again = asyncio.run(scenario())
+    assert found == again == {"text": "hello"}
+    assert len(disk.threads) == 2
+    assert threading.get_ident() not in disk.threads  # asyncio.run runs the loop on this thread
+    assert cache.stats["disk_hits"] == 1 and cache.stats["memory_hits"] == 1
+
+
+def test_async_cache_key_matches_sync_key_for_small_and_large_images():
+    small = ["describe", {"mime_type": "image/png", "data": b"x" * 10}]
+    large = ["describe", {"mime_type": "image/png", "data": b"x" * (INLINE_HASH_BYTES + 1)}]
+    for parts in (small, large):
+        assert asyncio.run(make_cache_key_async(parts, "model", CONFIG)) == make_cache_key(parts, "model", CONFIG)
@@ -0,0 +1,77 @@
+import pytest
+from app.db import database
+
+
+@pytest.fixture()
+def db():
+    database.init_db()
+    conn = database.get_conn()
+    conn.execute("DELETE FROM posts")
+    yield database
+    conn.execute("DELETE FROM posts")
+
+
+def test_fts_query_quotes_every_word_and_prefixes_the_last():
+    assert database._fts_query("remote work") == '"remote" "work"*'
+
+
+def test_fts_query_neutralizes_fts_syntax():
+    assert database._fts_query('AI OR "NEAR(x y)" -draft*') == '"AI" "OR" "NEAR" "x" "y" "draft"*'
+
+
+def test_fts_query_without_words_is_none():
+    assert database._fts_query(' "*()- ') is None
+
+
+def test_search_matches_content_and_hashtags(db):
+    by_content = db.insert_post("Shipping the new onboarding flow", "#product")
+    by_hashtag = db.insert_post("A quiet week", "#onboarding")
+    db.insert_post("Unrelated thoughts", "#misc")
+
+    ids = {post["id"] for post in db.search_posts("onboarding")}
+    assert ids == {by_content, by_hashtag}
+
+
+def test_search_matches_prefix_of_last_word(db):
+    post_id = db.insert_post("Kubernetes tips for beginners", "")
+    assert [post["id"] for post in db.search_posts("kuber")] == [post_id]
+
+
+def test_search_with_syntax_characters_does_not_raise(db):
+    post_id = db.insert_post("Notes on AND OR NOT operators", "")
+    assert [post["id"] for post in db.search_posts('"AND" OR (NOT')] == [post_id]
+    assert db.search_posts("***") == []
+
+
+def test_search_escapes_snippets_and_marks_matches(db):
+    db.insert_post("Use <script> tags carefully in templates", "")
+    (result,) = db.search_posts("templates")
+    assert "<script>" not in result["snippet_html"]
+    assert "&lt;script&gt;" in result["snippet_html"]
+    assert "<mark>templates</mark>" in result["snippet_html"]
+
+
+def test_search_filters_by_status(db):
+    db.insert_post("Drafting a roadmap update", "")
+    posted = db.insert_post("Roadmap update is live", "")
+    db.mark_posted(posted)
+    assert [post["id"] for post in db.search_posts("roadmap", statuses=["posted"])] == [posted]
+
+
+def test_search_pages_by_rank_then_id_without_gaps_or_repeats(db):
+    expected = {db.insert_post(f"Weekly growth report number {i}", "") for i in range(7)}
+
+    seen = []
+    after_rank = after_id = None
+    while True:
+        page = db.search_posts("growth", after_rank=after_rank, after_id=after_id, limit=3)
+        if not page:
+            break
+        assert len(page) <= 3
+        seen.extend(page)
+        after_rank, after_id = page[-1]["rank"], page[-1]["id"]
+
+    assert len(seen) == len(expected)
+    assert {post["id"] for post in seen} == expected
+    keys = [(post["rank"], post["id"]) for post in seen]
+    assert keys == sorted(keys)
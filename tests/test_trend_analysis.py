@@ -0,0 +1,70 @@
+import asyncio
+from app.ai import trend_analysis
+from app.ai.trend_analysis import CHARS_PER_TOKEN, split_into_chunks
+
+
+def _paragraph(word: str, words: int) -> str:
+    return " ".join([word] * words) + "."
+
+
+def test_short_text_is_one_chunk():
+    assert split_into_chunks("One paragraph.\n\nAnother paragraph.", max_tokens=100) == [
+        "One paragraph.\n\nAnother paragraph."
+    ]
+
+
+def test_paragraphs_are_packed_without_splitting_them():
+    paragraphs = [_paragraph(word, 20) for word in ("aaaa", "bbbb", "cccc", "dddd")]
+    chunks = split_into_chunks("\n\n".join(paragraphs), max_tokens=60)  # Two paragraphs fit per chunk
+
+    assert chunks == ["\n\n".join(paragraphs[:2]), "\n\n".join(paragraphs[2:])]
+
+
+def test_chunks_stay_within_the_budget():
+    text = "\n\n".join(_paragraph(f"word{i}", 5 + i % 17) for i in range(60))
+    max_tokens = 50
+    chunks = split_into_chunks(text, max_tokens)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= max_tokens * CHARS_PER_TOKEN for chunk in chunks)
+
+
+def test_long_paragraph_is_split_on_sentences():
+    sentences = [f"Sentence number {i} talks about trends." for i in range(20)]
+    chunks = split_into_chunks(" ".join(sentences), max_tokens=30)
+    assert len(chunks) > 1
+    assert all(chunk.endswith(".") for chunk in chunks)
+    assert " ".join(chunk.replace("\n\n", " ") for chunk in chunks) == " ".join(sentences)
+
+
+def test_overlong_sentence_is_cut_by_length():
+    sentence = "x" * 1000
+    chunks = split_into_chunks(sentence, max_tokens=100)
+    assert all(len(chunk) <= 400 for chunk in chunks)
+    assert "".join(chunk.replace("\n\n", "") for chunk in chunks) == sentence
+
+
+def test_blank_paragraphs_are_dropped():
+    assert split_into_chunks("\n\n  \n\nOnly text.\n\n\n\n", max_tokens=100) == ["Only text."]
+    assert split_into_chunks("   ", max_tokens=100) == []
+
+
+def test_long_text_merges_the_insights_of_chunks_that_succeeded(monkeypatch):
+    calls = []
+
+    async def fake_call(prompt_parts, prompt_type):
+        calls.append(prompt_parts)
+        if len(calls) == 1:
+            return {"error": "AI response not usable"}
+        if len(calls) < 4:
+            return {"insights": [f"insight {len(calls)}"]}
+        return {"insights": ["merged"]}
+
+    monkeypatch.setattr(trend_analysis.settings, "TRENDS_SINGLE_CALL_TOKENS", 10)
+    monkeypatch.setattr(trend_analysis.settings, "TRENDS_CHUNK_TOKENS", 60)
+    monkeypatch.setattr(trend_analysis.settings, "TRENDS_MAX_CHUNKS", 3)
+    monkeypatch.setattr(trend_analysis.gemini_client, "call_gemini_json_async", fake_call)
+    text = "\n\n".join(_paragraph(word, 40) for word in ("aaaa", "bbbb", "cccc"))
+
+    assert asyncio.run(trend_analysis.analyze_trends(text)) == {"insights": ["merged"]}
+    assert len(calls) == 4  # three chunks, then the merge of the two that succeeded
+    assert "insight 2" in str(calls[-1]) and "insight 3" in str(calls[-1])
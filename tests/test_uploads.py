@@ -0,0 +1,80 @@
+import asyncio
+import io
+import pytest
+from fastapi import UploadFile
+from fastapi.testclient import TestClient
+from app import uploads
+from app.config import settings
+from app.main import app
+from app.state import BlobStore
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+
+
+def spool(store, *files):
+    upload_files = [UploadFile(file=io.BytesIO(data), filename=name) for name, data in files]
+    return asyncio.run(uploads.spool_images(upload_files, store))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(str(tmp_path / "blobs"), max_age=3600)
+
+
+def test_spool_images_stores_by_content_and_sniffs_the_type(store):
+    stored = spool(store, ("a.png", PNG), ("b.gif", b"GIF89a" + b"\x00" * 10))
+    assert [image["mime_type"] for image in stored] == ["image/png", "image/gif"]
+    assert store.get(stored[0]["sha256"]) == PNG
+    assert stored[0]["size"] == len(PNG)
+
+
+def test_spool_images_rejects_non_images_and_empty_files(store):
+    with pytest.raises(uploads.ImageRejected, match="not a PNG"):
+        spool(store, ("notes.txt", b"plain text"))
+    with pytest.raises(uploads.ImageRejected, match="empty"):
+        spool(store, ("empty.png", b""))
+
+
+def test_spool_images_enforces_per_image_and_total_limits(store, monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_MAX_BYTES", 150)
+    monkeypatch.setattr(settings, "IMAGE_MAX_TOTAL_BYTES", 200)
+    with pytest.raises(uploads.ImageRejected, match="larger than"):
+        spool(store, ("big.png", PNG + b"\x00" * 100))
+    with pytest.raises(uploads.ImageRejected, match="together"):
+        spool(store, ("a.png", PNG), ("b.png", PNG))
+
+
+def test_upload_with_oversized_content_length_is_refused_before_reading(monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_MAX_TOTAL_BYTES", 1000)
+    client = TestClient(app)
+    body = b"x" * (uploads.max_body_bytes() + 1)
+    response = client.post(
+        "/image/analyze", content=body,
+        headers={"Content-Type": "multipart/form-data; boundary=xyz"},
+    )
+    assert response.status_code == 413
+
+
+def test_upload_without_content_length_is_cut_off_while_streaming(monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_MAX_TOTAL_BYTES", 1000)
+    head = b"--xyz\r\nContent-Disposition: form-data; name=\"images\"; filename=\"a.png\"\r\nContent-Type: image/png\r\n\r\n"
+    chunks = [head + PNG] + [b"\x00" * 4096] * 100
+    received, responses = [], []
+
+    async def receive():
+        received.append(1)
+        return {"type": "http.request", "body": chunks[len(received) - 1], "more_body": len(received) < len(chunks)}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            responses.append(message["status"])
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/image/analyze", "raw_path": b"/image/analyze", "query_string": b"",
+        "root_path": "", "headers": [(b"content-type", b"multipart/form-data; boundary=xyz")],
+        "client": ("test", 1), "server": ("test", 80), "app": app,
+    }
+    asyncio.run(app(scope, receive, send))
+    assert responses == [413]
+    assert len(received) < len(chunks)  # the rest of the body was never read